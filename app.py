@@ -1,16 +1,22 @@
 import toml
 import logging
+import threading
 
 from datetime import datetime
-from flask import Flask, render_template, request, jsonify, session
+from time import perf_counter
+from flask import Flask, render_template, request, jsonify, session, url_for
 from flask.logging import default_handler
 from markupsafe import escape
 from werkzeug.datastructures import MultiDict
 from flask_socketio import SocketIO
 
-from statschat.llm import Inquirer
-from statschat.utils import deduplicator
-from statschat.latest_flag_helpers import get_latest_flag, time_decay
+from statschat.jobs import DONE, GENERATING, RETRIEVING, JobQueue, QueueFull
+from statschat.utils import deduplicator, timed
+from statschat.latest_flag_helpers import (
+    get_latest_flag,
+    get_search_filters,
+    recency_rerank,
+)
 
 
 # Config file to load
@@ -30,11 +36,88 @@ logging.basicConfig(
 logger.addHandler(default_handler)
 
 
-# initiate Statschat AI and start the app
-searcher = Inquirer(**CONFIG["db"], **CONFIG["search"], logger=logger)
+# Statschat AI is loaded on first use, or by /warmup, rather than on import,
+# so that the app starts, and answers liveness checks, straight away
+_searcher = None
+_searcher_error = None
+_searcher_lock = threading.Lock()
+_warmup_thread = None
+STARTED = perf_counter()
+
+
+def get_searcher():
+    """
+    The Inquirer, loading it on first call.  Concurrent callers wait for
+    the one load, and a failed load is retried by the next caller.
+    """
+    global _searcher, _searcher_error
+    if _searcher is not None:
+        return _searcher
+
+    with _searcher_lock:
+        if _searcher is None:
+            try:
+                with timed(logger, "Importing search and LLM libraries"):
+                    # langchain, transformers and faiss are only imported here
+                    from statschat.llm import Inquirer
+
+                with timed(logger, "Loading Statschat AI"):
+                    _searcher = Inquirer(
+                        **CONFIG["db"], **CONFIG["search"], logger=logger
+                    )
+                _searcher_error = None
+                logger.info(
+                    f"Models ready {perf_counter() - STARTED:.2f}s after start, "
+                    f"phases: {_searcher.startup_timings}"
+                )
+            except Exception as e:
+                _searcher_error = str(e)
+                logger.exception("Loading Statschat AI failed")
+                raise
+
+    return _searcher
+
+
+def start_warmup() -> bool:
+    """
+    Loads the Inquirer in a background thread, unless loaded or loading.
+    Returns whether a load was started.
+    """
+    global _warmup_thread
+    with _searcher_lock:
+        if _searcher is not None or (_warmup_thread and _warmup_thread.is_alive()):
+            return False
+        _warmup_thread = threading.Thread(target=_warm, name="warmup", daemon=True)
+        _warmup_thread.start()
+
+    return True
+
+
+def _warm():
+    try:
+        get_searcher()
+    except Exception:
+        pass  # logged by get_searcher, and reported by readiness
+
+
+def readiness() -> dict:
+    """Whether the models are loaded, loading, or failed to load."""
+    if _searcher is not None:
+        status = "ready"
+    elif (_warmup_thread and _warmup_thread.is_alive()) or _searcher_lock.locked():
+        status = "loading"
+    elif _searcher_error:
+        status = "failed"
+    else:
+        status = "not loaded"
+    return {
+        "status": status,
+        "error": _searcher_error if status == "failed" else None,
+        "uptime": round(perf_counter() - STARTED, 1),
+    }
 
 
-def make_query(question: str, latest: int = 1) -> list:
+def make_query(question: str, latest: int = 1, filters: dict = None) -> list:
     """
     Utility, wraps code for querying the search engine, and then the summarizer.
     Also handles storing the last answer made for feedback purposes.
@@ -43,24 +126,22 @@ def make_query(question: str, latest: int = 1) -> list:
         question (str): The user query.
         latest (bool, optional): Whether to weight in favour of recent releases.
             Defaults to True.
+        filters (dict, optional): Release type, date and keyword filters, as
+            returned by get_search_filters. Defaults to None.
 
     Returns:
         list: supporting documents returned.
     """
-    # TODO: pass the advanced filters to the searcher
     # TODO: move deduplication keys to config['app']
     docs = deduplicator(
-        searcher.similarity_search(question),
+        get_searcher().similarity_search(question, **(filters or {})),
         keys=["section", "title", "date"],
     )
     if len(docs) > 0:
+        # recency weights the cross-encoder scores too, so is applied last
+        docs = get_searcher().rerank(question, docs)
         if latest:
-            for doc in docs:
-                # Divided by decay term because similarity scores are inverted
-                # Original score is L2 distance; lower is better
-                #  https://python.langchain.com/docs/integrations/vectorstores/faiss
-                doc["score"] = doc["score"] / time_decay(doc["date"], latest=latest)
-            docs.sort(key=lambda doc: doc["score"])
+            docs = recency_rerank(docs, latest=latest)
             logger.info(f"Weighted and reordered docs to latest with decay = {latest}")
         for doc in docs:
             doc["score"] = round(doc["score"], 2)
@@ -92,9 +173,14 @@ def advanced():
 def search():
     session["question"] = escape(request.args.get("q"))
     advanced, latest = get_latest_flag(request.args, CONFIG["app"]["latest_max"])
+    try:
+        filters = get_search_filters(request.args)
+    except ValueError:
+        logger.warning(f"Ignoring search filters with invalid dates: {request.args}")
+        filters = {}
     if session["question"]:
-        logger.info(f"Search query: {session['question']}")
-        docs = make_query(session["question"], latest)
+        logger.info(f"Search query: {session['question']}, filters: {filters}")
+        docs = make_query(session["question"], latest, filters)
         logger.info(
             f"Received {len(docs)} references"
             + f" with top distance {docs[0]['score'] if docs else 'Inf'}"
@@ -115,14 +201,16 @@ def search_question_async(sid, question, docs):
     Generate answer and emit to a socketio instance (broadcast)
     Ideally to be run in a separate thread?
     """
-    # TODO: pass the advanced filters to the searcher
     socketio.emit(
         "newanswer",
         {"answer": "Looking for answer in relevant documents..."},
         namespace="/answer",
         to=sid,
     )
-    answer = searcher.query_texts(question, docs)
+    answer = ""
+    for chunk in get_searcher().stream_answer(question, docs):
+        answer += chunk
+        socketio.emit("newanswer_chunk", {"chunk": chunk}, namespace="/answer", to=sid)
     logger.info(f"Received answer: {answer}")
     if answer in ["NA", "NA.", ""]:
         answer_str = ""
@@ -160,9 +248,9 @@ def record_rating():
     last_answer = {
         "rating": rating,
         "question": session["question"],
-        "answer": searcher.query_texts(
-            session["question"], session["docs"]
-        ),  # session['answer'],  # TODO: store answer in session?
+        # the answer as shown, sent with the rating: it is generated in a
+        # socket.io task, after the session cookie was sent
+        "answer": request.form.get("answer", ""),
         "references": session["docs"],
         "config": CONFIG,
     }
@@ -173,20 +261,135 @@ def record_rating():
     return "", 204  # Return empty response with status code 204
 
 
+def run_search_job(job, question: str, latest: float, filters: dict):
+    """
+    Worker side of POST /api/search: retrieves references, publishing them
+    on the job straight away, then generates the answer.
+    """
+    job.update(RETRIEVING)
+    docs = make_query(question, latest, filters)
+    logger.info(f"Job {job.id} received {len(docs)} documents.")
+    job.update(GENERATING, references=docs)
+    job.update(DONE, answer=get_searcher().query_texts(question, docs))
+
+
+# API searches run in a bounded pool of workers, outside the request
+search_jobs = JobQueue(
+    run_search_job,
+    workers=CONFIG["app"]["api_workers"],
+    max_queued=CONFIG["app"]["api_max_queued"],
+    ttl=CONFIG["app"]["api_job_ttl"],
+    logger=logger,
+)
+
+
+def after_fork():
+    """
+    Restarts the threads of the API job queue, and of the Inquirer if
+    loaded, in a worker process forked from this one, see prefork.py.
+    """
+    search_jobs.after_fork()
+    if _searcher is not None:
+        _searcher.after_fork()
+
+    return None
+
+
 @app.route("/api/search", methods=["GET", "POST"])
 def api_search():
-    question = escape(request.args.get("q"))
+    """
+    GET answers a question within the request. POST queues it and returns
+    a job id at once, for the results to be collected from
+    /api/search/<job_id>, or 429 if too many searches are queued.
+    """
+    question = escape(request.values.get("q", ""))
     logger.info(f"API Search query: {question}")
-    if question:
-        _, latest = get_latest_flag(request.args, CONFIG["app"]["latest_max"])
-        docs = make_query(question, latest)
-        answer = searcher.query_texts(question, docs)
-        results = {"question": question, "answer": answer, "references": docs}
-        logger.info(f"Received {len(results['references'])} documents.")
-        return jsonify(results), 200
-    else:
+    if not question:
         return jsonify({"error": "Empty question"}), 400
 
+    _, latest = get_latest_flag(request.values, CONFIG["app"]["latest_max"])
+    try:
+        filters = get_search_filters(request.values)
+    except ValueError:
+        return jsonify({"error": "Dates must be given as YYYY-MM-DD"}), 400
+
+    if request.method == "POST":
+        try:
+            job = search_jobs.submit(question, latest, filters, question=question)
+        except QueueFull:
+            logger.warning("Search queue full, refusing API search")
+            return (
+                jsonify({"error": "Server too busy, try again shortly"}),
+                429,
+                {"Retry-After": "5"},
+            )
+        location = url_for("api_search_job", job_id=job.id)
+        return jsonify(job.to_dict()), 202, {"Location": location}
+
+    docs = make_query(question, latest, filters)
+    answer = get_searcher().query_texts(question, docs)
+    results = {"question": question, "answer": answer, "references": docs}
+    logger.info(f"Received {len(results['references'])} documents.")
+    return jsonify(results), 200
+
+
+@app.route("/api/search/<job_id>", methods=["GET"])
+def api_search_job(job_id):
+    """
+    Status and results of a queued search. With wait=<seconds>, long-polls
+    until the job changes from the version given, or finishes if none is.
+    """
+    job = search_jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown or expired job"}), 404
+
+    wait = min(request.args.get("wait", 0, type=float), CONFIG["app"]["api_max_wait"])
+    if wait > 0:
+        job.wait(wait, request.args.get("version", type=int))
+    return jsonify(job.to_dict()), 200
+
+
+@app.route("/api/metrics", methods=["GET"])
+def metrics():
+    # metrics never trigger loading the models
+    searcher_metrics = _searcher.metrics() if _searcher is not None else {}
+    return jsonify(searcher_metrics | {"search_jobs": search_jobs.metrics()})
+
+
+@app.route("/warmup", methods=["GET", "POST"])
+def warmup():
+    """
+    Starts loading the models in the background, if not already loaded,
+    returning 200 once they are ready and 202 while they load.
+    """
+    start_warmup()
+    state = readiness()
+    return jsonify(state), 200 if state["status"] == "ready" else 202
+
+
+@app.route("/healthz/live", methods=["GET"])
+def healthz_live():
+    """Liveness check: the app is up and serving, models loaded or not."""
+    return jsonify({"status": "live", "models": readiness()["status"]}), 200
+
+
+@app.route("/healthz", methods=["GET"])
+@app.route("/healthz/ready", methods=["GET"])
+def healthz():
+    """
+    Readiness check: the models and vector store are loaded, and the LLM,
+    or the generation service it runs in, can be reached.  Returns 503
+    while the models are loading, without waiting for them.
+    """
+    state = readiness()
+    if state["status"] != "ready":
+        return jsonify(state), 503
+    try:
+        return jsonify({"status": "ok"} | _searcher.health()), 200
+    except Exception as e:
+        logger.warning(f"Health check failed: {e}")
+        return jsonify({"status": "unavailable", "error": str(e)}), 503
+
 
 @app.route("/api/about", methods=["GET", "POST"])
 def about():
@@ -195,4 +398,6 @@ def about():
 
 
 if __name__ == "__main__":
+    # load the models while the server starts, rather than on the first request
+    start_warmup()
     socketio.run(app, debug=False, host="0.0.0.0")
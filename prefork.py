@@ -0,0 +1,224 @@
+import argparse
+import gc
+import logging
+import os
+import signal
+import socket
+import sys
+import tempfile
+import threading
+import time
+from flask.logging import default_handler
+from statschat.utils import timed
+
+# Libraries read these when first imported.  The master loads the models
+# single threaded, so that no OpenMP or tokenizer thread pools exist when
+# the workers are forked, and each worker then sizes its own pools.
+SINGLE_THREADED = {
+    "OMP_NUM_THREADS": "1",
+    "MKL_NUM_THREADS": "1",
+    "TOKENIZERS_PARALLELISM": "false",
+}
+
+logger = logging.getLogger("prefork")
+logger.addHandler(default_handler)
+
+
+def memory_usage(pid: int) -> dict:
+    """
+    Memory of a process in MiB, from /proc/<pid>/smaps_rollup.  Pages
+    inherited from the master and not since written count as shared, and
+    PSS splits shared pages evenly between the processes mapping them.
+    """
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as file:
+        for line in file:
+            name, _, value = line.partition(":")
+            if value.strip().endswith("kB"):
+                fields[name] = int(value.split()[0]) / 1024
+    return {
+        "rss": fields.get("Rss", 0.0),
+        "pss": fields.get("Pss", 0.0),
+        "shared": fields.get("Shared_Clean", 0.0) + fields.get("Shared_Dirty", 0.0),
+        "private": fields.get("Private_Clean", 0.0) + fields.get("Private_Dirty", 0.0),
+    }
+
+
+def log_memory_report(workers: dict):
+    """Logs the memory of the master and each worker, and their total PSS."""
+    total = 0.0
+    processes = [("master", os.getpid())]
+    processes += [(f"worker {n}", pid) for n, pid in sorted(workers.items())]
+    for name, pid in processes:
+        try:
+            usage = memory_usage(pid)
+        except OSError:
+            continue
+        total += usage["pss"]
+        logger.info(
+            f"{name:<10} pid {pid:>7}  rss {usage['rss']:8.0f} MiB"
+            f"  pss {usage['pss']:8.0f} MiB  shared {usage['shared']:8.0f} MiB"
+            f"  private {usage['private']:8.0f} MiB"
+        )
+    logger.info(f"Total PSS {total:.0f} MiB across {len(processes)} processes")
+
+    return None
+
+
+def partition_threads(workers: int, threads: int = 0) -> int:
+    """Intra-op threads per worker, the available CPUs split between them."""
+    if threads:
+        return threads
+    return max(1, len(os.sched_getaffinity(0)) // workers)
+
+
+def set_worker_threads(threads: int):
+    """Sizes the thread pools of a freshly forked worker."""
+    os.environ["OMP_NUM_THREADS"] = os.environ["MKL_NUM_THREADS"] = str(threads)
+    if "torch" in sys.modules:
+        sys.modules["torch"].set_num_threads(threads)
+    if "faiss" in sys.modules:
+        sys.modules["faiss"].omp_set_num_threads(threads)
+
+    return None
+
+
+def exit_with_master(master: int):
+    """Ends a worker once its master has gone, rather than leave it orphaned."""
+    while os.getppid() == master:
+        time.sleep(1)
+    os._exit(0)
+
+
+def serve(app_module, listener: socket.socket, number: int, threads: int):
+    """Worker process: serves the app on the listening socket of the master."""
+    from werkzeug.serving import make_server
+
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGUSR1, signal.SIG_DFL)
+    set_worker_threads(threads)
+    app_module.after_fork()
+    threading.Thread(
+        target=exit_with_master, args=(os.getppid(),), name="master-watch", daemon=True
+    ).start()
+
+    host, port = listener.getsockname()[:2]
+    server = make_server(
+        host, port, app_module.app, threaded=True, fd=listener.fileno()
+    )
+    logger.info(f"Worker {number} (pid {os.getpid()}) serving, {threads} threads")
+    server.serve_forever()
+
+
+def spawn(app_module, listener: socket.socket, number: int, threads: int) -> int:
+    """Forks a worker, returning its pid."""
+    pid = os.fork()
+    if pid == 0:
+        try:
+            serve(app_module, listener, number, threads)
+        finally:
+            # a worker must never return into the master's loop
+            os._exit(1)
+    return pid
+
+
+def supervise(app_module, listener, workers: dict, threads: int, interval: float):
+    """
+    Master loop: restarts workers that exit, and logs a memory report
+    every interval seconds, or on SIGUSR1, until SIGTERM or SIGINT.
+    """
+    state = {"stopping": False, "report": False}
+    signal.signal(signal.SIGTERM, lambda *_: state.update(stopping=True))
+    signal.signal(signal.SIGINT, lambda *_: state.update(stopping=True))
+    signal.signal(signal.SIGUSR1, lambda *_: state.update(report=True))
+
+    next_report = time.monotonic() + interval
+    while not state["stopping"]:
+        pid, status = os.waitpid(-1, os.WNOHANG)
+        if pid:
+            number = next(n for n, worker in workers.items() if worker == pid)
+            logger.warning(f"Worker {number} (pid {pid}) exited, restarting")
+            workers[number] = spawn(app_module, listener, number, threads)
+            continue
+        if state["report"] or (interval and time.monotonic() >= next_report):
+            log_memory_report(workers)
+            state["report"] = False
+            next_report = time.monotonic() + interval
+        time.sleep(0.5)
+
+    logger.info("Stopping workers")
+    for pid in workers.values():
+        try:
+            os.kill(pid, signal.SIGTERM)
+            os.waitpid(pid, 0)
+        except (ProcessLookupError, ChildProcessError):
+            pass  # already exited and reaped
+
+    return None
+
+
+def main(host: str, port: int, workers: int, threads: int, report_interval: float):
+    os.environ.update(SINGLE_THREADED)
+    # imported after the environment is set, for the libraries it loads
+    import app
+
+    backends = (
+        app.CONFIG["db"].get("embedding_backend"),
+        app.CONFIG["search"].get("llm_backend"),
+    )
+    if "onnx" in backends:
+        sys.exit(
+            "ONNX Runtime sessions do not survive fork: use the pytorch or int8 "
+            "backends with prefork.py, or run the LLM as a generation service"
+        )
+
+    # load once, then keep the garbage collector off the loaded objects so
+    # that collections in the workers don't write to, and copy, their pages
+    with timed(logger, "Loading models in master"):
+        app.get_searcher()
+    gc.collect()
+    gc.freeze()
+
+    # polls for a queued API search can reach any worker through the shared
+    # socket, so the workers share the state of their jobs through a file
+    handle, jobs_file = tempfile.mkstemp(prefix="statschat_jobs_", suffix=".sqlite")
+    os.close(handle)
+    app.search_jobs.share(jobs_file)
+
+    listener = socket.create_server((host, port), backlog=128)
+    threads = partition_threads(workers, threads)
+    logger.info(f"Listening on {host}:{port}, forking {workers} workers")
+    pids = {n: spawn(app, listener, n, threads) for n in range(workers)}
+    try:
+        supervise(app, listener, pids, threads, report_interval)
+    finally:
+        for path in (jobs_file, f"{jobs_file}-wal", f"{jobs_file}-shm"):
+            if os.path.exists(path):
+                os.remove(path)
+
+    return None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Serve app.py from pre-forked workers sharing models "
+        "loaded once in the master"
+    )
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=0,
+        help="intra-op threads per worker, 0 to split the CPUs between workers",
+    )
+    parser.add_argument(
+        "--report-interval",
+        type=float,
+        default=300,
+        help="seconds between memory reports, 0 for only on SIGUSR1",
+    )
+    args = parser.parse_args()
+    main(args.host, args.port, args.workers, args.threads, args.report_interval)
@@ -1,8 +1,23 @@
 $(document).ready(function(){
     //connect to the socket server.
-    var socket = io.connect('http://' + document.domain + ':' + location.port + '/answer');
+    //websocket only: a long-polling session would be split across workers
+    //when the app runs from several processes, see prefork.py
+    var socket = io.connect('http://' + document.domain + ':' + location.port + '/answer',
+        {transports: ['websocket']});
 
-    //receive message details from server
+    //receive the answer piece by piece as it is generated
+    var streamed = '';
+    socket.on('newanswer_chunk', function(msg) {
+        if (!streamed) {
+            $('#answer_block').html(
+                'Most likely answer: <h4 class="ons-u-fs-xxl"> <div id="answer"></div> </h4>'
+            );
+        }
+        streamed += msg.chunk;
+        $('#answer').text(streamed);
+    });
+
+    //receive message details from server, including the final full answer
     socket.on('newanswer', function(msg) {
         $('#answer_block').html(msg.answer);
     });
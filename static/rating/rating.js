@@ -3,7 +3,7 @@ function recordRating(rating) {
     $.ajax({
         url: '/record_rating',
         type: 'POST',
-        data: { rating: rating },
+        data: { rating: rating, answer: $('#answer').text() },
         success: function(response) {
             console.log('Rating recorded successfully');
         },
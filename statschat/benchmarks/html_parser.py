@@ -0,0 +1,119 @@
+import argparse
+import glob
+import html
+import json
+import os
+import re
+import tempfile
+from time import perf_counter
+from bs4 import BeautifulSoup
+from bulletin_parser import BulletinParser, parse_page
+
+
+def beautifulsoup_page(page_content: str) -> dict:
+    """The previous parser.py path: html.parser, and a find per field."""
+    soup = BeautifulSoup(page_content, "html.parser")
+    title = soup.title.string if soup.title else ""
+    url = soup.find("meta", attrs={"property": "og:url"})
+    url = url["content"] if url else ""
+    keywords = soup.find("meta", attrs={"name": "keywords"})
+    keywords = keywords["content"] if keywords else ""
+
+    content = []
+    for section in soup.find_all("section"):
+        section_header = section.find("h2").get_text() if section.find("h2") else ""
+        section_text = re.sub(r"\s+", " ", section.get_text()).strip()
+        figures = [img["src"] for img in section.find_all("img")]
+        content.append(
+            {
+                "section_url": url,
+                "section_header": section_header,
+                "section_text": section_text,
+                "figure": figures,
+            }
+        )
+    return {"title": title, "url": url, "url_keywords": keywords, "content": content}
+
+
+def render_page(bulletin: dict) -> str:
+    """Renders a scraped bulletin JSON back to HTML, for a synthetic corpus."""
+    sections = "".join(
+        f'<section id="{section["section_url"].split("#")[-1]}">'
+        f"<h2>{html.escape(section['section_header'])}</h2>"
+        + "".join(
+            f"<p>{html.escape(sentence)}.</p>"
+            for sentence in section["section_text"].split(". ")
+        )
+        + "</section>"
+        for section in bulletin["content"]
+    )
+    return (
+        f"<html><head><title>{html.escape(bulletin['title'])}</title>"
+        f'<link rel="canonical" href="{bulletin["url"]}">'
+        f'<meta property="og:url" content="{bulletin["url"]}">'
+        f'<meta name="citation_publication_date" '
+        f'content="{bulletin["release_date"]}"></head>'
+        f"<body><nav>{'<a href=#>link</a>' * 200}</nav><main>{sections}</main>"
+        f"</body></html>"
+    )
+
+
+def synthetic_corpus(directory: str, n_pages: int) -> None:
+    """Writes n_pages rendered from the bulletin JSONs in the repo."""
+    bulletins = []
+    for filename in glob.glob("data/bulletins/*.json") + glob.glob("tests/data/*.json"):
+        with open(filename) as file:
+            bulletins.append(json.load(file))
+    for n in range(n_pages):
+        with open(f"{directory}/page_{n}.html", "w", encoding="utf-8") as file:
+            file.write(render_page(bulletins[n % len(bulletins)]))
+
+
+def time_per_page(parse, pages: list[str]) -> float:
+    start = perf_counter()
+    for page in pages:
+        parse(page)
+    return (perf_counter() - start) / len(pages) * 1000
+
+
+def main(pages_dir: str, n_pages: int, processes: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        if not pages_dir or not os.listdir(pages_dir):
+            pages_dir = tmp
+            synthetic_corpus(pages_dir, n_pages)
+            print(f"Rendered {n_pages} synthetic pages from bulletin JSONs")
+
+        page_files = sorted(glob.glob(f"{pages_dir}/*.html"))
+        pages = []
+        for filename in page_files:
+            with open(filename, encoding="utf-8") as file:
+                pages.append(file.read())
+        size_mb = sum(len(x) for x in pages) / 1e6
+        print(f"{len(pages)} pages, {size_mb:.1f} MB")
+
+        bs4_ms = time_per_page(beautifulsoup_page, pages)
+        lxml_ms = time_per_page(parse_page, pages)
+        print(f"BeautifulSoup html.parser  {bs4_ms:8.2f} ms/page")
+        print(f"lxml parse_page            {lxml_ms:8.2f} ms/page")
+
+        start = perf_counter()
+        BulletinParser(pages_dir, f"{tmp}/bulletins", processes).parse_directory()
+        pool_seconds = perf_counter() - start
+        print(
+            f"BulletinParser pool        {pool_seconds / len(pages) * 1000:8.2f} "
+            f"ms/page wall clock, {len(pages) / pool_seconds:.0f} pages/s"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Per-page parse time of the lxml bulletin parser against the "
+        "previous BeautifulSoup parser, on saved pages or a synthetic corpus"
+    )
+    parser.add_argument("--pages-dir", default="statschat/webscraping/web_pages")
+    parser.add_argument("--n-pages", type=int, default=500)
+    parser.add_argument("--processes", type=int, default=0)
+    args = parser.parse_args()
+    if not os.path.isdir(args.pages_dir):
+        args.pages_dir = None
+    main(args.pages_dir, args.n_pages, args.processes)
@@ -0,0 +1,99 @@
+import argparse
+import faiss
+import numpy as np
+import toml
+from time import perf_counter
+from langchain.embeddings import HuggingFaceEmbeddings
+from statschat.faiss_index import INDEX_TYPES, make_index, set_search_params
+
+
+def load_vectors(faiss_db_root: str) -> np.ndarray:
+    """Recover the chunk embeddings from a vector store built with IndexFlatL2."""
+    index = faiss.read_index(f"{faiss_db_root}/index.faiss")
+    return index.reconstruct_n(0, index.ntotal)
+
+
+def make_queries(
+    vectors: np.ndarray, embedding_model: str, n_queries: int, seed: int = 0
+) -> np.ndarray:
+    """
+    Evaluation questions embedded with the store's model, topped up with
+    perturbed copies of stored chunks to give stable latency percentiles.
+    """
+    questions = list(
+        toml.load("statschat/model_evaluation/question_configuration.toml").keys()
+    )
+    embeddings = HuggingFaceEmbeddings(model_name=embedding_model)
+    queries = np.array(embeddings.embed_documents(questions), dtype=np.float32)
+
+    rng = np.random.default_rng(seed)
+    n_extra = max(0, n_queries - len(queries))
+    extra = vectors[rng.choice(len(vectors), n_extra)]
+    extra = extra + rng.normal(scale=0.05, size=extra.shape).astype(np.float32)
+
+    return np.vstack([queries, extra])
+
+
+def search_one_by_one(index, queries: np.ndarray, k: int):
+    """Search each query on its own, as the app does, timing each in ms."""
+    results, timings = [], []
+    for query in queries:
+        start = perf_counter()
+        _, ids = index.search(query[None, :], k)
+        timings.append((perf_counter() - start) * 1000)
+        results.append(ids[0])
+    return np.array(results), np.array(timings)
+
+
+def recall_at_k(exact: np.ndarray, approx: np.ndarray) -> float:
+    """Fraction of the exact top k found by the approximate search."""
+    hits = [len(set(e[e >= 0]) & set(a[a >= 0])) for e, a in zip(exact, approx)]
+    return float(np.mean(hits) / exact.shape[1])
+
+
+def main(config_file: str, faiss_db_root: str, k: int, n_queries: int):
+    config = toml.load(config_file)
+    faiss_db_root = faiss_db_root or config["db"]["faiss_db_root"]
+    vectors = load_vectors(faiss_db_root)
+    queries = make_queries(vectors, config["db"]["embedding_model"], n_queries)
+    index_params = {
+        key.replace("index_", "", 1): value
+        for key, value in config["setup"].items()
+        if key.startswith("index_") and key != "index_type"
+    }
+    print(f"{len(vectors)} vectors, {len(queries)} queries, k={k}")
+
+    exact = None
+    for index_type in INDEX_TYPES:
+        start = perf_counter()
+        index = make_index(index_type, vectors, **index_params)
+        index.add(vectors)
+        build_seconds = perf_counter() - start
+        set_search_params(
+            index,
+            nprobe=config["search"].get("nprobe"),
+            ef_search=config["search"].get("ef_search"),
+        )
+
+        ids, timings = search_one_by_one(index, queries, k)
+        if exact is None:
+            exact = ids
+        print(
+            f"{index_type:<14} recall@{k} {recall_at_k(exact, ids):.3f}"
+            f"  p50 {np.percentile(timings, 50):7.3f} ms"
+            f"  p99 {np.percentile(timings, 99):7.3f} ms"
+            f"  build {build_seconds:6.1f} s"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Recall@k against the exact flat index, and query latency, "
+        "for each supported FAISS index type"
+    )
+    parser.add_argument("--config", default="app_config.toml")
+    parser.add_argument("--faiss-db-root", default=None)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--n-queries", type=int, default=1000)
+    args = parser.parse_args()
+    main(args.config, args.faiss_db_root, args.k, args.n_queries)
@@ -0,0 +1,113 @@
+import argparse
+import multiprocessing
+import resource
+import statistics
+import toml
+from concurrent.futures import ProcessPoolExecutor
+from time import perf_counter
+from rapidfuzz import fuzz
+from statschat.llm import Inquirer
+from statschat.llm_backends import LLM_BACKENDS, load_generation_pipeline
+
+
+def current_rss_mb() -> float:
+    """Resident set size of this process, from /proc."""
+    with open("/proc/self/status") as file:
+        for line in file:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def build_prompts(model: str, faiss_db_root: str, questions: list[str]) -> list[str]:
+    """Retrieval only: the prompts Inquirer would generate answers from."""
+    # a generation_url stops Inquirer loading the LLM, which is never called here
+    inquirer = Inquirer(
+        model_name_or_path=model,
+        faiss_db_root=faiss_db_root,
+        generation_url="http://localhost:0",
+        answer_cache_size=0,
+    )
+    return [
+        inquirer.build_prompt(
+            question, inquirer.similarity_search(question)[: inquirer.k_contexts]
+        )
+        for question in questions
+    ]
+
+
+def run_backend(model: str, backend: str, prompts: list[str]) -> dict:
+    """Loads the LLM on one backend and answers each prompt, in a fresh process."""
+    start = perf_counter()
+    pipeline = load_generation_pipeline(model, backend=backend)
+    load_s = perf_counter() - start
+    rss_loaded = current_rss_mb()
+
+    # one warm-up call, so first-call allocation isn't counted as latency
+    pipeline(prompts[0])
+    answers, timings = [], []
+    for prompt in prompts:
+        start = perf_counter()
+        answers.append(pipeline(prompt)[0]["generated_text"])
+        timings.append((perf_counter() - start) * 1000)
+
+    return {
+        "load_s": load_s,
+        "rss_loaded_mb": rss_loaded,
+        "rss_peak_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "timings": timings,
+        "answers": answers,
+    }
+
+
+def main(model: str, faiss_db_root: str, question_file: str, backends: list[str]):
+    questions = list(toml.load(question_file))
+    prompts = build_prompts(model, faiss_db_root, questions)
+
+    results = {}
+    context = multiprocessing.get_context("spawn")
+    for backend in backends:
+        # a process per backend, so each RSS figure is for that backend alone
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            results[backend] = pool.submit(
+                run_backend, model, backend, prompts
+            ).result()
+
+    baseline = results.get("pytorch")
+    print(f"{model}, {len(prompts)} evaluation questions")
+    for backend, result in results.items():
+        timings = sorted(result["timings"])
+        p95 = timings[min(len(timings) - 1, int(0.95 * len(timings)))]
+        line = (
+            f"{backend:<8} load {result['load_s']:6.1f} s"
+            f"  median {statistics.median(timings):8.1f} ms  p95 {p95:8.1f} ms"
+            f"  rss {result['rss_loaded_mb']:7.0f} MB"
+            f"  peak {result['rss_peak_mb']:7.0f} MB"
+        )
+        if baseline and backend != "pytorch":
+            pairs = list(zip(baseline["answers"], result["answers"]))
+            exact = sum(a.strip() == b.strip() for a, b in pairs) / len(pairs)
+            similarity = statistics.mean(fuzz.ratio(a, b) for a, b in pairs)
+            line += f"  agreement exact {exact:.0%} similarity {similarity:.1f}"
+        print(line)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Compare latency, memory and answers of the LLM backends "
+        "against the fp32 PyTorch baseline, on the evaluation questions"
+    )
+    parser.add_argument("--model", default="google/flan-t5-large")
+    parser.add_argument("--faiss-db-root", default="data/db_langchain")
+    parser.add_argument(
+        "--questions",
+        default="statschat/model_evaluation/question_configuration.toml",
+    )
+    parser.add_argument(
+        "--backends",
+        nargs="+",
+        choices=LLM_BACKENDS,
+        default=list(LLM_BACKENDS),
+    )
+    args = parser.parse_args()
+    main(args.model, args.faiss_db_root, args.questions, args.backends)
@@ -0,0 +1,105 @@
+import argparse
+import statistics
+from time import perf_counter
+from langchain import HuggingFacePipeline
+from langchain.chains.question_answering import load_qa_chain
+from langchain.docstore.document import Document
+from statschat.llm import Inquirer, generate_prompt
+from statschat.llm_backends import LLM_BACKENDS
+
+
+class _EchoPipeline:
+    """Stand-in for the HF pipeline, so only per-request overhead is timed."""
+
+    task = "text2text-generation"
+
+    def __call__(self, prompts, **kwargs):
+        prompts = [prompts] if isinstance(prompts, str) else prompts
+        return [{"generated_text": "NA"} for _ in prompts]
+
+
+def per_request_chain(inquirer: Inquirer, question: str, docs: list[dict]) -> str:
+    """The previous query_texts path, building a stuff chain on every request."""
+    chain = load_qa_chain(
+        inquirer.chain_llm, chain_type="stuff", prompt=generate_prompt
+    )
+    response = chain(
+        {
+            "input_documents": [
+                Document(page_content=doc["page_content"]) for doc in docs
+            ],
+            "question": question,
+        },
+        return_only_outputs=True,
+    )
+    return response["output_text"]
+
+
+def prebuilt_pipeline(inquirer: Inquirer, question: str, docs: list[dict]) -> str:
+    """The current query_texts path, prompt string straight to the pipeline."""
+    return inquirer.generate([inquirer.build_prompt(question, docs)])[0]
+
+
+def time_calls(fn, inquirer, question, docs, repeats) -> list[float]:
+    """Time repeated calls in milliseconds."""
+    timings = []
+    for _ in range(repeats):
+        start = perf_counter()
+        fn(inquirer, question, docs)
+        timings.append((perf_counter() - start) * 1000)
+    return timings
+
+
+def main(model: str, faiss_db_root: str, repeats: int, stub_llm: bool, backend: str):
+    # in process, as the chain can only wrap a local pipeline
+    inquirer = Inquirer(
+        model_name_or_path=model,
+        faiss_db_root=faiss_db_root,
+        answer_cache_size=0,
+        generation_url="",
+        llm_backend=backend,
+    )
+    if stub_llm:
+        inquirer.generate_pipeline = _EchoPipeline()
+    # the LangChain LLM the previous path passed to the chain, which Inquirer
+    # only keeps for the pytorch backend, so wrap whichever pipeline is loaded
+    inquirer.chain_llm = HuggingFacePipeline(pipeline=inquirer.generate_pipeline)
+
+    question = "How many national parks are there in England?"
+    docs = inquirer.similarity_search(question)[: inquirer.k_contexts]
+
+    # warm up both paths before timing
+    for fn in [per_request_chain, prebuilt_pipeline]:
+        fn(inquirer, question, docs)
+
+    results = {
+        fn.__name__: time_calls(fn, inquirer, question, docs, repeats)
+        for fn in [per_request_chain, prebuilt_pipeline]
+    }
+    for name, timings in results.items():
+        print(
+            f"{name:<20} median {statistics.median(timings):9.3f} ms"
+            f"  mean {statistics.mean(timings):9.3f} ms  (n={repeats})"
+        )
+    saved = statistics.median(results["per_request_chain"]) - statistics.median(
+        results["prebuilt_pipeline"]
+    )
+    print(f"per-request overhead removed: {saved:.3f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Compare per-request QA chain construction with the "
+        "prebuilt generation pipeline used by Inquirer.query_texts"
+    )
+    parser.add_argument("--model", default="google/flan-t5-small")
+    parser.add_argument("--faiss-db-root", default="tests/data/db_test")
+    parser.add_argument("--repeats", type=int, default=50)
+    parser.add_argument("--llm-backend", choices=LLM_BACKENDS, default="pytorch")
+    parser.add_argument(
+        "--stub-llm",
+        action="store_true",
+        help="replace the model with a stub, timing only the framework overhead",
+    )
+    args = parser.parse_args()
+    main(args.model, args.faiss_db_root, args.repeats, args.stub_llm, args.llm_backend)
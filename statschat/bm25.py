@@ -0,0 +1,200 @@
+import math
+import re
+import numpy as np
+from collections import Counter
+from pathlib import Path
+
+# Lexical index, saved alongside the FAISS index
+BM25_FILE = "bm25.npz"
+
+# Words, numbers and codes such as "cpih", "2023" or "3.4"
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:\.[0-9]+)*")
+
+
+def tokenize(text: str) -> list[str]:
+    """Lowercase word and number tokens, as indexed and queried by BM25."""
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class BM25Index:
+    """
+    Okapi BM25 over the chunks of a vector store, with documents numbered by
+    their position in the FAISS index.  Postings are held as flat arrays in
+    compressed sparse row form: the documents containing term t, and how
+    often, are doc_ids[offsets[t]:offsets[t + 1]] and the matching slice of
+    term_freqs.
+    """
+
+    def __init__(
+        self,
+        terms: list[str],
+        offsets: np.ndarray,
+        doc_ids: np.ndarray,
+        term_freqs: np.ndarray,
+        doc_lengths: np.ndarray,
+        k1: float = 1.2,
+        b: float = 0.75,
+    ):
+        """
+        Args:
+            terms (list[str]): Vocabulary, indexed by term id.
+            offsets (np.ndarray): Start of each term's postings, plus the end.
+            doc_ids (np.ndarray): Documents in each posting list.
+            term_freqs (np.ndarray): Term counts in each posting list.
+            doc_lengths (np.ndarray): Tokens in each document.
+            k1 (float, optional): Term frequency saturation. Defaults to 1.2.
+            b (float, optional): Document length normalisation. Defaults to 0.75.
+        """
+        self.terms = terms
+        self.vocabulary = {term: i for i, term in enumerate(terms)}
+        self.offsets = offsets
+        self.doc_ids = doc_ids
+        self.term_freqs = term_freqs
+        self.doc_lengths = doc_lengths
+        self.k1 = k1
+        self.b = b
+
+        n_docs = len(doc_lengths)
+        doc_freqs = np.diff(offsets)
+        self.idf = np.log1p((n_docs - doc_freqs + 0.5) / (doc_freqs + 0.5)).astype(
+            np.float32
+        )
+        mean_length = doc_lengths.mean() if n_docs else 1.0
+        self.length_norm = (
+            k1 * (1 - b + b * doc_lengths / max(mean_length, 1.0))
+        ).astype(np.float32)
+
+        return None
+
+    def __len__(self) -> int:
+        return len(self.doc_lengths)
+
+    @classmethod
+    def build(cls, texts: list[str], k1: float = 1.2, b: float = 0.75):
+        """
+        Indexes texts, numbered in the order given.
+
+        Args:
+            texts (list[str]): Chunk texts, in FAISS index order.
+
+        Returns:
+            BM25Index: The built index.
+        """
+        vocabulary = {}
+        term_ids, doc_ids, term_freqs, doc_lengths = [], [], [], []
+        for doc_id, text in enumerate(texts):
+            tokens = tokenize(text)
+            doc_lengths.append(len(tokens))
+            for term, freq in Counter(tokens).items():
+                term_ids.append(vocabulary.setdefault(term, len(vocabulary)))
+                doc_ids.append(doc_id)
+                term_freqs.append(freq)
+
+        # group postings by term, keeping documents in order within each
+        term_ids = np.array(term_ids, dtype=np.int64)
+        order = np.argsort(term_ids, kind="stable")
+        offsets = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(term_ids, minlength=len(vocabulary)), out=offsets[1:])
+        term_freqs = np.minimum(term_freqs, np.iinfo(np.uint16).max)
+
+        return cls(
+            list(vocabulary),
+            offsets,
+            np.array(doc_ids, dtype=np.int32)[order],
+            np.array(term_freqs, dtype=np.uint16)[order],
+            np.array(doc_lengths, dtype=np.int32),
+            k1=k1,
+            b=b,
+        )
+
+    def scores(self, query: str) -> np.ndarray:
+        """BM25 score of every document for a query, 0 where no term matches."""
+        scores = np.zeros(len(self), dtype=np.float32)
+        for term in set(tokenize(query)):
+            term_id = self.vocabulary.get(term)
+            if term_id is None:
+                continue
+            start, end = self.offsets[term_id], self.offsets[term_id + 1]
+            docs = self.doc_ids[start:end]
+            freqs = self.term_freqs[start:end].astype(np.float32)
+            # each document appears once per posting list, so no collisions
+            scores[docs] += (
+                self.idf[term_id]
+                * freqs
+                * (self.k1 + 1)
+                / (freqs + self.length_norm[docs])
+            )
+        return scores
+
+    def search(
+        self, query: str, k: int, mask: np.ndarray = None
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Top k documents for a query by BM25 score.
+
+        Args:
+            query (str): Search text.
+            k (int): Most documents returned.
+            mask (np.ndarray, optional): Boolean array of the documents to
+                search. Defaults to None, all documents.
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: Scores, highest first, and the
+                matching document positions. Documents scoring 0 are left out.
+        """
+        scores = self.scores(query)
+        if mask is not None:
+            scores[~mask] = 0
+        k = min(k, int(np.count_nonzero(scores)))
+        if k == 0:
+            return np.empty(0, dtype=np.float32), np.empty(0, dtype=np.int64)
+
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return scores[top], top
+
+    def save(self, faiss_db_root: str):
+        """Saves the index next to the vector store."""
+        np.savez(
+            Path(faiss_db_root) / BM25_FILE,
+            # newline separated UTF-8, far smaller than a fixed width array
+            terms=np.frombuffer("\n".join(self.terms).encode("utf-8"), np.uint8),
+            offsets=self.offsets,
+            doc_ids=self.doc_ids,
+            term_freqs=self.term_freqs,
+            doc_lengths=self.doc_lengths,
+            params=np.array([self.k1, self.b]),
+        )
+
+        return None
+
+    @classmethod
+    def load(cls, faiss_db_root: str):
+        """Loads the index saved next to a vector store."""
+        with np.load(Path(faiss_db_root) / BM25_FILE) as arrays:
+            k1, b = arrays["params"].tolist()
+            terms = arrays["terms"].tobytes().decode("utf-8")
+            return cls(
+                terms.split("\n") if terms else [],
+                arrays["offsets"],
+                arrays["doc_ids"],
+                arrays["term_freqs"],
+                arrays["doc_lengths"],
+                k1=k1,
+                b=b,
+            )
+
+
+def fuse_scores(
+    distances: np.ndarray, bm25_scores: np.ndarray, weight: float
+) -> np.ndarray:
+    """
+    Combines dense L2 distances with BM25 scores for the same candidates,
+    shrinking each distance by up to `weight` in proportion to its BM25 score
+    relative to the best.  The result stays a distance, lower being better,
+    so thresholds on vector store scores still apply.
+    """
+    top = bm25_scores.max() if len(bm25_scores) else 0.0
+    if top <= 0 or math.isclose(weight, 0.0):
+        return distances
+    return distances * (1 - weight * bm25_scores / top)
@@ -0,0 +1,312 @@
+import hashlib
+import html
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import numpy as np
+from collections import OrderedDict
+from pathlib import Path
+
+
+def normalise_question(question: str) -> str:
+    """
+    Reduces a question to a canonical form for cache lookups, so that
+    trivially different phrasings ("What is CPI?", "what is cpi") match.
+
+    Args:
+        question (str): The user query, possibly HTML escaped.
+
+    Returns:
+        str: lowercase question with punctuation and repeated whitespace removed.
+    """
+    question = html.unescape(str(question)).lower()
+    question = re.sub(r"[^\w\s]", " ", question)
+    return " ".join(question.split())
+
+
+def chunk_key(doc: dict) -> str:
+    """Utility, identify a retrieved chunk by id, or by its text for older stores."""
+    if doc.get("chunk_id"):
+        return doc["chunk_id"]
+    return hashlib.sha1(doc["page_content"].encode()).hexdigest()[:16]
+
+
+def vector_store_version(faiss_db_root: str) -> str:
+    """
+    Fingerprints the files of a saved vector store, so that anything cached
+    against one build of the store is not reused against another.
+    """
+    stamp = [
+        (path.name, path.stat().st_size, path.stat().st_mtime_ns)
+        for path in sorted(Path(faiss_db_root).glob("*"))
+        if path.is_file()
+    ]
+    return hashlib.sha1(json.dumps(stamp).encode()).hexdigest()[:16]
+
+
+class AnswerCache:
+    """
+    Bounded LRU cache of generated answers, with an optional time-to-live and
+    an optional SQLite backend so that answers survive restarts.  Entries are
+    keyed on the normalised question, the chunks passed as context and the
+    version of the vector store they were retrieved from.
+    """
+
+    def __init__(
+        self,
+        max_size: int = 1024,
+        ttl: float = 0,
+        path: str = None,
+        version: str = "",
+    ):
+        """
+        Args:
+            max_size (int, optional): Maximum number of answers held in memory,
+                0 disables the cache. Defaults to 1024.
+            ttl (float, optional): Seconds before an answer expires, 0 for never.
+                Defaults to 0.
+            path (str, optional): SQLite file for the on-disk backend.
+                Defaults to None, memory only.
+            version (str, optional): Vector store version, entries cached
+                against any other version are discarded. Defaults to "".
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.path = path
+        self.version = version
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+
+        if path and max_size > 0:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self._connect()
+            self._db.execute(
+                """CREATE TABLE IF NOT EXISTS answers (
+                    key TEXT PRIMARY KEY, version TEXT, answer TEXT, created REAL
+                )"""
+            )
+            self._db.execute("DELETE FROM answers WHERE version != ?", (version,))
+            if self.ttl:
+                self._db.execute(
+                    "DELETE FROM answers WHERE created < ?", (time.time() - ttl,)
+                )
+            self._db.commit()
+
+        return None
+
+    def _connect(self):
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+
+    def after_fork(self):
+        """
+        Opens a connection of its own in a forked process, as SQLite
+        connections must not be used across fork.
+        """
+        self._lock = threading.Lock()
+        if self._db is not None:
+            # the parent's connection is left unclosed, closing it here
+            # could disturb the parent's use of the same file
+            self._connect()
+
+        return None
+
+    def key(self, question: str, docs: list[dict]) -> str:
+        """Cache key for a question answered from a set of retrieved chunks."""
+        signature = [self.version, normalise_question(question)]
+        signature += [chunk_key(doc) for doc in docs]
+        return hashlib.sha256(json.dumps(signature).encode()).hexdigest()
+
+    def _expired(self, created: float) -> bool:
+        return bool(self.ttl) and time.time() - created > self.ttl
+
+    def get(self, key: str) -> str:
+        """Returns the cached answer, or None if absent or expired."""
+        if self.max_size <= 0:
+            return None
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None and self._db is not None:
+                entry = self._db.execute(
+                    "SELECT answer, created FROM answers WHERE key = ?", (key,)
+                ).fetchone()
+                if entry is not None:
+                    self._store(key, tuple(entry))
+
+            if entry is not None and self._expired(entry[1]):
+                self._entries.pop(key, None)
+                entry = None
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key: str, answer: str):
+        """Stores an answer, evicting the least recently used beyond max_size."""
+        if self.max_size <= 0:
+            return None
+
+        entry = (answer, time.time())
+        with self._lock:
+            self._store(key, entry)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO answers VALUES (?, ?, ?, ?)",
+                    (key, self.version, *entry),
+                )
+                self._db.commit()
+
+        return None
+
+    def _store(self, key: str, entry: tuple):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        """Drops every cached answer, in memory and on disk."""
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM answers")
+                self._db.commit()
+
+        return None
+
+    def stats(self) -> dict:
+        """Hit-rate counters for monitoring."""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+class QueryCache:
+    """
+    LRU cache in front of the embedder and the vector store search, keyed
+    on the normalised question.  Query vectors are held as float32 arrays,
+    and the top-k (scores, indices) of each search under the vector store
+    version and search settings it ran with.  Entries are evicted least
+    recently used first once their total size exceeds a byte budget.
+    """
+
+    # rough per-entry cost of the key and bookkeeping, beyond the arrays
+    ENTRY_OVERHEAD = 128
+
+    def __init__(self, max_bytes: int = 16 * 2**20, version: str = ""):
+        """
+        Args:
+            max_bytes (int, optional): Memory budget for cached arrays, 0
+                disables the cache. Defaults to 16 MiB.
+            version (str, optional): Vector store version, which search
+                results are cached against. Defaults to "".
+        """
+        self.max_bytes = max_bytes
+        self.version = version
+        self.bytes = 0
+        self.hits = {"vectors": 0, "results": 0}
+        self.misses = {"vectors": 0, "results": 0}
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        return None
+
+    def _get(self, kind: str, key: tuple):
+        if self.max_bytes <= 0:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses[kind] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits[kind] += 1
+            return entry[0]
+
+    def _set(self, key: tuple, value, size: int):
+        size += self.ENTRY_OVERHEAD
+        if size > self.max_bytes:
+            return None
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.bytes -= previous[1]
+            self._entries[key] = (value, size)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self.bytes -= evicted
+
+        return None
+
+    def get_vector(self, question: str) -> np.ndarray:
+        """The cached query vector for a question, or None."""
+        return self._get("vectors", ("vector", normalise_question(question)))
+
+    def set_vector(self, question: str, vector):
+        """Caches a question's query vector, as float32."""
+        vector = np.asarray(vector, dtype=np.float32)
+        vector.flags.writeable = False
+        self._set(("vector", normalise_question(question)), vector, vector.nbytes)
+
+        return None
+
+    def get_results(
+        self, question: str, signature: tuple
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        The cached (scores, indices) of a search for a question, or None
+
+        Args:
+            question (str): The user query.
+            signature (tuple): Search settings and filters the results
+                depend on, beyond the question and vector store version.
+        """
+        key = ("results", self.version, normalise_question(question), signature)
+        return self._get("results", key)
+
+    def set_results(
+        self, question: str, signature: tuple, scores: np.ndarray, indices: np.ndarray
+    ):
+        """Caches the top-k scores and indices of a search for a question."""
+        key = ("results", self.version, normalise_question(question), signature)
+        scores = np.asarray(scores, dtype=np.float32)
+        indices = np.asarray(indices, dtype=np.int64)
+        scores.flags.writeable = indices.flags.writeable = False
+        self._set(key, (scores, indices), scores.nbytes + indices.nbytes)
+
+        return None
+
+    def clear(self):
+        """Drops every cached vector and search result."""
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+        return None
+
+    def stats(self) -> dict:
+        """Size and hit-rate counters for monitoring."""
+        stats = {"size": len(self._entries), "bytes": self.bytes}
+        for kind in ("vectors", "results"):
+            lookups = self.hits[kind] + self.misses[kind]
+            stats[kind] = {
+                "hits": self.hits[kind],
+                "misses": self.misses[kind],
+                "hit_rate": round(self.hits[kind] / lookups, 4) if lookups else 0.0,
+            }
+        return stats
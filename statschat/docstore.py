@@ -0,0 +1,159 @@
+import faiss
+import json
+import os
+import sqlite3
+import threading
+from collections.abc import Mapping
+from pathlib import Path
+from typing import Union
+from langchain.docstore.base import Docstore
+from langchain.docstore.document import Document
+from langchain.embeddings.base import Embeddings
+from langchain.vectorstores import FAISS
+
+# Read-only copy of the docstore, saved alongside the FAISS index
+DOCSTORE_FILE = "docstore.sqlite"
+
+
+def write_sqlite_docstore(db: FAISS, faiss_db_root: str):
+    """
+    Writes the chunks of a vector store to a SQLite file, keyed on their
+    position in the FAISS index, so they can be served without unpickling
+    the whole docstore.  The file is replaced atomically.
+    """
+    path = Path(faiss_db_root) / DOCSTORE_FILE
+    tmp_path = path.with_suffix(".tmp")
+    if tmp_path.exists():
+        os.remove(tmp_path)
+
+    con = sqlite3.connect(tmp_path)
+    con.execute(
+        """CREATE TABLE chunks (
+            position INTEGER PRIMARY KEY,
+            id TEXT UNIQUE,
+            page_content TEXT,
+            metadata TEXT
+        )"""
+    )
+    con.executemany(
+        "INSERT INTO chunks VALUES (?, ?, ?, ?)",
+        (
+            (position, _id, doc.page_content, json.dumps(doc.metadata))
+            for position, _id in sorted(db.index_to_docstore_id.items())
+            for doc in [db.docstore.search(_id)]
+        ),
+    )
+    con.commit()
+    con.close()
+    os.replace(tmp_path, path)
+
+    return None
+
+
+class SQLiteDocstore(Docstore):
+    """
+    Read-only docstore over the SQLite file written by write_sqlite_docstore.
+    The file is memory mapped, so chunk text is only read for the ids a
+    search returns and worker processes share the OS page cache.
+    """
+
+    # below SQLite's bound variable limit, 999 on older builds
+    POSITIONS_PER_QUERY = 900
+
+    def __init__(self, path: str, mmap_size: int = 2**30):
+        self.path = path
+        self.mmap_size = mmap_size
+        self._local = threading.local()
+
+    @property
+    def _con(self) -> sqlite3.Connection:
+        # one connection per thread, and never reuse one across a fork
+        if getattr(self._local, "pid", None) != os.getpid():
+            self._local.con = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+            self._local.con.execute(f"PRAGMA mmap_size={self.mmap_size}")
+            self._local.pid = os.getpid()
+        return self._local.con
+
+    @staticmethod
+    def _document(page_content: str, metadata: str) -> Document:
+        return Document(page_content=page_content, metadata=json.loads(metadata))
+
+    def search(self, search: str) -> Union[str, Document]:
+        """Fetch a chunk by docstore id, as langchain's Docstore interface."""
+        row = self._con.execute(
+            "SELECT page_content, metadata FROM chunks WHERE id = ?", (search,)
+        ).fetchone()
+        if row is None:
+            return f"ID {search} not found."
+        return self._document(*row)
+
+    def search_positions(self, positions: list[int]) -> dict[int, Document]:
+        """
+        Fetch the chunks at several FAISS index positions, in as few queries
+        as SQLite's limit on bound variables allows.
+        """
+        positions = [int(x) for x in positions]
+        documents = {}
+        for start in range(0, len(positions), self.POSITIONS_PER_QUERY):
+            batch = positions[start : start + self.POSITIONS_PER_QUERY]
+            rows = self._con.execute(
+                "SELECT position, page_content, metadata FROM chunks "
+                f"WHERE position IN ({', '.join('?' * len(batch))})",
+                batch,
+            ).fetchall()
+            documents.update((row[0], self._document(*row[1:])) for row in rows)
+        return documents
+
+    def id_at(self, position: int) -> str:
+        """Docstore id of the chunk at a FAISS index position."""
+        row = self._con.execute(
+            "SELECT id FROM chunks WHERE position = ?", (int(position),)
+        ).fetchone()
+        if row is None:
+            raise KeyError(position)
+        return row[0]
+
+    def __len__(self) -> int:
+        return self._con.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+
+class SQLiteIndexMapping(Mapping):
+    """index_to_docstore_id for langchain's FAISS, looked up on demand."""
+
+    def __init__(self, docstore: SQLiteDocstore):
+        self.docstore = docstore
+
+    def __getitem__(self, position: int) -> str:
+        return self.docstore.id_at(position)
+
+    def __iter__(self):
+        return iter(range(len(self)))
+
+    def __len__(self) -> int:
+        return len(self.docstore)
+
+
+def index_is_mapped(index: faiss.Index) -> bool:
+    """
+    Whether FAISS memory maps an index read with IO_FLAG_MMAP, which it only
+    does for the inverted lists of IVF indexes.  Others are read into memory.
+    """
+    try:
+        faiss.extract_index_ivf(index)
+    except RuntimeError:
+        return False
+    return True
+
+
+def load_lazy_store(faiss_db_root: str, embeddings: Embeddings) -> FAISS:
+    """
+    Loads a saved vector store with chunks served from the SQLite docstore,
+    in place of FAISS.load_local.  The FAISS index is read with the memory
+    map flag, which maps the vectors of IVF indexes only, see index_is_mapped.
+    """
+    index = faiss.read_index(
+        str(Path(faiss_db_root) / "index.faiss"),
+        faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY,
+    )
+    docstore = SQLiteDocstore(str(Path(faiss_db_root) / DOCSTORE_FILE))
+    return FAISS(embeddings.embed_query, index, docstore, SQLiteIndexMapping(docstore))
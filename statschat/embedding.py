@@ -0,0 +1,475 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import numpy as np
+from collections import OrderedDict
+from pathlib import Path
+from langchain.embeddings import HuggingFaceEmbeddings
+from langchain.embeddings.base import Embeddings
+from transformers import AutoTokenizer
+from transformers.utils import cached_file
+
+# Ways to run the embedding model on CPU, as for the LLM in llm_backends
+EMBEDDING_BACKENDS = ("pytorch", "int8", "onnx")
+
+# Texts whose embeddings are compared against the reference model, a mix of
+# short questions and chunk-like passages
+VALIDATION_TEXTS = [
+    "What is CPI?",
+    "how many people were unemployed in 2020?",
+    "What was the rate of inflation in the UK last month?",
+    "The Consumer Prices Index including owner occupiers' housing costs (CPIH) "
+    "rose by 6.3% in the 12 months to September 2023, the same rate as in "
+    "August 2023.",
+    "An estimated 59% of adults in Great Britain watched or followed the "
+    "coronation of King Charles III and Queen Camilla.",
+    "Long-term international migration provisional: year ending December 2022. "
+    "Net migration was estimated to be 606,000 in 2022.",
+]
+
+
+class ShardedEmbedder:
+    """
+    Embeds texts in fixed size shards, checkpointing each shard to disk as a
+    .npy array with a JSON list of its ids, so that an interrupted build
+    resumes from the last completed shard instead of starting over.
+    sentence-transformers models are run across a pool of processes.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        shard_directory: str,
+        shard_size: int = 10000,
+        batch_size: int = 32,
+        processes: int = 0,
+        logger: logging.Logger = None,
+    ):
+        """
+        Args:
+            embeddings (Embeddings): Model to embed with.
+            shard_directory (str): Folder holding the shard checkpoints.
+            shard_size (int, optional): Texts per shard. Defaults to 10000.
+            batch_size (int, optional): Texts per forward pass. Defaults to 32.
+            processes (int, optional): Worker processes for sentence-transformers
+                models, 0 for one per CPU and 1 to embed in this process.
+                Defaults to 0.
+        """
+        # Initialise logger
+        if logger is None:
+            self.logger = logging.getLogger(__name__)
+
+        else:
+            self.logger = logger
+
+        self.embeddings = embeddings
+        self.shard_directory = Path(shard_directory)
+        self.shard_size = max(1, shard_size)
+        self.batch_size = batch_size
+        self.processes = processes or os.cpu_count()
+        self._pool = None
+
+        return None
+
+    def embed(self, texts: list[str], ids: list[str]) -> np.ndarray:
+        """
+        Embeds texts shard by shard, reusing any checkpointed shard whose ids
+        and texts match, and returns all embeddings in input order.
+
+        Args:
+            texts (list[str]): Texts to embed.
+            ids (list[str]): Unique id for each text, recorded with the shards.
+
+        Returns:
+            np.ndarray: float32 embeddings, one row per text.
+        """
+        os.makedirs(self.shard_directory, exist_ok=True)
+        n_shards = -(-len(texts) // self.shard_size)
+
+        shards = []
+        try:
+            for shard in range(n_shards):
+                start = shard * self.shard_size
+                shard_texts = texts[start : start + self.shard_size]
+                shard_ids = ids[start : start + self.shard_size]
+
+                vectors = self._load_shard(shard, shard_ids, shard_texts)
+                if vectors is None:
+                    self.logger.info(
+                        f"Embedding shard {shard + 1} of {n_shards} "
+                        f"({len(shard_texts)} texts)"
+                    )
+                    vectors = self._encode(shard_texts)
+                    self._save_shard(shard, shard_ids, shard_texts, vectors)
+                else:
+                    self.logger.info(f"Resuming from shard {shard + 1} checkpoint")
+                shards.append(vectors)
+        finally:
+            self.close()
+
+        if not shards:
+            return np.empty((0, 0), dtype=np.float32)
+        return np.vstack(shards)
+
+    def close(self):
+        """Stops the sentence-transformers process pool, if started."""
+        if self._pool is not None:
+            self.embeddings.client.stop_multi_process_pool(self._pool)
+            self._pool = None
+
+        return None
+
+    def _encode(self, texts: list[str]) -> np.ndarray:
+        if not isinstance(self.embeddings, HuggingFaceEmbeddings):
+            return np.array(self.embeddings.embed_documents(texts), dtype=np.float32)
+
+        # as HuggingFaceEmbeddings.embed_documents, but with our batch size
+        texts = [x.replace("\n", " ") for x in texts]
+        encode_kwargs = dict(self.embeddings.encode_kwargs)
+        if self.processes > 1 and len(texts) > self.batch_size:
+            if self._pool is None:
+                self.logger.info(f"Starting {self.processes} embedding processes")
+                self._pool = self.embeddings.client.start_multi_process_pool(
+                    target_devices=["cpu"] * self.processes
+                )
+            vectors = self.embeddings.client.encode_multi_process(
+                texts, self._pool, batch_size=self.batch_size
+            )
+            if encode_kwargs.get("normalize_embeddings"):
+                vectors = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+        else:
+            encode_kwargs.setdefault("batch_size", self.batch_size)
+            vectors = self.embeddings.client.encode(texts, **encode_kwargs)
+
+        return np.asarray(vectors, dtype=np.float32)
+
+    def _shard_paths(self, shard: int) -> tuple[Path, Path]:
+        name = f"shard_{shard:05d}"
+        return (
+            self.shard_directory / f"{name}.npy",
+            self.shard_directory / f"{name}.json",
+        )
+
+    @staticmethod
+    def _texts_hash(texts: list[str]) -> str:
+        digest = hashlib.sha1()
+        for text in texts:
+            digest.update(text.encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def _load_shard(
+        self, shard: int, ids: list[str], texts: list[str]
+    ) -> np.ndarray | None:
+        vectors_path, ids_path = self._shard_paths(shard)
+        if not ids_path.exists():
+            return None
+
+        with open(ids_path) as file:
+            checkpoint = json.load(file)
+        if checkpoint["ids"] != ids or checkpoint["hash"] != self._texts_hash(texts):
+            self.logger.info(f"Shard {shard + 1} checkpoint is stale, re-embedding")
+            return None
+
+        return np.load(vectors_path)
+
+    def _save_shard(
+        self, shard: int, ids: list[str], texts: list[str], vectors: np.ndarray
+    ):
+        vectors_path, ids_path = self._shard_paths(shard)
+        np.save(vectors_path, vectors)
+
+        # the id list is written last, and atomically, to mark the shard done
+        tmp_path = ids_path.with_suffix(".tmp")
+        with open(tmp_path, "w") as file:
+            json.dump({"ids": ids, "hash": self._texts_hash(texts)}, file)
+        os.replace(tmp_path, ids_path)
+
+        return None
+
+
+def _sentence_transformer_config(model_name: str) -> dict:
+    """
+    Pooling, normalisation and maximum sequence length of a
+    sentence-transformers model, read from the files that describe its
+    modules, so the exported transformer is pooled as the original.
+    """
+
+    def read(filename: str) -> dict | list:
+        path = cached_file(
+            model_name, filename, _raise_exceptions_for_missing_entries=False
+        )
+        if path is None:
+            return {}
+        with open(path) as file:
+            return json.load(file)
+
+    modules = read("modules.json") or []
+    pooling = read("1_Pooling/config.json")
+    return {
+        "cls_pooling": bool(pooling.get("pooling_mode_cls_token")),
+        "normalize": any(m.get("type", "").endswith("Normalize") for m in modules),
+        "max_seq_length": read("sentence_bert_config.json").get("max_seq_length", 512),
+    }
+
+
+class FastEmbeddings(Embeddings):
+    """
+    Runs a sentence-transformers model on a faster CPU backend: an ONNX
+    Runtime export, or PyTorch with its linear layers dynamically quantised
+    to int8.  Texts are tokenised once and kept in a small LRU cache, as the
+    same questions recur.  On first use the vectors are compared with the
+    reference sentence-transformers model, and the embedder refuses to load
+    if they drift beyond a tolerance, as the vector store was built with
+    the reference model and would then be searched with mismatched queries.
+    """
+
+    def __init__(
+        self,
+        model_name: str = "sentence-transformers/all-mpnet-base-v2",
+        backend: str = "onnx",
+        threads: int = 0,
+        batch_size: int = 32,
+        tokenisation_cache_size: int = 1024,
+        tolerance: float = 0.02,
+        export_root: str = "models",
+        logger: logging.Logger = None,
+    ):
+        """
+        Args:
+            model_name (str, optional): Hugging Face sentence-transformers
+                model id, or local path.
+                Defaults to "sentence-transformers/all-mpnet-base-v2".
+            backend (str, optional): "onnx" or "int8". Defaults to "onnx".
+            threads (int, optional): Intra-op threads per forward pass, 0 for
+                the backend default. Defaults to 0.
+            batch_size (int, optional): Texts per forward pass. Defaults to 32.
+            tokenisation_cache_size (int, optional): Tokenised texts kept,
+                0 disables the cache. Defaults to 1024.
+            tolerance (float, optional): Largest cosine distance allowed
+                from the reference model's vectors. Defaults to 0.02.
+            export_root (str, optional): Directory ONNX exports and
+                validation results are cached in. Defaults to "models".
+
+        Raises:
+            ValueError: If the backend is unknown, or its vectors are not
+                within tolerance of the reference model.
+        """
+        # Initialise logger
+        if logger is None:
+            self.logger = logging.getLogger(__name__)
+
+        else:
+            self.logger = logger
+
+        if backend not in ("onnx", "int8"):
+            raise ValueError(f"Unknown embedding_backend {backend}")
+
+        self.model_name = model_name
+        self.backend = backend
+        self.batch_size = batch_size
+        self.tokenisation_cache_size = tokenisation_cache_size
+        self.tolerance = tolerance
+        self.config = _sentence_transformer_config(model_name)
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        self._tokens = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.export_dir = (
+            Path(export_root) / f"{model_name.replace('/', '--')}-{backend}"
+        )
+        if backend == "onnx":
+            self.model = self._onnx_model(threads)
+        else:
+            self.model = self._int8_model(threads)
+
+        self.validate()
+
+        return None
+
+    def _onnx_model(self, threads: int):
+        """ONNX Runtime session for the transformer, exported on first use."""
+        try:
+            import onnxruntime
+            from optimum.onnxruntime import ORTModelForFeatureExtraction
+        except ImportError as e:
+            raise ImportError(
+                "The onnx embedding backend needs optimum: "
+                "pip install optimum[onnxruntime]"
+            ) from e
+
+        options = onnxruntime.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+            options.inter_op_num_threads = 1
+
+        if (self.export_dir / "config.json").exists():
+            self.logger.info(f"Loading ONNX export from {self.export_dir}")
+            return ORTModelForFeatureExtraction.from_pretrained(
+                self.export_dir, session_options=options
+            )
+
+        self.logger.info(f"Exporting {self.model_name} to ONNX in {self.export_dir}")
+        model = ORTModelForFeatureExtraction.from_pretrained(
+            self.model_name, export=True, session_options=options
+        )
+        model.save_pretrained(self.export_dir)
+        return model
+
+    def _int8_model(self, threads: int):
+        """Transformer with its linear layers quantised to int8 at load."""
+        import torch
+        from transformers import AutoModel
+
+        if threads:
+            # torch's thread pool is per process, shared with the LLM
+            torch.set_num_threads(threads)
+        model = AutoModel.from_pretrained(self.model_name).eval()
+        return torch.quantization.quantize_dynamic(
+            model, {torch.nn.Linear}, dtype=torch.qint8
+        )
+
+    def _tokenise(self, texts: list[str]) -> dict:
+        """Padded model inputs for a batch, tokenising uncached texts only."""
+        with self._lock:
+            tokens = [self._tokens.get(text) for text in texts]
+            for text, token in zip(texts, tokens):
+                if token is not None:
+                    self._tokens.move_to_end(text)
+
+        missing = [n for n, token in enumerate(tokens) if token is None]
+        if missing:
+            encoded = self.tokenizer(
+                [texts[n] for n in missing],
+                truncation=True,
+                max_length=self.config["max_seq_length"],
+            )
+            with self._lock:
+                for i, n in enumerate(missing):
+                    tokens[n] = {key: value[i] for key, value in encoded.items()}
+                    if self.tokenisation_cache_size > 0:
+                        self._tokens[texts[n]] = tokens[n]
+                while len(self._tokens) > self.tokenisation_cache_size:
+                    self._tokens.popitem(last=False)
+
+        return self.tokenizer.pad(
+            tokens, return_tensors="np" if self.backend == "onnx" else "pt"
+        )
+
+    def _forward(self, inputs: dict) -> np.ndarray:
+        if self.backend == "onnx":
+            return np.asarray(self.model(**inputs).last_hidden_state)
+
+        import torch
+
+        with torch.inference_mode():
+            return self.model(**inputs).last_hidden_state.numpy()
+
+    def _encode(self, texts: list[str]) -> np.ndarray:
+        """Pooled, and if the model says so normalised, float32 embeddings."""
+        vectors = []
+        for start in range(0, len(texts), self.batch_size):
+            inputs = self._tokenise(texts[start : start + self.batch_size])
+            hidden = self._forward(inputs)
+            if self.config["cls_pooling"]:
+                pooled = hidden[:, 0]
+            else:
+                mask = np.asarray(inputs["attention_mask"], dtype=np.float32)[
+                    :, :, None
+                ]
+                pooled = (hidden * mask).sum(axis=1) / np.maximum(
+                    mask.sum(axis=1), 1e-9
+                )
+            vectors.append(pooled)
+
+        vectors = np.vstack(vectors).astype(np.float32)
+        if self.config["normalize"]:
+            vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        """Embeds texts, as HuggingFaceEmbeddings.embed_documents."""
+        if not texts:
+            return []
+        return self._encode([x.replace("\n", " ") for x in texts]).tolist()
+
+    def embed_query(self, text: str) -> list[float]:
+        """Embeds a query, as HuggingFaceEmbeddings.embed_query."""
+        return self.embed_documents([text])[0]
+
+    def validate(self, texts: list[str] = None) -> float:
+        """
+        Compares embeddings with the reference sentence-transformers model.
+        The result for the default texts is saved with the export, so the
+        reference model is only loaded the first time.
+
+        Args:
+            texts (list[str], optional): Texts to compare on.
+                Defaults to VALIDATION_TEXTS.
+
+        Returns:
+            float: Largest cosine distance from the reference vectors.
+
+        Raises:
+            ValueError: If that distance exceeds the tolerance.
+        """
+        record = self.export_dir / "validation.json"
+        if texts is None and record.exists():
+            with open(record) as file:
+                distance = json.load(file)["max_cosine_distance"]
+        else:
+            self.logger.info(f"Validating {self.backend} embeddings")
+            reference = np.array(
+                HuggingFaceEmbeddings(model_name=self.model_name).embed_documents(
+                    texts or VALIDATION_TEXTS
+                )
+            )
+            vectors = np.array(self.embed_documents(texts or VALIDATION_TEXTS))
+            cosine = (reference * vectors).sum(axis=1) / (
+                np.linalg.norm(reference, axis=1) * np.linalg.norm(vectors, axis=1)
+            )
+            distance = float((1 - cosine).max())
+            if texts is None:
+                os.makedirs(self.export_dir, exist_ok=True)
+                with open(record, "w") as file:
+                    json.dump({"max_cosine_distance": distance}, file)
+
+        if distance > self.tolerance:
+            raise ValueError(
+                f"{self.backend} embeddings differ from {self.model_name} by "
+                f"{distance:.4f} cosine distance, more than {self.tolerance}; "
+                "use the pytorch embedding_backend with this vector store"
+            )
+        self.logger.info(f"{self.backend} embeddings within {distance:.4f} of fp32")
+
+        return distance
+
+
+def load_embeddings(
+    model_name: str,
+    backend: str = "pytorch",
+    threads: int = 0,
+    logger: logging.Logger = None,
+) -> Embeddings:
+    """
+    Loads the embedding model on one of EMBEDDING_BACKENDS
+
+    Args:
+        model_name (str): Hugging Face sentence-transformers model id.
+        backend (str, optional): "pytorch" for sentence-transformers in
+            fp32, "onnx" or "int8" for FastEmbeddings. Defaults to "pytorch".
+        threads (int, optional): Intra-op threads for the fast backends,
+            0 for the default. Defaults to 0.
+
+    Returns:
+        Embeddings: The loaded embedder.
+    """
+    if backend == "pytorch":
+        return HuggingFaceEmbeddings(model_name=model_name)
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(
+            f"Unknown embedding_backend {backend}, expected {EMBEDDING_BACKENDS}"
+        )
+    return FastEmbeddings(model_name, backend=backend, threads=threads, logger=logger)
@@ -0,0 +1,214 @@
+import faiss
+import logging
+import math
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+INDEX_TYPES = ("IndexFlatL2", "IndexIVFFlat", "IndexHNSWFlat", "IndexIVFPQ")
+
+
+def make_index(
+    index_type: str,
+    train_vectors: np.ndarray,
+    nlist: int = 100,
+    hnsw_m: int = 32,
+    pq_m: int = 48,
+    train_size: int = 50000,
+    seed: int = 42,
+) -> faiss.Index:
+    """
+    Creates an empty FAISS index of the requested type, trained where the
+    index type needs it on a random sample of the vectors to be indexed.
+
+    Args:
+        index_type (str): One of INDEX_TYPES.
+        train_vectors (np.ndarray): Embeddings to be indexed, one per row.
+        nlist (int, optional): Inverted lists (IVF cells) for IVF indexes,
+            reduced for small corpora. Defaults to 100.
+        hnsw_m (int, optional): Neighbours per node for HNSW. Defaults to 32.
+        pq_m (int, optional): Sub-quantizers for product quantization, must
+            divide the embedding dimension. Defaults to 48.
+        train_size (int, optional): Most vectors sampled for training.
+            Defaults to 50000.
+        seed (int, optional): Seed for the training sample. Defaults to 42.
+
+    Returns:
+        faiss.Index: Trained, empty index using L2 distance.
+    """
+    n, d = train_vectors.shape
+    if n > train_size:
+        sample = np.random.default_rng(seed).choice(n, train_size, replace=False)
+        train_vectors = train_vectors[sample]
+        n = train_size
+
+    # k-means wants ~39 points per centroid, so shrink nlist for small corpora
+    nlist = max(1, min(nlist, n // 39))
+    if index_type == "IndexFlatL2":
+        factory = "Flat"
+    elif index_type == "IndexIVFFlat":
+        factory = f"IVF{nlist},Flat"
+    elif index_type == "IndexHNSWFlat":
+        factory = f"HNSW{hnsw_m}"
+    elif index_type == "IndexIVFPQ":
+        # 8 bit codes need 256 centroids per sub-quantizer, fewer if short of data
+        nbits = max(1, min(8, int(math.log2(max(n // 39, 2)))))
+        factory = f"IVF{nlist},PQ{pq_m}x{nbits}"
+    else:
+        raise ValueError(f"Unknown index_type {index_type}, expected {INDEX_TYPES}")
+
+    logger.info(f"Creating {index_type} FAISS index ({factory})")
+    index = faiss.index_factory(d, factory, faiss.METRIC_L2)
+    if not index.is_trained:
+        logger.info(f"Training index on {n} vectors")
+        index.train(np.ascontiguousarray(train_vectors, dtype=np.float32))
+
+    return index
+
+
+def index_type_of(index: faiss.Index) -> str:
+    """Names the INDEX_TYPES entry a loaded FAISS index corresponds to."""
+    name = type(faiss.downcast_index(index)).__name__
+    return "IndexFlatL2" if name == "IndexFlat" else name
+
+
+def set_search_params(index: faiss.Index, nprobe: int = None, ef_search: int = None):
+    """
+    Applies query-time accuracy/speed knobs to those index types that have
+    them: nprobe (IVF cells visited) and efSearch (HNSW candidate list size).
+    """
+    index_type = index_type_of(index)
+    parameters = faiss.ParameterSpace()
+    if nprobe and index_type in ("IndexIVFFlat", "IndexIVFPQ"):
+        parameters.set_index_parameter(index, "nprobe", nprobe)
+    if ef_search and index_type == "IndexHNSWFlat":
+        parameters.set_index_parameter(index, "efSearch", ef_search)
+
+    return None
+
+
+def reconstruct(index: faiss.Index, positions: list[int]) -> np.ndarray:
+    """
+    Stored vectors at FAISS index positions, approximate for PQ indexes.
+    IVF indexes get the direct map this needs built on first use.
+    """
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None and ivf.direct_map.type == faiss.DirectMap.NoMap:
+        ivf.make_direct_map()
+    return np.vstack([index.reconstruct(int(i)) for i in positions])
+
+
+def search_filtered(
+    index: faiss.Index,
+    vectors: np.ndarray,
+    k: int,
+    selected: np.ndarray,
+    positions: np.ndarray,
+    exact_limit: int = 2048,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Searches only the selected index positions.  Up to exact_limit are
+    scored exactly from their stored vectors, which an IVF or HNSW search
+    could miss when few are selected; more are searched through an
+    IDSelectorBitmap, so FAISS skips the rest rather than the caller
+    over-fetching and discarding them.
+
+    Args:
+        index (faiss.Index): Index to search.
+        vectors (np.ndarray): Query vectors, one per row.
+        k (int): Matches returned per query.
+        selected (np.ndarray): Packed little-endian bitset of the positions
+            to search, as MetadataIndex.select returns.
+        positions (np.ndarray): The positions set in selected.
+        exact_limit (int, optional): Most positions scored exactly.
+            Defaults to 2048.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: Distances and positions, as a FAISS
+            search, padded with inf and -1 where fewer than k are selected.
+    """
+    if len(positions) <= exact_limit:
+        scores = np.full((len(vectors), k), np.inf, dtype=np.float32)
+        indices = np.full((len(vectors), k), -1, dtype=np.int64)
+        if len(positions) == 0:
+            return scores, indices
+
+        stored = reconstruct(index, positions)
+        distances = (
+            (vectors**2).sum(axis=1)[:, None]
+            - 2 * vectors @ stored.T
+            + (stored**2).sum(axis=1)[None, :]
+        )
+        top = np.argsort(distances, axis=1, kind="stable")[:, :k]
+        scores[:, : top.shape[1]] = np.take_along_axis(distances, top, axis=1)
+        indices[:, : top.shape[1]] = positions[top]
+        return scores, indices
+
+    selector = faiss.IDSelectorBitmap(index.ntotal, faiss.swig_ptr(selected))
+    # search parameters replace the index's own, so carry those over
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        params = faiss.SearchParametersIVF(sel=selector, nprobe=ivf.nprobe)
+    elif index_type_of(index) == "IndexHNSWFlat":
+        hnsw = faiss.downcast_index(index).hnsw
+        params = faiss.SearchParametersHNSW(sel=selector, efSearch=hnsw.efSearch)
+    else:
+        params = faiss.SearchParameters(sel=selector)
+    return index.search(vectors, k, params=params)
+
+
+def find_near_duplicates(
+    vectors: np.ndarray,
+    threshold: float,
+    k: int = 16,
+    exact_limit: int = 50000,
+    batch_size: int = 4096,
+) -> list[tuple[int, int, float]]:
+    """
+    Finds near-duplicate rows by cosine similarity from a k nearest neighbour
+    search, exact for up to exact_limit vectors and HNSW beyond, so time and
+    memory grow near-linearly rather than with every pair.  Earlier rows are
+    kept over later ones.
+
+    Args:
+        vectors (np.ndarray): Embeddings, one per row.
+        threshold (float): Cosine similarity above which rows are duplicates.
+        k (int, optional): Neighbours checked per row. Defaults to 16.
+        exact_limit (int, optional): Most rows searched exhaustively.
+            Defaults to 50000.
+        batch_size (int, optional): Rows searched at a time. Defaults to 4096.
+
+    Returns:
+        list[tuple[int, int, float]]: (dropped row, kept row, similarity) for
+            each row to drop.
+    """
+    n, d = vectors.shape
+    if n < 2:
+        return []
+
+    vectors = np.array(vectors, dtype=np.float32)
+    faiss.normalize_L2(vectors)
+    if n <= exact_limit:
+        index = faiss.IndexFlatIP(d)
+    else:
+        index = faiss.IndexHNSWFlat(d, 32, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efSearch = max(64, 2 * k)
+    index.add(vectors)
+
+    duplicates = []
+    dropped = set()
+    for start in range(0, n, batch_size):
+        similarities, neighbours = index.search(
+            vectors[start : start + batch_size], min(k + 1, n)
+        )
+        for row, (sims, ids) in enumerate(zip(similarities, neighbours), start):
+            if row in dropped:
+                continue
+            for sim, other in zip(sims, ids):
+                if sim <= threshold:
+                    break
+                if other > row and other not in dropped:
+                    dropped.add(other)
+                    duplicates.append((int(other), row, float(sim)))
+
+    return duplicates
@@ -0,0 +1,313 @@
+import argparse
+import http.client
+import json
+import logging
+import os
+import socket
+import threading
+import toml
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from socketserver import ThreadingMixIn, UnixStreamServer
+from typing import Callable
+from urllib.parse import urlparse
+from langchain import HuggingFacePipeline
+from statschat.llm_backends import load_generation_pipeline
+from statschat.scheduler import GenerationScheduler
+
+# The generation service speaks JSON over HTTP, on localhost or a Unix socket:
+#   POST /generate  {"prompts": [...]}  ->  {"outputs": [...]}
+#   GET  /healthz                       ->  {"status": "ok", ...}
+
+
+class GenerationHandler(BaseHTTPRequestHandler):
+    """Serves the generation protocol for the GenerationService it belongs to."""
+
+    service = None
+    # keep connections open between requests
+    protocol_version = "HTTP/1.1"
+
+    def address_string(self) -> str:
+        # Unix socket clients have no address
+        return self.client_address[0] if self.client_address else "unix"
+
+    def log_message(self, format: str, *args):
+        self.service.logger.debug(f"{self.address_string()} {format % args}")
+
+    def _send(self, status: int, body: dict, headers: dict = None):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        if self.path != "/healthz":
+            return self._send(404, {"error": "Not found"})
+        return self._send(200, self.service.health())
+
+    def do_POST(self):
+        if self.path != "/generate":
+            return self._send(404, {"error": "Not found"})
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            prompts = json.loads(self.rfile.read(length))["prompts"]
+            if not isinstance(prompts, list):
+                raise ValueError("prompts must be a list")
+        except (KeyError, TypeError, ValueError) as e:
+            return self._send(400, {"error": f"Bad request: {e}"})
+
+        if not self.service.reserve(len(prompts)):
+            return self._send(503, {"error": "Too many prompts"}, {"Retry-After": "1"})
+        try:
+            outputs = self.service.generate(prompts)
+        except Exception as e:
+            self.service.logger.exception("Generation failed")
+            return self._send(500, {"error": str(e)})
+        finally:
+            self.service.release(len(prompts))
+        return self._send(200, {"outputs": outputs})
+
+
+class UnixHTTPServer(ThreadingMixIn, UnixStreamServer):
+    """Threaded HTTP server on a Unix domain socket."""
+
+    daemon_threads = True
+
+    def get_request(self):
+        request, _ = super().get_request()
+        return request, ""
+
+
+class GenerationService:
+    """
+    Runs the text generation LLM in its own process, so that it can be
+    scaled and restarted separately from the web workers, which then only
+    hold the embedder and vector store.  Prompts from concurrent requests
+    are grouped into micro-batches, and at most max_pending are held at
+    once, beyond which requests are refused with 503.
+    """
+
+    def __init__(
+        self,
+        generate_fn: Callable[[list[str]], list[str]],
+        model_name: str = "",
+        max_batch_size: int = 8,
+        max_wait_ms: float = 20.0,
+        max_pending: int = 64,
+        logger: logging.Logger = None,
+    ):
+        """
+        Args:
+            generate_fn (Callable): Generates one output per prompt, for a
+                batch of prompts.
+            model_name (str, optional): Model reported by the health check.
+            max_batch_size (int, optional): Most prompts run in one forward
+                pass. Defaults to 8.
+            max_wait_ms (float, optional): Longest a prompt waits for others
+                to join its batch. Defaults to 20.0.
+            max_pending (int, optional): Most prompts accepted at once.
+                Defaults to 64.
+        """
+        # Initialise logger
+        if logger is None:
+            self.logger = logging.getLogger(__name__)
+
+        else:
+            self.logger = logger
+
+        self.model_name = model_name
+        self.max_pending = max_pending
+        self.pending = 0
+        self._lock = threading.Lock()
+        self.scheduler = GenerationScheduler(
+            generate_fn,
+            max_batch_size=max_batch_size,
+            max_wait_ms=max_wait_ms,
+            logger=self.logger,
+        )
+
+        return None
+
+    @classmethod
+    def from_model_id(
+        cls,
+        model_name_or_path: str,
+        temperature: float = 0.0,
+        backend: str = "pytorch",
+        **kwargs,
+    ):
+        """Loads a text2text-generation model, as Inquirer does."""
+        if backend == "pytorch":
+            pipeline = HuggingFacePipeline.from_model_id(
+                model_id=model_name_or_path,
+                task="text2text-generation",
+                model_kwargs={"temperature": temperature, "max_length": 512},
+            ).pipeline
+        else:
+            pipeline = load_generation_pipeline(model_name_or_path, backend=backend)
+
+        def generate(prompts: list[str]) -> list[str]:
+            responses = pipeline(prompts, batch_size=len(prompts))
+            return [response["generated_text"] for response in responses]
+
+        return cls(generate, model_name=model_name_or_path, **kwargs)
+
+    def reserve(self, n: int) -> bool:
+        """Admits n more prompts, unless max_pending would be exceeded."""
+        with self._lock:
+            if self.pending and self.pending + n > self.max_pending:
+                return False
+            self.pending += n
+            return True
+
+    def release(self, n: int):
+        with self._lock:
+            self.pending -= n
+
+    def generate(self, prompts: list[str]) -> list[str]:
+        """Generates prompts through the micro-batching scheduler."""
+        futures = [self.scheduler.submit(prompt) for prompt in prompts]
+        return [future.result() for future in futures]
+
+    def health(self) -> dict:
+        """Liveness, load and batching metrics."""
+        return {
+            "status": "ok",
+            "model": self.model_name,
+            "pending": self.pending,
+            "max_pending": self.max_pending,
+            "scheduler": self.scheduler.metrics(),
+        }
+
+    def make_server(self, url: str):
+        """
+        HTTP server for the service at a http://host:port or unix:///path
+        URL, to be run with serve_forever.
+        """
+        handler = type("Handler", (GenerationHandler,), {"service": self})
+        parsed = urlparse(url)
+        if parsed.scheme == "unix":
+            if os.path.exists(parsed.path):
+                os.remove(parsed.path)
+            return UnixHTTPServer(parsed.path, handler)
+        return ThreadingHTTPServer((parsed.hostname, parsed.port or 80), handler)
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    """HTTPConnection over a Unix domain socket."""
+
+    def __init__(self, path: str, timeout: float = None):
+        super().__init__("localhost", timeout=timeout)
+        self.path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.path)
+
+
+class RemoteGenerator:
+    """
+    Client for a GenerationService, with the generate(prompts) interface of
+    Inquirer.generate.  Each thread keeps its own connection open.
+    """
+
+    def __init__(self, url: str, timeout: float = 120.0):
+        """
+        Args:
+            url (str): The service, as http://host:port or unix:///path.
+            timeout (float, optional): Seconds to wait for a response.
+                Defaults to 120.0.
+        """
+        self.url = url
+        self.timeout = timeout
+        self._local = threading.local()
+
+        return None
+
+    def _connection_new(self) -> http.client.HTTPConnection:
+        parsed = urlparse(self.url)
+        if parsed.scheme == "unix":
+            return UnixHTTPConnection(parsed.path, self.timeout)
+        return http.client.HTTPConnection(
+            parsed.hostname, parsed.port or 80, timeout=self.timeout
+        )
+
+    def _connection(self) -> http.client.HTTPConnection:
+        if getattr(self._local, "connection", None) is None:
+            self._local.connection = self._connection_new()
+        return self._local.connection
+
+    def _request(self, method: str, path: str, body: dict = None) -> dict:
+        payload = json.dumps(body).encode() if body is not None else None
+        headers = {"Content-Type": "application/json"} if payload else {}
+        connection = self._connection()
+        kept_alive = connection.sock is not None
+        try:
+            try:
+                connection.request(method, path, body=payload, headers=headers)
+                response = connection.getresponse()
+            except (ConnectionResetError, BrokenPipeError):
+                # RemoteDisconnected included: the service closed a kept-alive
+                # connection before sending any of the response, so the request
+                # was not handled and is retried once on a new connection.
+                # Timeouts are not retried, the service may still be generating
+                if not kept_alive:
+                    raise
+                connection.close()
+                connection = self._local.connection = self._connection_new()
+                connection.request(method, path, body=payload, headers=headers)
+                response = connection.getresponse()
+            result = json.loads(response.read())
+        except (http.client.HTTPException, OSError, ValueError):
+            connection.close()
+            self._local.connection = None
+            raise
+        if response.status != 200:
+            raise RuntimeError(
+                f"Generation service returned {response.status}: {result.get('error')}"
+            )
+        return result
+
+    def after_fork(self):
+        """Forgets connections inherited from the parent of a forked process."""
+        self._local = threading.local()
+
+        return None
+
+    def generate(self, prompts: list[str]) -> list[str]:
+        """Generates one output per prompt on the service."""
+        return self._request("POST", "/generate", {"prompts": prompts})["outputs"]
+
+    def health(self) -> dict:
+        """The service's health check, raising if it cannot be reached."""
+        return self._request("GET", "/healthz")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Serve the text generation LLM for Inquirer(generation_url=...)"
+    )
+    parser.add_argument("--config", default="app_config.toml")
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    )
+    config = toml.load(args.config)
+    generation = config["generation"]
+    service = GenerationService.from_model_id(
+        config["search"]["model_name_or_path"],
+        temperature=config["search"]["llm_generate_temperature"],
+        backend=config["search"]["llm_backend"],
+        max_batch_size=generation["max_batch_size"],
+        max_wait_ms=generation["max_wait_ms"],
+        max_pending=generation["max_pending"],
+    )
+    server = service.make_server(generation["url"])
+    service.logger.info(f"Generation service listening on {generation['url']}")
+    server.serve_forever()
@@ -0,0 +1,318 @@
+import json
+import logging
+import queue
+import sqlite3
+import threading
+import uuid
+from collections import OrderedDict
+from contextlib import closing
+from time import monotonic, sleep, time
+from typing import Callable
+
+# Job statuses, in the order a job passes through them
+QUEUED = "queued"
+RETRIEVING = "retrieving"
+GENERATING = "generating"
+DONE = "done"
+FAILED = "failed"
+
+
+class QueueFull(Exception):
+    """Raised when a job is submitted to a JobQueue with no room left."""
+
+
+class Job:
+    """
+    A unit of work run by a JobQueue, holding its results as the worker
+    fills them in.  Each update bumps the version and wakes any long-polling
+    readers.
+    """
+
+    def __init__(self, job_id: str, on_update: Callable = None, **fields):
+        self.id = job_id
+        self.status = QUEUED
+        self.version = 0
+        self.created = time()
+        self.finished = None
+        self.fields = fields
+        self._changed = threading.Condition()
+        self._on_update = on_update
+
+    @property
+    def finished_or_failed(self) -> bool:
+        return self.status in (DONE, FAILED)
+
+    def update(self, status: str = None, **fields):
+        """Records progress, e.g. update(GENERATING, references=docs)."""
+        with self._changed:
+            if status:
+                self.status = status
+                if self.finished_or_failed:
+                    self.finished = monotonic()
+            self.fields.update(fields)
+            self.version += 1
+            # saved before waking readers, for them to find it saved too
+            if self._on_update:
+                self._on_update(self)
+            self._changed.notify_all()
+
+        return None
+
+    def wait(self, timeout: float, version: int = None) -> bool:
+        """
+        Blocks until the job moves past version, or finishes if no version
+        is given, or timeout seconds pass.  Returns whether it changed.
+        """
+        with self._changed:
+            if version is None:
+                return self._changed.wait_for(lambda: self.finished_or_failed, timeout)
+            return self._changed.wait_for(lambda: self.version > version, timeout)
+
+    def to_dict(self) -> dict:
+        """The job as returned by the API."""
+        with self._changed:
+            return {"id": self.id, "status": self.status, "version": self.version} | {
+                key: value for key, value in self.fields.items() if value is not None
+            }
+
+
+class StoredJob:
+    """
+    A job as last saved to a JobQueue's SQLite file by the process running
+    it, for the other processes sharing the file.  Waiting polls the file.
+    """
+
+    POLL_INTERVAL = 0.1
+
+    def __init__(self, jobs: "JobQueue", data: dict):
+        self.id = data["id"]
+        self._jobs = jobs
+        self._data = data
+
+    @property
+    def finished_or_failed(self) -> bool:
+        return self._data["status"] in (DONE, FAILED)
+
+    def wait(self, timeout: float, version: int = None) -> bool:
+        """As Job.wait, re-reading the job until it changes or timeout passes."""
+        deadline = monotonic() + timeout
+        while not (
+            self.finished_or_failed
+            if version is None
+            else self._data["version"] > version
+        ):
+            if monotonic() >= deadline:
+                return False
+            sleep(self.POLL_INTERVAL)
+            self._data = self._jobs._load(self.id) or self._data
+        return True
+
+    def to_dict(self) -> dict:
+        """The job as returned by the API."""
+        return dict(self._data)
+
+
+class JobQueue:
+    """
+    Bounded queue of jobs run by a fixed pool of worker threads, so that
+    slow work such as LLM generation happens outside the web request.
+    Submitting to a full queue raises QueueFull rather than waiting, for
+    the caller to turn away, and finished jobs are kept for ttl seconds
+    for their results to be collected.  With a SQLite file, jobs are also
+    saved as they progress, so that processes forked from this one, e.g.
+    pre-fork workers, can collect the results of jobs run in another.
+    """
+
+    def __init__(
+        self,
+        work_fn: Callable[..., None],
+        workers: int = 4,
+        max_queued: int = 32,
+        ttl: float = 600,
+        path: str = None,
+        logger: logging.Logger = None,
+    ):
+        """
+        Args:
+            work_fn (Callable): Called in a worker as work_fn(job, *args),
+                recording results through job.update. Exceptions fail the job.
+            workers (int, optional): Worker threads. Defaults to 4.
+            max_queued (int, optional): Jobs waiting for a worker before
+                submissions are refused. Defaults to 32.
+            ttl (float, optional): Seconds finished jobs are kept.
+                Defaults to 600.
+            path (str, optional): SQLite file jobs are shared through, see
+                share. Defaults to None, jobs are private to this process.
+        """
+        # Initialise logger
+        if logger is None:
+            self.logger = logging.getLogger(__name__)
+
+        else:
+            self.logger = logger
+
+        self.work_fn = work_fn
+        self.ttl = ttl
+        self.workers = max(1, workers)
+        self.max_queued = max(1, max_queued)
+        self.submitted = 0
+        self.rejected = 0
+        self._jobs = OrderedDict()
+        self.path = None
+        if path:
+            self.share(path)
+        self._start()
+
+        return None
+
+    def share(self, path: str):
+        """
+        Saves jobs to a SQLite file as they progress, so that any process
+        using the same file, such as one forked after this call, can get
+        them.  Each access opens its own connection, which is safe across
+        threads and fork.
+        """
+        self.path = path
+        with self._connect() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                """CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY, version INTEGER, job TEXT, finished REAL
+                )"""
+            )
+
+        return None
+
+    def _connect(self) -> sqlite3.Connection:
+        return closing(sqlite3.connect(self.path, timeout=10))
+
+    def _save(self, job: Job):
+        """Saves a job, unless a later version has been saved already."""
+        data = job.to_dict()
+        finished = time() if data["status"] in (DONE, FAILED) else None
+        with self._connect() as db, db:
+            db.execute(
+                """INSERT INTO jobs VALUES (?, ?, ?, ?) ON CONFLICT (id) DO UPDATE
+                SET version = excluded.version, job = excluded.job,
+                finished = excluded.finished WHERE excluded.version > jobs.version""",
+                (job.id, data["version"], json.dumps(data), finished),
+            )
+
+        return None
+
+    def _load(self, job_id: str) -> dict:
+        with self._connect() as db:
+            row = db.execute("SELECT job FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _start(self):
+        self._queue = queue.Queue(maxsize=self.max_queued)
+        self._lock = threading.Lock()
+        self._workers = [
+            threading.Thread(target=self._run, name=f"job-worker-{n}", daemon=True)
+            for n in range(self.workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def after_fork(self):
+        """
+        Starts new workers in a forked process, which has no threads, for an
+        empty queue of its own.  Jobs of other processes sharing a SQLite
+        file can still be got.
+        """
+        self._jobs.clear()
+        self._start()
+
+        return None
+
+    def submit(self, *args, **fields) -> Job:
+        """
+        Queues a job, to be run as work_fn(job, *args)
+
+        Args:
+            *args: Passed on to work_fn.
+            **fields: Initial fields of the job, returned by to_dict.
+
+        Returns:
+            Job: The queued job.
+
+        Raises:
+            QueueFull: If max_queued jobs are already waiting.
+        """
+        on_update = self._save if self.path else None
+        job = Job(uuid.uuid4().hex, on_update=on_update, **fields)
+        self._purge()
+        with self._lock:
+            if self._queue.full():
+                self.rejected += 1
+                raise QueueFull(f"{self._queue.qsize()} jobs already queued")
+            if self.path:
+                # saved before a worker can update it, for other processes
+                self._save(job)
+            self._queue.put_nowait((job, args))
+            self._jobs[job.id] = job
+            self.submitted += 1
+
+        return job
+
+    def get(self, job_id: str) -> Job:
+        """
+        The job with an id, or None if unknown or expired.  A job run by
+        another process sharing the SQLite file is returned as a StoredJob.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None and self.path:
+            data = self._load(job_id)
+            job = StoredJob(self, data) if data else None
+        return job
+
+    def _run(self):
+        while True:
+            job, args = self._queue.get()
+            if job is None:
+                return None
+            try:
+                self.work_fn(job, *args)
+                if not job.finished_or_failed:
+                    job.update(DONE)
+            except Exception as e:
+                self.logger.exception(f"Job {job.id} failed")
+                job.update(FAILED, error=str(e))
+
+    def _purge(self):
+        """Drops finished jobs older than ttl."""
+        expiry = monotonic() - self.ttl
+        with self._lock:
+            for job_id in [
+                job_id
+                for job_id, job in self._jobs.items()
+                if job.finished is not None and job.finished < expiry
+            ]:
+                del self._jobs[job_id]
+        if self.path:
+            with self._connect() as db, db:
+                db.execute("DELETE FROM jobs WHERE finished < ?", (time() - self.ttl,))
+
+        return None
+
+    def close(self):
+        """Stops the workers once the jobs already queued are done."""
+        for _ in self._workers:
+            self._queue.put((None, None))
+        for worker in self._workers:
+            worker.join()
+
+        return None
+
+    def metrics(self) -> dict:
+        """Queue depth and counters for monitoring."""
+        with self._lock:
+            active = sum(not job.finished_or_failed for job in self._jobs.values())
+        return {
+            "queued": self._queue.qsize(),
+            "active": active,
+            "submitted": self.submitted,
+            "rejected": self.rejected,
+        }
@@ -1,7 +1,25 @@
-from datetime import datetime
-from numpy import exp
+from datetime import date, datetime
+from functools import lru_cache
+import numpy as np
 import re
 from werkzeug.datastructures import MultiDict
+from statschat.metadata_index import RELEASE_TYPES
+
+# Ages in days the decay curves cover, older releases get the oldest weight
+DECAY_MAX_DAYS = 365 * 30
+
+
+@lru_cache(maxsize=16)
+def decay_curve(latest: float = 1) -> np.ndarray:
+    """time_decay weights for every release age in days, computed once per
+    latest value and read-only, so that it can be indexed by arrays of ages"""
+    days = np.arange(DECAY_MAX_DAYS + 1)
+    if not latest:
+        curve = np.ones(len(days))
+    else:
+        curve = (1.5 - 1 / (1 + np.exp(-days / (400 / latest)))) ** latest
+    curve.setflags(write=False)
+    return curve
 
 
 def time_decay(date: str = "1900-01-01", latest: int = 1):
@@ -11,8 +29,55 @@ def time_decay(date: str = "1900-01-01", latest: int = 1):
         latest(int): controls how fast the weight decrease.
             0 - no decay, 1 - moderate decay,  2 - fast decay"""
     days_diff = (datetime.now() - datetime.strptime(date, "%d %B %Y")).days
-    coef = (1.5 - 1 / (1 + exp(-days_diff / (400 / latest)))) ** latest
-    return coef
+    return float(decay_curve(latest)[np.clip(days_diff, 0, DECAY_MAX_DAYS)])
+
+
+def recency_weights(docs: list[dict], latest: float = 1, today: date = None):
+    """time_decay weight of each search result, in one array operation"""
+    today = (today or date.today()).toordinal()
+    ordinals = np.array(
+        [
+            doc.get("date_ordinal")
+            or datetime.strptime(doc["date"], "%d %B %Y").toordinal()
+            for doc in docs
+        ]
+    )
+    ages = np.clip(today - ordinals, 0, DECAY_MAX_DAYS)
+    return decay_curve(latest)[ages]
+
+
+def recency_rerank(docs: list[dict], latest: float = 1, today: date = None) -> list:
+    """divide the L2 distance scores of search results by their time_decay
+    weight, in one array operation, and reorder them best first. Results
+    re-ranked by the cross-encoder are instead reordered on their
+    rerank_score, a logit, plus the log of the weight, and stay ahead of
+    the rest
+    Args:
+        docs(list[dict]): search results, with score and date_ordinal (or
+            date, for vector stores built before date ordinals were stored)
+        latest(float): decay speed, as for time_decay
+        today(date): date release ages are counted to, defaults to today"""
+    if not docs or not latest:
+        return docs
+    reranked = [doc for doc in docs if "rerank_score" in doc]
+    rest = [doc for doc in docs if "rerank_score" not in doc]
+
+    if reranked:
+        weights = recency_weights(reranked, latest, today)
+        # rerank scores are relevance logits, higher is better
+        scores = np.array([doc["rerank_score"] for doc in reranked])
+        scores = scores + np.log(weights)
+        order = np.argsort(-scores, kind="stable")
+        reranked = [reranked[i] | {"rerank_score": float(scores[i])} for i in order]
+
+    if rest:
+        weights = recency_weights(rest, latest, today)
+        # scores are distances, lower is better, so divide by the weight
+        scores = np.array([doc["score"] for doc in rest]) / weights
+        order = np.argsort(scores, kind="stable")
+        rest = [rest[i] | {"score": float(scores[i])} for i in order]
+
+    return reranked + rest
 
 
 def get_latest_flag(request_args, latest_max: int = 1):
@@ -28,3 +93,33 @@ def get_latest_flag(request_args, latest_max: int = 1):
             latest = latest_max / 2
 
     return advanced, latest
+
+
+def get_search_filters(request_args) -> dict:
+    """parse the request arguments into Inquirer.similarity_search filters:
+    the bulletins/articles toggles of the advanced search form, or the
+    release_type, date_from, date_to and keywords parameters of the API.
+    Raises ValueError for dates not given as YYYY-MM-DD"""
+    filters = {}
+    if "latest-publication" in request_args:
+        release_types = [x for x in RELEASE_TYPES if x in request_args]
+    else:
+        release_types = [
+            x
+            for value in request_args.getlist("release_type")
+            for x in value.split(",")
+        ]
+    # nothing ticked, or every type, is no filter at all
+    if release_types and set(release_types) != set(RELEASE_TYPES):
+        filters["release_types"] = release_types
+
+    for key in ("date_from", "date_to"):
+        if request_args.get(key):
+            filters[key] = datetime.strptime(request_args.get(key), "%Y-%m-%d").date()
+    keywords = [
+        x for value in request_args.getlist("keywords") for x in value.split(",") if x
+    ]
+    if keywords:
+        filters["url_keywords"] = keywords
+
+    return filters
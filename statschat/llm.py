@@ -1,13 +1,36 @@
+import hashlib
 import logging
+import os
+import numpy as np
+from threading import Thread
 from langchain import HuggingFacePipeline
-from langchain.chains.question_answering import load_qa_chain
 from langchain.prompts.prompt import PromptTemplate
 from langchain.docstore.document import Document
 from langchain.vectorstores import FAISS
-from langchain.embeddings import HuggingFaceEmbeddings
-from langchain.chains.llm import LLMChain
-from langchain.chains.combine_documents.stuff import StuffDocumentsChain
-from typing import List
+from transformers import TextIteratorStreamer
+from datetime import date
+from typing import Iterator, List, Union
+from statschat.bm25 import BM25_FILE, BM25Index, fuse_scores
+from statschat.cache import AnswerCache, QueryCache, vector_store_version
+from statschat.docstore import (
+    DOCSTORE_FILE,
+    SQLiteDocstore,
+    index_is_mapped,
+    load_lazy_store,
+)
+from statschat.embedding import load_embeddings
+from statschat.generation_service import RemoteGenerator
+from statschat.llm_backends import load_generation_pipeline
+from statschat.faiss_index import (
+    index_type_of,
+    reconstruct,
+    search_filtered,
+    set_search_params,
+)
+from statschat.metadata_index import METADATA_FILE, MetadataIndex
+from statschat.reranker import Reranker
+from statschat.scheduler import GenerationScheduler
+from statschat.utils import timed
 
 
 # Prompt specific to text2text-generation LLM task
@@ -44,6 +67,11 @@ class Inquirer:
         model_name_or_path: str = "google/flan-t5-large",
         faiss_db_root: str = "db_lc",
         embedding_model: str = "sentence-transformers/all-mpnet-base-v2",
+        embedding_backend: str = "pytorch",
+        embedding_threads: int = 0,
+        index_type: str = "IndexFlatL2",
+        nprobe: int = 16,
+        ef_search: int = 64,
         k_docs: int = 3,
         k_contexts: int = 3,
         similarity_threshold: float = 2.0,  # noqa: E501 # higher threshold for smaller corpus! Reduce below 1.0 with larger corpus
@@ -52,6 +80,19 @@ class Inquirer:
         summarizer_on: bool = False,
         llm_summarize_temperature: float = 0.0,
         llm_generate_temperature: float = 0.0,
+        answer_cache_size: int = 1024,
+        answer_cache_ttl: float = 0,
+        answer_cache_path: str = None,
+        query_cache_bytes: int = 16 * 2**20,
+        generate_max_batch_size: int = 1,
+        generate_max_wait_ms: float = 20.0,
+        lazy_docstore: bool = True,
+        hybrid_weight: float = 0.0,
+        hybrid_candidates: int = 50,
+        rerank_model: str = "",
+        rerank_top_n: int = 20,
+        generation_url: str = "",
+        llm_backend: str = "pytorch",
     ):
         """
         Args:
@@ -59,6 +100,51 @@ class Inquirer:
                 Defaults to "google/flan-t5-large".
             prompt_text (str, optional): Alternative prompt text.
                 Defaults to None.
+            embedding_backend (str, optional): CPU inference backend for the
+                query embedder, "pytorch" (fp32), "int8" or "onnx", the
+                latter two checked against fp32. Defaults to "pytorch".
+            embedding_threads (int, optional): Intra-op threads for the int8
+                and onnx embedders, 0 for the default. Defaults to 0.
+            index_type (str, optional): FAISS index type the vector store
+                was built with. Defaults to "IndexFlatL2".
+            nprobe (int, optional): IVF cells searched per query, for IVF
+                indexes. Defaults to 16.
+            ef_search (int, optional): Candidate list size per query, for
+                HNSW indexes. Defaults to 64.
+            answer_cache_size (int, optional): Number of generated answers
+                to keep in memory, 0 disables caching. Defaults to 1024.
+            answer_cache_ttl (float, optional): Seconds a cached answer
+                remains valid, 0 for no expiry. Defaults to 0.
+            answer_cache_path (str, optional): SQLite file persisting cached
+                answers across restarts. Defaults to None, memory only.
+            query_cache_bytes (int, optional): Memory budget for cached query
+                vectors and search results, 0 disables the cache.
+                Defaults to 16 MiB.
+            generate_max_batch_size (int, optional): Most concurrent prompts
+                generated in one forward pass, 1 disables micro-batching.
+                Defaults to 1.
+            generate_max_wait_ms (float, optional): Longest a prompt waits
+                for others to join its micro-batch. Defaults to 20.0.
+            lazy_docstore (bool, optional): Read chunks from the SQLite
+                docstore on demand, where the vector store has one, and
+                memory map the FAISS index if it is an IVF index, the only
+                kind FAISS maps. Defaults to True.
+            hybrid_weight (float, optional): Weight of BM25 lexical matches
+                against dense similarity, between 0 (dense only) and 1.
+                Defaults to 0.0.
+            hybrid_candidates (int, optional): Candidates taken from each of
+                the dense and lexical searches before fusing. Defaults to 50.
+            rerank_model (str, optional): Hugging Face cross-encoder id to
+                re-rank search results with before answering, "" to skip
+                re-ranking. Defaults to "".
+            rerank_top_n (int, optional): Search results re-ranked.
+                Defaults to 20.
+            generation_url (str, optional): A generation service to send
+                prompts to, as http://host:port or unix:///path, instead of
+                loading the LLM in this process. Defaults to "".
+            llm_backend (str, optional): CPU inference backend for the LLM,
+                "pytorch" (fp32), "int8" (dynamically quantised) or "onnx"
+                (ONNX Runtime, exported on first use). Defaults to "pytorch".
         """
 
         # Initialise logger
@@ -75,16 +161,21 @@ class Inquirer:
         self.summarizer_on = summarizer_on
         self.llm_summarise_temperature = llm_summarize_temperature
         self.llm_generate_temperature = llm_generate_temperature
-
-        # Load LLM with text2text-generation specifications
-        self.llm_generate = HuggingFacePipeline.from_model_id(
-            model_id=model_name_or_path,
-            task="text2text-generation",
-            model_kwargs={
-                "temperature": self.llm_generate_temperature,
-                "max_length": 512,
-            },
-        )
+        # seconds taken by each loading phase, for startup diagnostics
+        self.startup_timings = {}
+
+        with timed(self.logger, "Loading LLM", self.startup_timings):
+            self._load_generator(model_name_or_path, generation_url, llm_backend)
+
+        # Group prompts from concurrent requests into micro-batches
+        self.scheduler = None
+        if generate_max_batch_size > 1:
+            self.scheduler = GenerationScheduler(
+                self.generate,
+                max_batch_size=generate_max_batch_size,
+                max_wait_ms=generate_max_wait_ms,
+                logger=self.logger,
+            )
 
         if self.summarizer_on:
             # Load LLM with summarization specifications
@@ -96,10 +187,124 @@ class Inquirer:
                     "max_length": 512,
                 },
             )
+            self.summarise_pipeline = self.llm_summarise.pipeline
+
+        with timed(self.logger, "Loading embedding model", self.startup_timings):
+            self.embeddings = load_embeddings(
+                embedding_model,
+                embedding_backend,
+                embedding_threads,
+                logger=self.logger,
+            )
+
+        with timed(self.logger, "Loading vector store", self.startup_timings):
+            self._load_vector_store(faiss_db_root, lazy_docstore)
+        if index_type_of(self.db.index) != index_type:
+            self.logger.warning(
+                f"Expected {index_type} but vector store holds a "
+                f"{index_type_of(self.db.index)}"
+            )
+        set_search_params(self.db.index, nprobe=nprobe, ef_search=ef_search)
+
+        self.hybrid_weight = hybrid_weight
+        self.hybrid_candidates = hybrid_candidates
+        with timed(self.logger, "Loading search indexes", self.startup_timings):
+            self._load_search_indexes(faiss_db_root)
+
+        # Optional cross-encoder, to pick the best contexts from a wide search
+        self.reranker = None
+        if rerank_model:
+            with timed(self.logger, "Loading re-ranker", self.startup_timings):
+                self.reranker = Reranker(
+                    rerank_model, top_n=rerank_top_n, logger=self.logger
+                )
+
+        # Answers and search results are only valid for the vector store
+        # build they came from
+        version = vector_store_version(faiss_db_root)
+        self.answer_cache = AnswerCache(
+            max_size=answer_cache_size,
+            ttl=answer_cache_ttl,
+            path=answer_cache_path or None,
+            version=version,
+        )
+        self.query_cache = QueryCache(max_bytes=query_cache_bytes, version=version)
+
+        return None
+
+    def _load_vector_store(self, faiss_db_root: str, lazy_docstore: bool):
+        """
+        Loads the FAISS vector store, with an on-demand docstore where it
+        has one
+        """
+        if lazy_docstore and os.path.exists(f"{faiss_db_root}/{DOCSTORE_FILE}"):
+            self.logger.info("Loading vector store with on-demand docstore")
+            self.db = load_lazy_store(faiss_db_root, self.embeddings)
+            if not index_is_mapped(self.db.index):
+                self.logger.info(
+                    "FAISS only memory maps IVF indexes, so the "
+                    f"{type(self.db.index).__name__} index is read into memory"
+                )
+        else:
+            self.db = FAISS.load_local(faiss_db_root, self.embeddings)
+
+        return None
+
+    def _load_generator(
+        self, model_name_or_path: str, generation_url: str, llm_backend: str
+    ):
+        """
+        Loads the generation LLM, or connects to a generation service
+        running it in another process
+        """
+        self.remote_generator = None
+        self.generate_pipeline = None
+        if generation_url:
+            self.logger.info(f"Generating answers with service at {generation_url}")
+            self.remote_generator = RemoteGenerator(generation_url)
+            return None
+
+        if llm_backend != "pytorch":
+            self.logger.info(f"Loading {model_name_or_path} on {llm_backend} backend")
+            self.generate_pipeline = load_generation_pipeline(
+                model_name_or_path, backend=llm_backend
+            )
+            return None
+
+        # Load LLM with text2text-generation specifications
+        self.llm_generate = HuggingFacePipeline.from_model_id(
+            model_id=model_name_or_path,
+            task="text2text-generation",
+            model_kwargs={
+                "temperature": self.llm_generate_temperature,
+                "max_length": 512,
+            },
+        )
+        # Reusable generation pipeline, takes pre-built prompt strings
+        self.generate_pipeline = self.llm_generate.pipeline
 
-        embeddings = HuggingFaceEmbeddings(model_name=embedding_model)
+        return None
 
-        self.db = FAISS.load_local(faiss_db_root, embeddings)
+    def _load_search_indexes(self, faiss_db_root: str):
+        """
+        Loads the BM25 index saved with the vector store, for hybrid search,
+        and its metadata index for filtered search, building the latter
+        from the docstore for stores saved without one
+        """
+        self.bm25 = None
+        if os.path.exists(f"{faiss_db_root}/{BM25_FILE}"):
+            self.bm25 = BM25Index.load(faiss_db_root)
+        elif self.hybrid_weight:
+            self.logger.warning("No BM25 index in vector store, using dense search")
+
+        if os.path.exists(f"{faiss_db_root}/{METADATA_FILE}"):
+            self.metadata_index = MetadataIndex.load(faiss_db_root)
+        else:
+            self.logger.info("No metadata index in vector store, building one")
+            docs = self._fetch_documents(set(range(self.db.index.ntotal)))
+            self.metadata_index = MetadataIndex.build(
+                [docs[i].metadata for i in range(self.db.index.ntotal)]
+            )
 
         return None
 
@@ -108,33 +313,349 @@ class Inquirer:
         """Utility, raise metadata within nested dicts."""
         return d | d.pop("metadata")
 
-    def similarity_search(self, query: str, return_dict: bool = True) -> List[Document]:
+    def similarity_search(
+        self,
+        query: str,
+        return_dict: bool = True,
+        release_types: list[str] = None,
+        date_from: Union[str, date] = None,
+        date_to: Union[str, date] = None,
+        url_keywords: list[str] = None,
+    ) -> List[Document]:
         """
         Returns k document chunks with the highest relevance to the
-        query
+        query, optionally searching only the chunks matching filters
 
         Args:
             query (str): Question for which most relevant articles will
             be returned
             return_dict: if True, data returned as dictionary, key = rank
+            release_types (list[str], optional): Publication types to search,
+                "bulletins" and/or "articles". Defaults to None, all types.
+            date_from (str | date, optional): Earliest release date to
+                search, as YYYY-MM-DD. Defaults to None.
+            date_to (str | date, optional): Latest release date to search,
+                as YYYY-MM-DD. Defaults to None.
+            url_keywords (list[str], optional): Topics to search, as they
+                appear in publication URLs, e.g. "economy". Defaults to None.
 
         Returns:
             List[Document]: List of top k article chunks by relevance
         """
         self.logger.info("Retrieving most relevant text chunks")
-        top_matches = self.db.similarity_search_with_score(query=query, k=self.k_docs)
+        vectors = self._embed_queries([query])
+        selected = self.metadata_index.select(
+            release_types, date_from, date_to, url_keywords
+        )
+
+        return self._search_vectors(vectors, return_dict, [query], selected)[0]
+
+    def similarity_search_batch(
+        self,
+        queries: list[str],
+        return_dict: bool = True,
+        release_types: list[str] = None,
+        date_from: Union[str, date] = None,
+        date_to: Union[str, date] = None,
+        url_keywords: list[str] = None,
+    ) -> list[List[Document]]:
+        """
+        Batched similarity_search, embedding all queries in one pass and
+        searching the vector store once for the stacked query vectors
 
-        # filter to document matches with similarity scores less than...
-        # i.e. closest cosine distances to query
-        top_matches = [x for x in top_matches if x[-1] <= self.similarity_threshold]
+        Args:
+            queries (list[str]): Questions for which most relevant articles
+            will be returned
+            return_dict: if True, data returned as dictionary, key = rank
+            release_types, date_from, date_to, url_keywords: Filters applied
+                to every query, as for similarity_search.
+
+        Returns:
+            list[List[Document]]: Top k article chunks by relevance, per query
+        """
+        self.logger.info(
+            f"Retrieving most relevant text chunks for {len(queries)} queries"
+        )
+        if not queries:
+            return []
+        vectors = self._embed_queries(queries)
+        selected = self.metadata_index.select(
+            release_types, date_from, date_to, url_keywords
+        )
+
+        return self._search_vectors(vectors, return_dict, queries, selected)
+
+    def _search_vectors(
+        self,
+        vectors: np.ndarray,
+        return_dict: bool = True,
+        queries: list[str] = None,
+        selected: np.ndarray = None,
+    ) -> list[List[Document]]:
+        """
+        Searches the FAISS index with a matrix of query vectors, one row per
+        query, returning the thresholded matches for each.  Dense results
+        are fused with BM25 matches for the query texts if hybrid search is on.
+        If a bitset of selected chunks is given, only those are searched.
+        """
+        scores, indices = self._cached_search(vectors, queries, selected)
 
-        if return_dict:
-            return [
-                self.flatten_meta(doc[0].dict()) | {"score": float(doc[1])}
-                for doc in top_matches
+        # -1 marks an empty slot when the index holds fewer than k docs
+        docs = self._fetch_documents({int(i) for i in indices.flat if i != -1})
+
+        results = []
+        for row_scores, row_indices in zip(scores, indices):
+            top_matches = [
+                (docs[i], score) for i, score in zip(row_indices, row_scores) if i != -1
             ]
 
-        return top_matches
+            # filter to document matches with similarity scores less than...
+            # i.e. closest cosine distances to query
+            top_matches = [x for x in top_matches if x[-1] <= self.similarity_threshold]
+
+            if return_dict:
+                top_matches = [
+                    self.flatten_meta(doc[0].dict()) | {"score": float(doc[1])}
+                    for doc in top_matches
+                ]
+            results.append(top_matches)
+
+        return results
+
+    def _embed_queries(self, queries: list[str]) -> np.ndarray:
+        """
+        Query vectors, one row per query, embedding only the questions
+        not already in the query cache
+        """
+        vectors = [self.query_cache.get_vector(query) for query in queries]
+        missing = [n for n, vector in enumerate(vectors) if vector is None]
+        embedded = []
+        if len(missing) == 1:
+            embedded = [self.embeddings.embed_query(queries[missing[0]])]
+        elif missing:
+            embedded = self.embeddings.embed_documents([queries[n] for n in missing])
+        for n, vector in zip(missing, embedded):
+            self.query_cache.set_vector(queries[n], vector)
+            vectors[n] = vector
+
+        return np.array(vectors, dtype=np.float32)
+
+    def _cached_search(
+        self,
+        vectors: np.ndarray,
+        queries: list[str] = None,
+        selected: np.ndarray = None,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Top k_docs (scores, indices) for each query, searching only for the
+        questions without results cached under the same settings and filters
+        """
+        if queries is None:
+            return self._search(vectors, queries, selected)
+
+        signature = (
+            self.k_docs,
+            self.hybrid_weight if self.bm25 is not None else 0.0,
+            self.hybrid_candidates,
+            None if selected is None else hashlib.sha1(selected.tobytes()).hexdigest(),
+        )
+        rows = [self.query_cache.get_results(query, signature) for query in queries]
+        missing = [n for n, row in enumerate(rows) if row is None]
+        if missing:
+            scores, indices = self._search(
+                vectors[missing], [queries[n] for n in missing], selected
+            )
+            for n, row_scores, row_indices in zip(missing, scores, indices):
+                self.query_cache.set_results(
+                    queries[n], signature, row_scores, row_indices
+                )
+                rows[n] = (row_scores, row_indices)
+
+        return np.vstack([row[0] for row in rows]), np.vstack([row[1] for row in rows])
+
+    def _search(
+        self,
+        vectors: np.ndarray,
+        queries: list[str] = None,
+        selected: np.ndarray = None,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Utility, dense or hybrid search as configured."""
+        if self.hybrid_weight and self.bm25 is not None and queries:
+            return self._hybrid_search(vectors, queries, selected)
+        return self._dense_search(vectors, self.k_docs, selected)
+
+    def _dense_search(
+        self, vectors: np.ndarray, k: int, selected: np.ndarray = None
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Utility, FAISS search restricted to a bitset of chunks if given."""
+        if selected is None:
+            return self.db.index.search(vectors, k)
+        return search_filtered(
+            self.db.index,
+            vectors,
+            k,
+            selected,
+            self.metadata_index.positions(selected),
+        )
+
+    def _hybrid_search(
+        self, vectors: np.ndarray, queries: list[str], selected: np.ndarray = None
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Dense and BM25 candidates for each query, ranked on L2 distance
+        shrunk by lexical match, in the (scores, indices) form of a FAISS
+        search.  Lexical-only candidates get their exact dense distance.
+        """
+        k = max(self.k_docs, self.hybrid_candidates)
+        dense_scores, dense_indices = self._dense_search(vectors, k, selected)
+        mask = None
+        if selected is not None:
+            mask = np.unpackbits(
+                selected, count=len(self.metadata_index), bitorder="little"
+            ).astype(bool)
+
+        scores = np.full((len(queries), self.k_docs), np.inf, dtype=np.float32)
+        indices = np.full((len(queries), self.k_docs), -1, dtype=np.int64)
+        for row, (vector, query) in enumerate(zip(vectors, queries)):
+            distances = {
+                int(i): float(d)
+                for i, d in zip(dense_indices[row], dense_scores[row])
+                if i != -1
+            }
+            bm25_scores, bm25_indices = self.bm25.search(query, k, mask)
+            lexical_only = [int(i) for i in bm25_indices if int(i) not in distances]
+            if lexical_only:
+                stored = reconstruct(self.db.index, lexical_only)
+                distances |= dict(
+                    zip(lexical_only, ((stored - vector) ** 2).sum(axis=1).tolist())
+                )
+
+            candidates = np.array(list(distances), dtype=np.int64)
+            lexical = dict(zip(bm25_indices.tolist(), bm25_scores.tolist()))
+            fused = fuse_scores(
+                np.array([distances[i] for i in candidates], dtype=np.float32),
+                np.array([lexical.get(i, 0.0) for i in candidates], dtype=np.float32),
+                self.hybrid_weight,
+            )
+            top = np.argsort(fused, kind="stable")[: self.k_docs]
+            scores[row, : len(top)] = fused[top]
+            indices[row, : len(top)] = candidates[top]
+
+        return scores, indices
+
+    def _fetch_documents(self, positions: set[int]) -> dict[int, Document]:
+        """Utility, look up the chunks at FAISS index positions."""
+        if isinstance(self.db.docstore, SQLiteDocstore):
+            return self.db.docstore.search_positions(list(positions))
+        return {
+            i: self.db.docstore.search(self.db.index_to_docstore_id[i])
+            for i in positions
+        }
+
+    def rerank(self, query: str, top_matches: list[dict]) -> list[dict]:
+        """
+        Re-orders search results by cross-encoder relevance to the query,
+        if a rerank_model is configured
+
+        Args:
+            query (str): Question the results were retrieved for
+            top_matches (list[dict]): Results, as returned by similarity_search
+
+        Returns:
+            list[dict]: The results, most relevant first
+        """
+        if self.reranker is None:
+            return top_matches
+        return self.reranker.rerank(query, top_matches)
+
+    def _select_contexts(self, top_matches: list[dict]) -> list[dict]:
+        """Utility, keep the top documents scoring close to the best match."""
+        # re-ranked results are no longer in distance order
+        if top_matches and "rerank_score" in top_matches[0]:
+            return top_matches[: self.k_contexts]
+        return [
+            text
+            for text in top_matches[: self.k_contexts]
+            if text["score"] <= 1.5 * top_matches[0]["score"]
+        ]
+
+    @staticmethod
+    def stuff_contexts(top_matches: list[dict]) -> str:
+        """Utility, join document texts into a single prompt context."""
+        return "\n\n".join(text["page_content"] for text in top_matches)
+
+    def build_prompt(self, query: str, contexts: list[dict]) -> str:
+        """
+        Formats the question answering prompt for a query
+
+        Args:
+            query (str): Question to be answered
+            contexts (list[dict]): Documents to answer the question from
+
+        Returns:
+            str: Prompt string ready for the generation pipeline
+        """
+        return generate_prompt.format(
+            context=self.stuff_contexts(contexts), question=query
+        )
+
+    def generate(self, prompts: list[str]) -> list[str]:
+        """
+        Runs pre-built prompt strings through the generation pipeline
+
+        Args:
+            prompts (list[str]): Prompts, as returned by build_prompt
+
+        Returns:
+            list[str]: Generated text, one per prompt
+        """
+        if self.remote_generator is not None:
+            return self.remote_generator.generate(prompts)
+        responses = self.generate_pipeline(prompts, batch_size=len(prompts))
+        return [response["generated_text"] for response in responses]
+
+    def metrics(self) -> dict:
+        """Answer cache and generation scheduler metrics for monitoring."""
+        return {
+            "answer_cache": self.answer_cache.stats(),
+            "query_cache": self.query_cache.stats(),
+            "generation_scheduler": self.scheduler.metrics()
+            if self.scheduler
+            else None,
+            "reranker": self.reranker.stats() if self.reranker else None,
+        }
+
+    def _generate_one(self, prompt: str) -> str:
+        """Utility, generate a prompt, through the micro-batcher if enabled."""
+        if self.scheduler:
+            return self.scheduler.generate(prompt)
+        return self.generate([prompt])[0]
+
+    def after_fork(self):
+        """
+        Restarts background threads and drops connections in a process
+        forked from the one the Inquirer was loaded in, e.g. a pre-fork
+        worker, where they would otherwise be missing or shared.
+        """
+        self.answer_cache.after_fork()
+        if self.scheduler:
+            self.scheduler.after_fork()
+        if self.remote_generator:
+            self.remote_generator.after_fork()
+
+        return None
+
+    def health(self) -> dict:
+        """
+        Whether the vector store is loaded and the LLM reachable, raising
+        if a generation service cannot be reached
+        """
+        return {
+            "vectors": self.db.index.ntotal,
+            "generation": self.remote_generator.health()
+            if self.remote_generator
+            else "local",
+        }
 
     def query_texts(self, query: str, top_matches: list[dict]) -> str:
         """
@@ -149,36 +670,101 @@ class Inquirer:
         Returns:
             str: Generated response to query
         """
-        # reshape Document object structure
-        top_matches = [
-            Document(page_content=text["page_content"], metadata={"source": "NA"})
-            for text in top_matches[: self.k_contexts]
-            if text["score"] <= 1.5 * top_matches[0]["score"]
-        ]
-        if top_matches:
-            self.logger.info(f"Passing top {len(top_matches)} results for QA")
+        contexts = self._select_contexts(top_matches)
+        cache_key = self.answer_cache.key(query, contexts)
+        answer = self.answer_cache.get(cache_key)
+        if answer is not None:
+            self.logger.info(f"Answer cache hit, {self.answer_cache.stats()}")
+            return answer
+
+        if contexts:
+            self.logger.info(f"Passing top {len(contexts)} results for QA")
+            prompt = self.build_prompt(query, contexts)
+            answer = self._generate_one(prompt)
+        else:
+            answer = "NA"
 
-            # stuff all above documents to the model
-            chain = load_qa_chain(
-                self.llm_generate, chain_type="stuff", prompt=generate_prompt
-            )
+        self.answer_cache.set(cache_key, answer)
+        return answer
 
-            # parameter values
-            response = chain(
-                {"input_documents": top_matches, "question": query},
-                return_only_outputs=True,
-            )
-        else:
-            response = {"output_text": "NA"}
+    def stream_answer(self, query: str, top_matches: list[dict]) -> Iterator[str]:
+        """
+        As query_texts, but yields the answer in pieces as the LLM generates
+        it, with generation running in a worker thread.  With micro-batching
+        on, or a generation service, the whole answer is yielded at once, so
+        that every prompt goes through the scheduler's batches and none run
+        beside them.
+
+        Args:
+            query (str): Question for which most relevant articles will
+            be returned
+            top_matches (list[dict]): Documents closely related to query
 
-        return response["output_text"]
+        Yields:
+            str: Successive chunks of the generated response to query
+        """
+        contexts = self._select_contexts(top_matches)
+        cache_key = self.answer_cache.key(query, contexts)
+        answer = self.answer_cache.get(cache_key)
+        if answer is not None:
+            self.logger.info(f"Answer cache hit, {self.answer_cache.stats()}")
+            yield answer
+            return None
+
+        if not contexts:
+            self.answer_cache.set(cache_key, "NA")
+            yield "NA"
+            return None
+
+        if self.generate_pipeline is None or self.scheduler:
+            # a generation service returns whole answers, and the scheduler
+            # generates whole batches
+            answer = self._generate_one(self.build_prompt(query, contexts))
+            self.answer_cache.set(cache_key, answer)
+            yield answer
+            return None
+
+        self.logger.info(f"Streaming answer from top {len(contexts)} results")
+        chunks = []
+        for chunk in self._stream_generate(self.build_prompt(query, contexts)):
+            chunks.append(chunk)
+            yield chunk
+
+        self.answer_cache.set(cache_key, "".join(chunks))
+        return None
 
-    def summarizer(self, top_matches: List[Document]) -> str:
+    def _stream_generate(self, prompt: str) -> Iterator[str]:
+        """Utility, yield text from the local LLM as a worker thread generates it."""
+        tokenizer = self.generate_pipeline.tokenizer
+        streamer = TextIteratorStreamer(
+            tokenizer, skip_prompt=True, skip_special_tokens=True
+        )
+        inputs = tokenizer(prompt, return_tensors="pt")
+        errors = []
+
+        def generate():
+            try:
+                self.generate_pipeline.model.generate(**inputs, streamer=streamer)
+            except Exception as e:
+                # unblock the consumer, which re-raises below
+                errors.append(e)
+                streamer.end()
+
+        thread = Thread(target=generate, daemon=True)
+        thread.start()
+        for chunk in streamer:
+            if chunk:
+                yield chunk
+        thread.join()
+        if errors:
+            raise errors[0]
+
+    def summarizer(self, top_matches: list[dict]) -> str:
         """
         Produces a summary of the documents passed in
 
         Args:
-            top_matches (List[Document]): Documents closely related to query
+            top_matches (list[dict]): Documents closely related to query
 
         Returns:
             str: Generated summary text
@@ -193,21 +779,13 @@ class Inquirer:
             pass
 
         else:
-            top_matches = [
-                Document(page_content=text["page_content"], metadata={"source": "NA"})
-                for text in top_matches[: self.k_contexts]
-            ]
+            top_matches = top_matches[: self.k_contexts]
 
             # are there any closely matched documents passed in?
             if top_matches:
                 self.logger.info(f"Passing top {len(top_matches)} results for QA")
-                llm_chain = LLMChain(llm=self.llm_summarise, prompt=summarise_prompt)
-
-                stuff_chain = StuffDocumentsChain(
-                    llm_chain=llm_chain, document_variable_name="text"
-                )
-
-                response = stuff_chain.run(top_matches)
+                prompt = summarise_prompt.format(text=self.stuff_contexts(top_matches))
+                response = self.summarise_pipeline(prompt)[0]["summary_text"]
 
                 return response
 
@@ -0,0 +1,88 @@
+import logging
+from pathlib import Path
+from transformers import AutoModelForSeq2SeqLM, AutoTokenizer, Pipeline, pipeline
+
+logger = logging.getLogger(__name__)
+
+# Ways to run the answer LLM on CPU: full precision, PyTorch dynamic int8
+# quantisation of the linear layers, or an ONNX Runtime export
+LLM_BACKENDS = ("pytorch", "int8", "onnx")
+
+
+def _onnx_model(model_name_or_path: str, export_dir: Path):
+    """
+    Loads an ONNX Runtime export of a seq2seq model, exporting it on first
+    use.  The export includes a decoder with past key/values, so decoding
+    reuses the attention cache rather than re-running the whole sequence.
+    """
+    try:
+        from optimum.onnxruntime import ORTModelForSeq2SeqLM
+    except ImportError as e:
+        raise ImportError(
+            "The onnx LLM backend needs optimum: pip install optimum[onnxruntime]"
+        ) from e
+
+    if (export_dir / "config.json").exists():
+        logger.info(f"Loading ONNX export from {export_dir}")
+        return ORTModelForSeq2SeqLM.from_pretrained(export_dir, use_cache=True)
+
+    logger.info(f"Exporting {model_name_or_path} to ONNX in {export_dir}")
+    model = ORTModelForSeq2SeqLM.from_pretrained(
+        model_name_or_path, export=True, use_cache=True
+    )
+    model.save_pretrained(export_dir)
+    return model
+
+
+def _int8_model(model_name_or_path: str):
+    """
+    Loads a seq2seq model with its linear layers quantised to int8 on the
+    fly, which takes seconds, so the quantised weights are not saved.
+    """
+    import torch
+
+    model = AutoModelForSeq2SeqLM.from_pretrained(model_name_or_path)
+    return torch.quantization.quantize_dynamic(
+        model, {torch.nn.Linear}, dtype=torch.qint8
+    )
+
+
+def load_generation_pipeline(
+    model_name_or_path: str,
+    backend: str = "pytorch",
+    max_length: int = 512,
+    export_root: str = "models",
+) -> Pipeline:
+    """
+    Loads a text2text-generation pipeline for the answer LLM on a CPU
+    inference backend.  Decoding is greedy, as with a temperature of 0,
+    and uses the key/value cache on every backend.
+
+    Args:
+        model_name_or_path (str): Hugging Face model id, or local path.
+        backend (str, optional): One of LLM_BACKENDS. Defaults to "pytorch".
+        max_length (int, optional): Longest answer generated, in tokens.
+            Defaults to 512.
+        export_root (str, optional): Directory ONNX exports are cached in.
+            Defaults to "models".
+
+    Returns:
+        Pipeline: Generation pipeline, with the tokenizer and model.generate
+            interface Inquirer uses for streaming.
+    """
+    if backend == "pytorch":
+        model = AutoModelForSeq2SeqLM.from_pretrained(model_name_or_path)
+    elif backend == "int8":
+        model = _int8_model(model_name_or_path)
+    elif backend == "onnx":
+        export_dir = Path(export_root) / f"{model_name_or_path.replace('/', '--')}-onnx"
+        model = _onnx_model(model_name_or_path, export_dir)
+    else:
+        raise ValueError(f"Unknown llm_backend {backend}, expected {LLM_BACKENDS}")
+
+    model.config.use_cache = True
+    model.generation_config.max_length = max_length
+    model.generation_config.do_sample = False
+    tokenizer = AutoTokenizer.from_pretrained(model_name_or_path)
+
+    return pipeline("text2text-generation", model=model, tokenizer=tokenizer)
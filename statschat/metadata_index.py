@@ -0,0 +1,195 @@
+import numpy as np
+from datetime import date, datetime
+from pathlib import Path
+from typing import Union
+from urllib.parse import urlparse
+
+# Filterable chunk metadata, saved alongside the FAISS index
+METADATA_FILE = "metadata_index.npz"
+
+# Publication types, as they appear in ONS URL paths
+RELEASE_TYPES = ("bulletins", "articles")
+
+
+def release_type_of(url: str) -> str:
+    """Publication type from a URL path, "" if not a bulletin or article."""
+    segments = urlparse(url).path.split("/")
+    return next((x for x in segments if x in RELEASE_TYPES), "")
+
+
+def url_keywords_of(url: str) -> list[str]:
+    """Topic path segments of a URL, preceding its publication type."""
+    segments = [x for x in urlparse(url).path.split("/") if x]
+    release_type = release_type_of(url)
+    if release_type:
+        return segments[: segments.index(release_type)]
+    return segments[:-1]
+
+
+def date_ordinal(value: Union[str, date]) -> int:
+    """Proleptic Gregorian ordinal of a YYYY-MM-DD string or date."""
+    if isinstance(value, str):
+        value = datetime.strptime(value, "%Y-%m-%d")
+    return value.toordinal()
+
+
+class MetadataIndex:
+    """
+    Precomputed filters over the chunks of a vector store, numbered by their
+    position in the FAISS index.  Each release type and URL keyword holds a
+    bitset of the chunks it applies to, packed little-endian as FAISS's
+    IDSelectorBitmap expects, and release dates are held as day ordinals.
+    """
+
+    def __init__(
+        self,
+        release_types: list[str],
+        release_type_bits: np.ndarray,
+        keywords: list[str],
+        keyword_bits: np.ndarray,
+        dates: np.ndarray,
+    ):
+        """
+        Args:
+            release_types (list[str]): Release types, one per bitset row.
+            release_type_bits (np.ndarray): Packed bitset of chunks per
+                release type.
+            keywords (list[str]): URL keywords, one per bitset row.
+            keyword_bits (np.ndarray): Packed bitset of chunks per keyword.
+            dates (np.ndarray): Release date ordinal of each chunk, 0 if
+                unknown.
+        """
+        self.release_types = {x: i for i, x in enumerate(release_types)}
+        self.release_type_bits = release_type_bits
+        self.keywords = {x: i for i, x in enumerate(keywords)}
+        self.keyword_bits = keyword_bits
+        self.dates = dates
+
+        return None
+
+    def __len__(self) -> int:
+        return len(self.dates)
+
+    @classmethod
+    def build(cls, metadatas: list[dict]):
+        """
+        Indexes chunk metadata, numbered in the order given.
+
+        Args:
+            metadatas (list[dict]): Chunk metadata, in FAISS index order.
+
+        Returns:
+            MetadataIndex: The built index.
+        """
+        release_types, keywords = {}, {}
+        dates = np.zeros(len(metadatas), dtype=np.int32)
+        for position, metadata in enumerate(metadatas):
+            url = metadata.get("url", "")
+            release_types.setdefault(release_type_of(url), []).append(position)
+            for keyword in url_keywords_of(url):
+                keywords.setdefault(keyword, []).append(position)
+            if metadata.get("date_ordinal"):
+                dates[position] = metadata["date_ordinal"]
+            elif metadata.get("date"):
+                dates[position] = datetime.strptime(
+                    metadata["date"], "%d %B %Y"
+                ).toordinal()
+
+        def bitsets(positions: list[list[int]]) -> np.ndarray:
+            bits = np.zeros((len(positions), len(metadatas)), dtype=bool)
+            for row, members in enumerate(positions):
+                bits[row, members] = True
+            return np.packbits(bits, axis=1, bitorder="little")
+
+        return cls(
+            list(release_types),
+            bitsets(list(release_types.values())),
+            list(keywords),
+            bitsets(list(keywords.values())),
+            dates,
+        )
+
+    def select(
+        self,
+        release_types: list[str] = None,
+        date_from: Union[str, date] = None,
+        date_to: Union[str, date] = None,
+        url_keywords: list[str] = None,
+    ) -> np.ndarray:
+        """
+        Chunks matching all of the filters given, matching any one of the
+        values listed for a filter.  Unknown values match nothing.
+
+        Args:
+            release_types (list[str], optional): Release types to keep,
+                e.g. ["bulletins"].
+            date_from (str | date, optional): Earliest release date to keep,
+                as YYYY-MM-DD if a string.
+            date_to (str | date, optional): Latest release date to keep.
+            url_keywords (list[str], optional): URL topic keywords to keep,
+                e.g. ["economy"].
+
+        Returns:
+            np.ndarray: Packed bitset of the chunks selected, or None if no
+                filters are given.
+        """
+        selected = None
+        if release_types is not None:
+            rows = [
+                self.release_types[x] for x in release_types if x in self.release_types
+            ]
+            selected = self._union(self.release_type_bits, rows)
+        if url_keywords is not None:
+            rows = [self.keywords[x] for x in url_keywords if x in self.keywords]
+            selected = self._intersect(selected, self._union(self.keyword_bits, rows))
+        if date_from is not None or date_to is not None:
+            in_range = np.ones(len(self), dtype=bool)
+            if date_from is not None:
+                in_range &= self.dates >= date_ordinal(date_from)
+            if date_to is not None:
+                in_range &= self.dates <= date_ordinal(date_to)
+            selected = self._intersect(
+                selected, np.packbits(in_range, bitorder="little")
+            )
+
+        return selected
+
+    def _union(self, bits: np.ndarray, rows: list[int]) -> np.ndarray:
+        if not rows:
+            return np.zeros((len(self) + 7) // 8, dtype=np.uint8)
+        return np.bitwise_or.reduce(bits[rows], axis=0)
+
+    @staticmethod
+    def _intersect(selected: np.ndarray, bits: np.ndarray) -> np.ndarray:
+        return bits if selected is None else selected & bits
+
+    def positions(self, selected: np.ndarray) -> np.ndarray:
+        """FAISS index positions of the chunks in a packed bitset."""
+        return np.flatnonzero(
+            np.unpackbits(selected, count=len(self), bitorder="little")
+        )
+
+    def save(self, faiss_db_root: str):
+        """Saves the index next to the vector store."""
+        np.savez(
+            Path(faiss_db_root) / METADATA_FILE,
+            release_types=np.array(list(self.release_types), dtype=str),
+            release_type_bits=self.release_type_bits,
+            keywords=np.array(list(self.keywords), dtype=str),
+            keyword_bits=self.keyword_bits,
+            dates=self.dates,
+        )
+
+        return None
+
+    @classmethod
+    def load(cls, faiss_db_root: str):
+        """Loads the index saved next to a vector store."""
+        with np.load(Path(faiss_db_root) / METADATA_FILE) as arrays:
+            return cls(
+                arrays["release_types"].tolist(),
+                arrays["release_type_bits"],
+                arrays["keywords"].tolist(),
+                arrays["keyword_bits"],
+                arrays["dates"],
+            )
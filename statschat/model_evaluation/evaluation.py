@@ -5,7 +5,9 @@ import numpy as np
 from time import time
 from datetime import datetime
 from pandas import DataFrame, Series
+from werkzeug.datastructures import MultiDict
 from statschat.llm import Inquirer
+from statschat.latest_flag_helpers import get_latest_flag, recency_rerank
 from statschat.utils import deduplicator
 from rapidfuzz import fuzz
 
@@ -339,6 +341,55 @@ def test_search_result(df):
     return df
 
 
+def compare_hybrid_retrieval(searcher, question_config: dict) -> dict:
+    """
+    Retrieval quality and latency of dense only search against hybrid BM25
+    and dense search, over the same questions and vector store.
+
+    Parameters
+    ----------
+    searcher: Inquirer
+        the searcher, with a BM25 index loaded
+    question_config: dict
+        the question configuration dictionary
+
+    Returns
+    -------
+    dict
+        mean retrieval rank, keyword score and milliseconds per question for
+        each search
+    """
+    questions = list(question_config.keys())
+    configured_weight = searcher.hybrid_weight
+    # compare against a moderate weight if hybrid search is not configured
+    hybrid_weight = configured_weight or 0.3
+    metrics = {}
+    for name, weight in (("dense", 0.0), ("hybrid", hybrid_weight)):
+        searcher.hybrid_weight = weight
+        # time real searches, not hits on vectors and results cached earlier
+        searcher.query_cache.clear()
+        start_time = time()
+        results = searcher.similarity_search_batch(questions)
+        seconds = (time() - start_time) / max(len(questions), 1)
+
+        ranks, keywords = [], []
+        for question, docs in zip(questions, results):
+            expected = question_config[question]
+            ranks.append(
+                mmr_url(expected["expected_url"], [x["section_url"] for x in docs])
+            )
+            keywords.append(
+                score_retrieval(docs[0]["page_content"], expected["expected_keywords"])
+                if docs
+                else 0.0
+            )
+        metrics[f"retrieval_rank_{name}"] = float(np.mean(ranks))
+        metrics[f"retrieval_keyword_{name}"] = float(np.mean(keywords))
+        metrics[f"retrieval_ms_{name}"] = round(seconds * 1000, 1)
+    searcher.hybrid_weight = configured_weight
+    return metrics
+
+
 def pipeline(app_config_file: str = "app_config.toml", n_questions: int = None):
     """main pipeline function for the evaluator"""
     question_config = toml.load(
@@ -355,9 +406,20 @@ def pipeline(app_config_file: str = "app_config.toml", n_questions: int = None):
     app_config = toml.load(app_config_file)
     searcher = Inquirer(**app_config["db"], **app_config["search"])
 
+    # Retrieve for all questions in one batch, sharing the time between them
+    questions = list(question_config.keys())
+    start_time = time()
+    retrieved = dict(zip(questions, searcher.similarity_search_batch(questions)))
+    retrieval_seconds = (time() - start_time) / max(len(questions), 1)
+
     def make_query(question: str) -> dict:
         """Utility, wrap all search functionality into one."""
-        docs = searcher.similarity_search(question)
+        # weight towards recent releases as the app does for a plain search
+        _, latest = get_latest_flag(
+            MultiDict({"q": question}), app_config["app"]["latest_max"]
+        )
+        docs = searcher.rerank(question, retrieved[question])
+        docs = recency_rerank(docs, latest=latest)
         answer = searcher.query_texts(question, docs)
         print(question)
         print(len(docs))
@@ -368,7 +430,11 @@ def pipeline(app_config_file: str = "app_config.toml", n_questions: int = None):
         }
         return results
 
-    test_responses = get_test_responses(question_config.keys(), searcher=make_query)
+    test_responses = get_test_responses(questions, searcher=make_query)
+    for response in test_responses:
+        response["seconds_to_run"] = round(
+            response["seconds_to_run"] + retrieval_seconds, 2
+        )
     test_response_df = DataFrame(test_responses)
     print(test_response_df.head())
     question_info = test_answer_provided(test_response_df, question_config)
@@ -382,6 +448,8 @@ def pipeline(app_config_file: str = "app_config.toml", n_questions: int = None):
         "answer_fuzz": question_info["fuzzy_partial_ratio"].mean(),
         "answer_present": question_info["test_answer_provided"].mean(),
     }
+    if searcher.bm25 is not None:
+        metrics.update(compare_hybrid_retrieval(searcher, question_config))
 
     col_order = [
         "questions",
@@ -1,21 +1,90 @@
 import glob
+import hashlib
 import json
 import logging
 import toml
 import os
+import shutil
+import numpy as np
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 from pathlib import Path
 from datetime import datetime
 from langchain.document_loaders import DirectoryLoader, JSONLoader
-from langchain.embeddings import HuggingFaceEmbeddings
 from langchain.vectorstores import FAISS
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain.document_transformers import EmbeddingsRedundantFilter
+from langchain.docstore.document import Document
+from langchain.docstore.in_memory import InMemoryDocstore
+from statschat.bm25 import BM25Index
+from statschat.docstore import write_sqlite_docstore
+from statschat.embedding import ShardedEmbedder, load_embeddings
+from statschat.faiss_index import find_near_duplicates, make_index
+from statschat.metadata_index import MetadataIndex
+
+# Records which bulletins (and which of their chunks) are held in a vector store
+MANIFEST_FILE = "manifest.json"
+
+
+def section_metadata(record: dict) -> dict:
+    """
+    Helper, instructs on how to fetch metadata.  Here I take
+    everything that isn't the actual text body.
+    """
+    release_date = datetime.strptime(record["release_date"], "%Y-%m-%d")
+    return {
+        "source": record["id"],
+        "seq_num": 1,
+        "title": record["title"],
+        "url": record["url"],
+        "date": release_date.__format__("%d %B %Y"),
+        # day number, for date filters and recency weighting without parsing
+        "date_ordinal": release_date.toordinal(),
+        "section": record["section_header"],
+        "section_url": record["section_url"],
+        "figures": record["figures"],
+    }
+
+
+def bulletin_sections(filename: str, split_directory: str = None) -> list[Document]:
+    """
+    Splits a scraped bulletin JSON into one document per article section,
+    optionally also writing each section out as JSON for debugging.
+    Returns None if the bulletin cannot be parsed.
+
+    Module level, so that it can be mapped over a process pool.
+    """
+    try:
+        with open(filename) as file:
+            json_file = json.load(file)
+        id = json_file["id"][:60]
+
+        publication_meta = {i: json_file[i] for i in json_file if i != "content"}
+        sections = []
+        for num, section in enumerate(json_file["content"]):
+            section_json = {**section, **publication_meta}
+            sections.append(
+                Document(
+                    page_content=section_json["section_text"],
+                    metadata=section_metadata(section_json),
+                )
+            )
+
+            if split_directory:
+                with open(f"{split_directory}/{id}_{num}.json", "w") as new_file:
+                    json.dump(section_json, new_file)
+
+    except (KeyError, ValueError):
+        # missing fields, or a release date not in %Y-%m-%d form
+        return None
+
+    return sections
 
 
 class PrepareVectorStore(DirectoryLoader, JSONLoader):
     """
     Leveraging Langchain classes to split pre-scraped article
-    JSONs to section-level JSONs and loading to document
+    JSONs into section-level documents and loading to document
     store
     """
 
@@ -26,9 +95,23 @@ class PrepareVectorStore(DirectoryLoader, JSONLoader):
         split_length: int = 1000,
         split_overlap: int = 100,
         embedding_model: str = "sentence-transformers/all-mpnet-base-v2",
+        embedding_backend: str = "pytorch",
+        embedding_threads: int = 0,
         redundant_similarity_threshold: float = 0.99,
         faiss_db_root: str = "db_lc",
         db=None,  # vector store
+        incremental: bool = False,
+        index_type: str = "IndexFlatL2",
+        index_nlist: int = 100,
+        index_hnsw_m: int = 32,
+        index_pq_m: int = 48,
+        index_train_size: int = 50000,
+        split_workers: int = 0,
+        write_split_files: bool = False,
+        embed_batch_size: int = 32,
+        embed_processes: int = 0,
+        embed_shard_size: int = 10000,
+        embed_checkpoint_dir: str = None,
         logger: logging.Logger = None,
     ):
         self.directory = directory
@@ -36,9 +119,26 @@ class PrepareVectorStore(DirectoryLoader, JSONLoader):
         self.split_length = split_length
         self.split_overlap = split_overlap
         self.embedding_model = embedding_model
+        self.embedding_backend = embedding_backend
+        self.embedding_threads = embedding_threads
         self.redundant_similarity_threshold = redundant_similarity_threshold
         self.faiss_db_root = faiss_db_root
         self.db = db
+        self.incremental = incremental
+        self.split_workers = split_workers
+        self.write_split_files = write_split_files
+        self.embed_batch_size = embed_batch_size
+        self.embed_processes = embed_processes
+        self.embed_shard_size = embed_shard_size
+        # kept outside faiss_db_root, whose existence marks a completed build
+        self.embed_checkpoint_dir = embed_checkpoint_dir or f"{faiss_db_root}_shards"
+        self.index_type = index_type
+        self.index_params = {
+            "nlist": index_nlist,
+            "hnsw_m": index_hnsw_m,
+            "pq_m": index_pq_m,
+            "train_size": index_train_size,
+        }
 
         # Initialise logger
         if logger is None:
@@ -47,127 +147,284 @@ class PrepareVectorStore(DirectoryLoader, JSONLoader):
         else:
             self.logger = logger
 
+        self.logger.info("Fingerprint bulletin JSONs")
+        self.bulletins = self._scan_bulletins()
+
         # Does the named vector store exist already?
         if not os.path.exists(self.faiss_db_root):
-            self.logger.info("Split full article JSONs into sections")
-            self._json_splitter()
-            self.logger.info("Load section JSONs to memory")
-            self._load_json_to_memory()
-            self.logger.info("Instantiate embeddings")
-            self._instantiate_embeddings()
-            self.logger.info("Filtering out duplicate docs")
-            self._drop_redundant_documents()
-            self.logger.info("Chunk documents")
-            self._split_documents()
-            self.logger.info("Vectorise docs and commit to physical vector store")
-            self._embed_documents()
+            self._build_vector_store()
+
+        elif self.incremental:
+            self.logger.info("Update existing vector store with changed bulletins")
+            self._update_vector_store()
 
         else:
             self.logger.info("Aborting: named vector store already exists")
 
         return None
 
-    def _json_splitter(self):
+    def _build_vector_store(self):
         """
-        Splits scraped json to multiple json,
-        one for each article section
+        Embeds every bulletin into a new vector store, replacing any saved
+        in faiss_db_root
         """
+        self.db = None
+        self.manifest = {}
+        self.pending = list(self.bulletins)
+        self.logger.info("Split full article JSONs into sections")
+        self._load_sections()
+        self.logger.info("Instantiate embeddings")
+        self._instantiate_embeddings()
+        self.logger.info("Filtering out duplicate docs")
+        self._drop_redundant_documents()
+        self.logger.info("Chunk documents")
+        self._split_documents()
+        self.logger.info("Vectorise docs and commit to physical vector store")
+        self._embed_documents()
 
-        # create storage folder for split articles
-        isExist = os.path.exists(self.split_directory)
-        if not isExist:
-            os.makedirs(self.split_directory)
-
-        found_articles = glob.glob(f"{self.directory}/*.json")
-        self.logger.info(f"Found {len(found_articles)} articles for splitting")
+        return None
 
-        # extract metadata from each article section
-        # and store as separate JSON
-        for filename in found_articles:
+    def _scan_bulletins(self) -> dict:
+        """
+        Fingerprints each scraped bulletin JSON with a hash of its content,
+        keyed on bulletin id
+        """
+        bulletins = {}
+        for filename in sorted(glob.glob(f"{self.directory}/*.json")):
             if "0000" not in filename:
+                with open(filename, "rb") as file:
+                    content = file.read()
                 try:
-                    with open(filename) as file:
-                        json_file = json.load(file)
-                        id = json_file["id"][:60]
-
-                        publication_meta = {
-                            i: json_file[i] for i in json_file if i != "content"
-                        }
-                        for num, section in enumerate(json_file["content"]):
-                            section_json = {**section, **publication_meta}
-
-                            with open(
-                                f"{self.split_directory}/{id}_{num}.json", "w"
-                            ) as new_file:
-                                json.dump(section_json, new_file)
-
-                except KeyError:
+                    bulletin_id = json.loads(content)["id"]
+                except (KeyError, ValueError):
                     self.logger.warning(f"Could not parse {filename}")
+                    continue
+                bulletins[bulletin_id] = {
+                    "filename": filename,
+                    "hash": hashlib.sha256(content).hexdigest(),
+                }
 
-        return None
+        return bulletins
 
-    def _load_json_to_memory(self):
-        """
-        Loads article section JSONs to memory
-        """
-
-        def metadata_func(record: dict, metadata: dict) -> dict:
-            """
-            Helper, instructs on how to fetch metadata.  Here I take
-            everything that isn't the actual text body.
-            """
-            metadata["title"] = record["title"]
-            metadata["url"] = record["url"]
-            metadata["date"] = datetime.strptime(
-                record["release_date"], "%Y-%m-%d"
-            ).__format__("%d %B %Y")
-            metadata["source"] = record["id"]
-            metadata["section"] = record["section_header"]
-            metadata["section_url"] = record["section_url"]
-            metadata["figures"] = record["figures"]
-            return metadata
-
-        # required argument from JSONLoader class
-        # text element required
-        json_loader_kwargs = {
-            "jq_schema": ".",
-            "content_key": "section_text",
-            "metadata_func": metadata_func,
-        }
-        self.logger.info(f"Loading data from {self.split_directory}")
-        self.loader = DirectoryLoader(
-            self.split_directory,
-            glob="*.json",
-            use_multithreading=True,
-            show_progress=True,
-            loader_cls=JSONLoader,
-            loader_kwargs=json_loader_kwargs,
+    def _update_vector_store(self):
+        """
+        Compares bulletins on disk against the vector store manifest, drops
+        chunks of changed or removed bulletins, and embeds only new or
+        changed bulletins into the existing store
+        """
+        self.manifest = self._load_manifest()
+        if self.manifest is None:
+            # without a manifest the stored chunks can't be matched to
+            # bulletins, so appending would index every chunk twice
+            self.logger.warning(
+                "No manifest found for vector store, rebuilding it from scratch"
+            )
+            self._build_vector_store()
+            return None
+
+        self.pending = [
+            bulletin_id
+            for bulletin_id, bulletin in self.bulletins.items()
+            if self.manifest.get(bulletin_id, {}).get("hash") != bulletin["hash"]
+        ]
+        removed = [x for x in self.manifest if x not in self.bulletins]
+        self.logger.info(
+            f"{len(self.pending)} new or changed and {len(removed)} removed bulletins"
         )
 
-        self.docs = self.loader.load()
+        # split before loading any models, so the worker processes forked
+        # for splitting stay small
+        if self.pending:
+            self.logger.info("Split changed article JSONs into sections")
+            self._load_sections()
+
+        self.logger.info("Instantiate embeddings")
+        self._instantiate_embeddings()
+        self.db = FAISS.load_local(self.faiss_db_root, self.embeddings)
+
+        if not self.pending and not removed:
+            self.logger.info("Vector store is up to date")
+            return None
+
+        stale_chunks = [
+            chunk_id
+            for bulletin_id in self.pending + removed
+            for chunk_id in self.manifest.pop(bulletin_id, {}).get("chunk_ids", [])
+        ]
+        self.logger.info(f"Delete {len(stale_chunks)} stale chunks")
+        self._delete_chunks(stale_chunks)
+
+        if self.pending:
+            self.logger.info("Filtering out duplicate docs")
+            self._drop_redundant_documents()
+            self.logger.info("Chunk documents")
+            self._split_documents()
+            self.logger.info("Vectorise docs and append to physical vector store")
+            self._embed_documents()
+        else:
+            self._save_vector_store()
+
+        return None
+
+    def _load_manifest(self) -> dict:
+        """
+        Reads the manifest of bulletin hashes and chunk ids for the vector
+        store, None if it has none
+        """
+        manifest_file = Path(self.faiss_db_root) / MANIFEST_FILE
+        if not manifest_file.exists():
+            return None
+
+        with open(manifest_file) as file:
+            return json.load(file)
+
+    def _delete_chunks(self, chunk_ids: list[str]):
+        """
+        Removes chunks from the FAISS index and docstore, re-numbering the
+        index to docstore mapping to match the compacted index
+        """
+        chunk_ids = set(chunk_ids)
+        positions = [
+            position
+            for position, chunk_id in self.db.index_to_docstore_id.items()
+            if chunk_id in chunk_ids
+        ]
+        if not positions:
+            return None
+
+        try:
+            self.db.index.remove_ids(np.array(positions, dtype=np.int64))
+        except RuntimeError:
+            # HNSW graphs do not support removal, rebuild from remaining vectors
+            self.logger.info("Rebuilding index without deleted chunks")
+            vectors = self.db.index.reconstruct_n(0, self.db.index.ntotal)
+            vectors = np.delete(vectors, positions, axis=0)
+            self.db.index = make_index(self.index_type, vectors, **self.index_params)
+            self.db.index.add(vectors)
+        kept = [
+            chunk_id
+            for _, chunk_id in sorted(self.db.index_to_docstore_id.items())
+            if chunk_id not in chunk_ids
+        ]
+        self.db.index_to_docstore_id = dict(enumerate(kept))
+        for chunk_id in chunk_ids:
+            self.db.docstore._dict.pop(chunk_id, None)
+
+        return None
+
+    def _load_sections(self):
+        """
+        Splits scraped bulletin JSONs into article section documents held in
+        memory, parsing bulletins in parallel across a process pool.  Section
+        JSONs are only written to split_directory if write_split_files is set.
+        """
+        found_articles = [self.bulletins[x]["filename"] for x in self.pending]
+        self.logger.info(f"Found {len(found_articles)} articles for splitting")
+
+        split_directory = None
+        if self.write_split_files:
+            # create storage folder for split articles, clearing
+            # any section files left over from a previous run
+            split_directory = self.split_directory
+            os.makedirs(split_directory, exist_ok=True)
+            for filename in glob.glob(f"{split_directory}/*.json"):
+                os.remove(filename)
+
+        self.docs = list(self._stream_sections(found_articles, split_directory))
         self.logger.info(f"{len(self.docs)} article sections loaded to memory")
         return None
 
+    def _stream_sections(self, filenames: list[str], split_directory: str = None):
+        """
+        Yields section documents bulletin by bulletin, as workers finish them
+        """
+        to_sections = partial(bulletin_sections, split_directory=split_directory)
+        n_workers = min(self.split_workers or os.cpu_count(), len(filenames))
+
+        if n_workers <= 1:
+            results = map(to_sections, filenames)
+            yield from self._log_failures(filenames, results)
+        else:
+            with ProcessPoolExecutor(max_workers=n_workers) as executor:
+                results = executor.map(
+                    to_sections,
+                    filenames,
+                    chunksize=max(1, len(filenames) // (4 * n_workers)),
+                )
+                yield from self._log_failures(filenames, results)
+
+    def _log_failures(self, filenames: list[str], results):
+        """
+        Flattens per-bulletin section lists, logging bulletins that failed
+        """
+        for filename, sections in zip(filenames, results):
+            if sections is None:
+                self.logger.warning(f"Could not parse {filename}")
+                continue
+            yield from sections
+
     def _instantiate_embeddings(self):
         """
         Loads embedding model to memory
         """
-        self.embeddings = HuggingFaceEmbeddings(model_name=self.embedding_model)
+        self.embeddings = load_embeddings(
+            self.embedding_model,
+            self.embedding_backend,
+            self.embedding_threads,
+            logger=self.logger,
+        )
 
         return None
 
+    def _embedder(self, name: str) -> ShardedEmbedder:
+        """
+        Shard checkpointing embedder, one per stage of the build
+        """
+        return ShardedEmbedder(
+            self.embeddings,
+            Path(self.embed_checkpoint_dir) / name,
+            shard_size=self.embed_shard_size,
+            batch_size=self.embed_batch_size,
+            processes=self.embed_processes,
+            logger=self.logger,
+        )
+
+    @staticmethod
+    def _text_hash(text: str) -> str:
+        return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
     def _drop_redundant_documents(self):
         """
-        Drops document chunks (except one!) above cosine
-        similarity threshold
+        Drops document sections (except one!) above cosine
+        similarity threshold, using a nearest neighbour search over
+        the section embeddings.  Embeddings are kept for reuse by any
+        section that ends up as a single chunk.
         """
-        redundant_filter = EmbeddingsRedundantFilter(
-            embeddings=self.embeddings,
-            similarity_threshold=self.redundant_similarity_threshold,
+        self.section_vectors = {}
+        if not self.docs:
+            return None
+
+        texts = [doc.page_content for doc in self.docs]
+        vectors = self._embedder("sections").embed(
+            texts,
+            [f"{doc.metadata['section_url']}_{n}" for n, doc in enumerate(self.docs)],
         )
-        self.docs = redundant_filter.transform_documents(self.docs)
+        duplicates = find_near_duplicates(vectors, self.redundant_similarity_threshold)
+
+        for dropped, kept, similarity in duplicates:
+            self.logger.info(
+                f"Dropping section {self.docs[dropped].metadata['section_url']}: "
+                f"cosine similarity {similarity:.4f} to "
+                f"{self.docs[kept].metadata['section_url']}"
+            )
+        dropped = {x[0] for x in duplicates}
+        self.docs = [doc for n, doc in enumerate(self.docs) if n not in dropped]
+        self.section_vectors = {
+            self._text_hash(text): vector
+            for n, (text, vector) in enumerate(zip(texts, vectors))
+            if n not in dropped
+        }
         self.logger.info(f"{len(self.docs)} article sections remain in memory")
-        self.logger.info([x.metadata["section_url"] for x in self.docs])
 
         return None
 
@@ -189,14 +446,83 @@ class PrepareVectorStore(DirectoryLoader, JSONLoader):
     def _embed_documents(self):
         """
         Tokenise all document chunks and commit to vector store,
-        persisting in local memory for efficiency of reproducibility
+        persisting in local memory for efficiency of reproducibility.
+        Chunks are appended if the vector store already exists.
+        Embeddings are checkpointed in shards until the store is saved, so
+        an interrupted run picks up where it left off.
         """
-        if not os.path.exists(self.faiss_db_root):
-            self.db = FAISS.from_documents(self.chunks, self.embeddings)
-            self.db.save_local(self.faiss_db_root)
-        else:
-            self.logger.info("Vector store already exists")
-            self.db = FAISS.load_local(self.faiss_db_root, self.embeddings)
+        chunk_ids = defaultdict(list)
+        for chunk in self.chunks:
+            source = chunk.metadata["source"]
+            chunk.metadata["chunk_id"] = f"{source}_{len(chunk_ids[source])}"
+            chunk_ids[source].append(chunk.metadata["chunk_id"])
+
+        ids = [chunk.metadata["chunk_id"] for chunk in self.chunks]
+        if self.chunks:
+            texts = [chunk.page_content for chunk in self.chunks]
+            vectors = self._chunk_vectors(texts, ids)
+            if self.db is None:
+                index = make_index(self.index_type, vectors, **self.index_params)
+                self.db = FAISS(
+                    self.embeddings.embed_query, index, InMemoryDocstore({}), {}
+                )
+            else:
+                self.logger.info(f"Appending {len(ids)} chunks to vector store")
+            self.db.add_embeddings(
+                zip(texts, vectors),
+                metadatas=[chunk.metadata for chunk in self.chunks],
+                ids=ids,
+            )
+
+        for bulletin_id in self.pending:
+            self.manifest[bulletin_id] = {
+                "hash": self.bulletins[bulletin_id]["hash"],
+                "chunk_ids": chunk_ids.get(bulletin_id, []),
+            }
+        self._save_vector_store()
+        # the vectors are saved, so the checkpoints of every stage can go
+        shutil.rmtree(self.embed_checkpoint_dir, ignore_errors=True)
+
+        return None
+
+    def _chunk_vectors(self, texts: list[str], ids: list[str]) -> np.ndarray:
+        """
+        Embeds chunks, reusing section embeddings for chunks that are a
+        whole section
+        """
+        section_vectors = getattr(self, "section_vectors", {})
+        known = [section_vectors.get(self._text_hash(text)) for text in texts]
+        missing = [n for n, vector in enumerate(known) if vector is None]
+        self.logger.info(
+            f"Reusing {len(texts) - len(missing)} section embeddings for chunks"
+        )
+
+        new_vectors = iter(
+            self._embedder("chunks").embed(
+                [texts[n] for n in missing], [ids[n] for n in missing]
+            )
+        )
+        return np.vstack(
+            [next(new_vectors) if vector is None else vector for vector in known]
+        )
+
+    def _save_vector_store(self):
+        """
+        Persists the vector store and its manifest to disk, along with a
+        SQLite copy of the docstore for lazy loading in Inquirer, a BM25
+        index of the chunks for hybrid search and a metadata index for
+        filtered search
+        """
+        self.db.save_local(self.faiss_db_root)
+        write_sqlite_docstore(self.db, self.faiss_db_root)
+        docs = [
+            self.db.docstore.search(chunk_id)
+            for _, chunk_id in sorted(self.db.index_to_docstore_id.items())
+        ]
+        BM25Index.build([doc.page_content for doc in docs]).save(self.faiss_db_root)
+        MetadataIndex.build([doc.metadata for doc in docs]).save(self.faiss_db_root)
+        with open(Path(self.faiss_db_root) / MANIFEST_FILE, "w") as file:
+            json.dump(self.manifest, file, indent=4)
 
         return None
 
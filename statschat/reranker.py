@@ -0,0 +1,130 @@
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from sentence_transformers import CrossEncoder
+from statschat.cache import chunk_key, normalise_question
+
+
+class Reranker:
+    """
+    Re-orders search results by a cross-encoder's relevance score for each
+    (question, chunk) pair, so that a wide, cheap retrieval can be narrowed
+    to the few best contexts for the LLM.  Scores are cached per chunk and
+    normalised question, and only uncached pairs are scored, in one batch.
+    """
+
+    def __init__(
+        self,
+        model_name: str = "cross-encoder/ms-marco-MiniLM-L-6-v2",
+        top_n: int = 20,
+        batch_size: int = 32,
+        cache_size: int = 10000,
+        logger: logging.Logger = None,
+    ):
+        """
+        Args:
+            model_name (str, optional): Hugging Face cross-encoder model id.
+                Defaults to "cross-encoder/ms-marco-MiniLM-L-6-v2".
+            top_n (int, optional): Search results re-ranked, those beyond
+                keep their order after them. Defaults to 20.
+            batch_size (int, optional): Pairs per forward pass. Defaults to 32.
+            cache_size (int, optional): Pair scores kept, 0 disables the
+                cache. Defaults to 10000.
+        """
+        # Initialise logger
+        if logger is None:
+            self.logger = logging.getLogger(__name__)
+
+        else:
+            self.logger = logger
+
+        self.model = CrossEncoder(model_name, device="cpu")
+        self.top_n = top_n
+        self.batch_size = batch_size
+        self.cache_size = cache_size
+        self.hits = 0
+        self.misses = 0
+        self._scores = OrderedDict()
+        self._lock = threading.Lock()
+
+        return None
+
+    @staticmethod
+    def question_hash(question: str) -> str:
+        """Utility, identify a question by its normalised form."""
+        return hashlib.sha1(normalise_question(question).encode()).hexdigest()[:16]
+
+    def scores(self, question: str, docs: list[dict]) -> list[float]:
+        """
+        Cross-encoder relevance of each chunk to a question, higher is better
+
+        Args:
+            question (str): The user query.
+            docs (list[dict]): Search results, as returned by similarity_search.
+
+        Returns:
+            list[float]: One score per document.
+        """
+        question_hash = self.question_hash(question)
+        keys = [(chunk_key(doc), question_hash) for doc in docs]
+        with self._lock:
+            scores = [self._scores.get(key) for key in keys]
+            for key, score in zip(keys, scores):
+                if score is not None:
+                    self._scores.move_to_end(key)
+            missing = [n for n, score in enumerate(scores) if score is None]
+            self.hits += len(docs) - len(missing)
+            self.misses += len(missing)
+
+        if missing:
+            predicted = self.model.predict(
+                [(question, docs[n]["page_content"]) for n in missing],
+                batch_size=self.batch_size,
+                show_progress_bar=False,
+            )
+            with self._lock:
+                for n, score in zip(missing, predicted.tolist()):
+                    scores[n] = score
+                    self._store(keys[n], score)
+
+        return scores
+
+    def _store(self, key: tuple, score: float):
+        if self.cache_size <= 0:
+            return None
+        self._scores[key] = score
+        self._scores.move_to_end(key)
+        while len(self._scores) > self.cache_size:
+            self._scores.popitem(last=False)
+
+    def rerank(self, question: str, docs: list[dict]) -> list[dict]:
+        """
+        Re-orders the top_n search results by cross-encoder score, adding it
+        to each as rerank_score
+
+        Args:
+            question (str): The user query.
+            docs (list[dict]): Search results, best first.
+
+        Returns:
+            list[dict]: The top_n results by relevance, then any others in
+                their original order.
+        """
+        candidates, rest = docs[: self.top_n], docs[self.top_n :]
+        if not candidates:
+            return docs
+        scores = self.scores(question, candidates)
+        self.logger.info(f"Re-ranked {len(candidates)} results, {self.stats()}")
+        order = sorted(range(len(candidates)), key=lambda n: -scores[n])
+        return [candidates[n] | {"rerank_score": scores[n]} for n in order] + rest
+
+    def stats(self) -> dict:
+        """Pair score cache counters for monitoring."""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._scores),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
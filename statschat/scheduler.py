@@ -0,0 +1,156 @@
+import logging
+import queue
+import threading
+from collections import deque
+from concurrent.futures import Future
+from statistics import mean
+from time import monotonic
+from typing import Callable
+
+
+class _Request:
+    """A prompt waiting for generation, with the future its caller blocks on."""
+
+    __slots__ = ("prompt", "future", "enqueued")
+
+    def __init__(self, prompt: str):
+        self.prompt = prompt
+        self.future = Future()
+        self.enqueued = monotonic()
+
+
+class GenerationScheduler:
+    """
+    Queues prompts from concurrent requests and groups them into
+    micro-batches, so the single LLM pipeline runs one forward pass per
+    batch instead of contending for it once per request.
+    """
+
+    def __init__(
+        self,
+        generate_fn: Callable[[list[str]], list[str]],
+        max_batch_size: int = 8,
+        max_wait_ms: float = 20.0,
+        logger: logging.Logger = None,
+    ):
+        """
+        Args:
+            generate_fn (Callable): Generates one output per prompt for a batch
+                of prompts, e.g. Inquirer.generate.
+            max_batch_size (int, optional): Most prompts run in one pass.
+                Defaults to 8.
+            max_wait_ms (float, optional): Longest a prompt waits for others to
+                join its batch. Defaults to 20.0.
+        """
+        # Initialise logger
+        if logger is None:
+            self.logger = logging.getLogger(__name__)
+
+        else:
+            self.logger = logger
+
+        self.generate_fn = generate_fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000
+
+        self._batches = 0
+        self._requests = 0
+        self._batch_sizes = deque(maxlen=1000)
+        self._waits_ms = deque(maxlen=1000)
+        self._start()
+
+        return None
+
+    def _start(self):
+        self._queue = queue.Queue()
+        self._worker = threading.Thread(
+            target=self._run, name="generation-scheduler", daemon=True
+        )
+        self._worker.start()
+
+    def after_fork(self):
+        """Starts a new worker in a forked process, which has no threads."""
+        self._start()
+
+        return None
+
+    def submit(self, prompt: str) -> Future:
+        """Queues a prompt, returning a future resolving to its generated text."""
+        request = _Request(prompt)
+        self._queue.put(request)
+        return request.future
+
+    def generate(self, prompt: str, timeout: float = None) -> str:
+        """Queues a prompt and blocks until its batch has been generated."""
+        return self.submit(prompt).result(timeout=timeout)
+
+    def close(self):
+        """Stops the worker once the prompts already queued are generated."""
+        self._queue.put(None)
+        self._worker.join()
+
+        return None
+
+    def _run(self):
+        while True:
+            request = self._queue.get()
+            if request is None:
+                return None
+
+            # Collect more prompts until the batch is full or the oldest
+            # prompt has waited long enough
+            batch = [request]
+            deadline = request.enqueued + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - monotonic()
+                try:
+                    request = (
+                        self._queue.get(timeout=remaining)
+                        if remaining > 0
+                        else self._queue.get_nowait()
+                    )
+                except queue.Empty:
+                    break
+                if request is None:
+                    self._queue.put(None)
+                    break
+                batch.append(request)
+
+            self._run_batch(batch)
+
+    def _run_batch(self, batch: list[_Request]):
+        started = monotonic()
+        self._batches += 1
+        self._requests += len(batch)
+        self._batch_sizes.append(len(batch))
+        self._waits_ms.extend((started - x.enqueued) * 1000 for x in batch)
+        self.logger.info(f"Generating micro-batch of {len(batch)} prompts")
+
+        try:
+            outputs = self.generate_fn([x.prompt for x in batch])
+        except Exception as e:
+            self.logger.exception("Generation failed for micro-batch")
+            for request in batch:
+                request.future.set_exception(e)
+            return None
+
+        for request, output in zip(batch, outputs):
+            request.future.set_result(output)
+
+        return None
+
+    def metrics(self) -> dict:
+        """Queue depth, batch size and wait time metrics for monitoring."""
+        batch_sizes = list(self._batch_sizes)
+        waits = sorted(self._waits_ms)
+        return {
+            "queue_depth": self._queue.qsize(),
+            "batches": self._batches,
+            "requests": self._requests,
+            "mean_batch_size": round(mean(batch_sizes), 2) if batch_sizes else 0.0,
+            "largest_batch_size": max(batch_sizes, default=0),
+            "mean_wait_ms": round(mean(waits), 2) if waits else 0.0,
+            "p95_wait_ms": round(waits[int(0.95 * (len(waits) - 1))], 2)
+            if waits
+            else 0.0,
+        }
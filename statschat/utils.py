@@ -1,3 +1,21 @@
+from contextlib import contextmanager
+from time import perf_counter
+
+
+@contextmanager
+def timed(logger, phase: str, timings: dict = None):
+    """
+    Logs how long a block takes, e.g. a startup phase, also recording the
+    seconds taken in timings under the phase name if given.
+    """
+    start = perf_counter()
+    yield
+    seconds = perf_counter() - start
+    logger.info(f"{phase} took {seconds:.2f}s")
+    if timings is not None:
+        timings[phase] = round(seconds, 3)
+
+
 def deduplicator(records: list[dict], keys: list[str]) -> list[dict]:
     """
     Given a list of dicts, removes duplicates based on one or more listed keys.
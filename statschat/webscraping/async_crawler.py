@@ -0,0 +1,372 @@
+import aiohttp
+import asyncio
+import os
+from bs4 import BeautifulSoup
+from collections import deque
+from time import monotonic
+from urllib.parse import urldefrag, urljoin, urlparse
+from urllib.robotparser import RobotFileParser
+from crawl_state import CrawlState, write_changed_pages
+
+
+class TokenBucket:
+    """
+    Token bucket rate limiter: allows bursts of up to `capacity` requests,
+    refilling at `rate` requests per second.
+    """
+
+    def __init__(self, rate, capacity=1):
+        """
+        Args:
+            rate (float): Requests allowed per second, on average.
+            capacity (int): Largest burst of requests allowed.
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        """
+        Wait until a request is allowed.
+        """
+        async with self._lock:
+            while True:
+                now = monotonic()
+                self.tokens = min(
+                    self.capacity, self.tokens + (now - self.updated) * self.rate
+                )
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class AsyncWebCrawler:
+    """
+    An asyncio web crawler, fetching pages concurrently over a pooled HTTP
+    session while keeping to per-host concurrency and rate limits and to
+    robots.txt. Pages that have not changed since the last fetch are skipped
+    using conditional requests.
+    """
+
+    def __init__(
+        self,
+        seed_url,
+        max_pages=100,
+        save_dir="web_pages",
+        max_concurrency=10,
+        per_host_limit=2,
+        rate=1.0,
+        burst=1,
+        user_agent="statschat-crawler",
+        same_host=True,
+        timeout=30,
+        state_file=None,
+        recrawl_interval=86400,
+    ):
+        """
+        Initialize the AsyncWebCrawler.
+
+        Args:
+            seed_url (str): The starting URL for web crawling.
+            max_pages (int): The maximum number of pages to crawl.
+            save_dir (str): The directory to save the crawled pages.
+            max_concurrency (int): The maximum number of requests in flight.
+            per_host_limit (int): The maximum number of requests in flight to
+                any one host.
+            rate (float): Requests per second allowed to any one host, lowered
+                to honour a robots.txt crawl-delay.
+            burst (int): Requests allowed to a host in a burst.
+            user_agent (str): User agent sent, and matched against robots.txt.
+            same_host (bool): Only follow links on the seed URL's host.
+            timeout (float): Seconds before a request is abandoned.
+            state_file (str): Optional SQLite file persisting the crawl, so
+                that it can be resumed and recrawled incrementally.
+            recrawl_interval (float): Seconds before a crawled page is due to
+                be fetched again, with a state file.
+        """
+        self.seed_url = seed_url
+        self.max_pages = max_pages
+        self.save_dir = save_dir
+        self.max_concurrency = max_concurrency
+        self.per_host_limit = per_host_limit
+        self.rate = rate
+        self.burst = burst
+        self.user_agent = user_agent
+        self.same_host = same_host
+        self.timeout = timeout
+
+        self.visited = set()
+        self.seen = {seed_url}
+        self.to_visit = deque([seed_url])
+        # validators from the last fetch of each page, for conditional requests
+        self.validators = {}
+        # links found on each page, followed again if it has not changed
+        self.links = {}
+        self.changed_pages = {}
+        self.unchanged = []
+
+        self._robots = {}
+        self._buckets = {}
+
+        self.state = None
+        if state_file:
+            self.state = CrawlState(state_file, recrawl_interval)
+            self.state.enqueue([seed_url])
+
+    async def _robots_for(self, session, url):
+        """
+        Fetch and parse robots.txt for the host of a URL, once per host.
+        """
+        parsed_url = urlparse(url)
+        host = f"{parsed_url.scheme}://{parsed_url.netloc}"
+        if host not in self._robots:
+            self._robots[host] = asyncio.ensure_future(
+                self._fetch_robots(session, host)
+            )
+        return await self._robots[host]
+
+    async def _fetch_robots(self, session, host):
+        robots = RobotFileParser(f"{host}/robots.txt")
+        lines = []
+        try:
+            async with session.get(f"{host}/robots.txt") as response:
+                if response.status == 200:
+                    lines = (await response.text()).splitlines()
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            print(f"An error occurred while downloading {host}/robots.txt: {e}")
+        robots.parse(lines)
+
+        delay = robots.crawl_delay(self.user_agent)
+        rate = min(self.rate, 1 / float(delay)) if delay else self.rate
+        self._buckets[host] = TokenBucket(rate, self.burst)
+        return robots
+
+    async def download_page(self, session, url):
+        """
+        Download a web page, conditionally on it having changed since the
+        last download.
+
+        Args:
+            session (aiohttp.ClientSession): The pooled HTTP session.
+            url (str): The URL of the web page to download.
+
+        Returns:
+            str: The HTML content of the web page, or None if unchanged or
+                the download fails.
+        """
+        parsed_url = urlparse(url)
+        await self._buckets[f"{parsed_url.scheme}://{parsed_url.netloc}"].acquire()
+
+        try:
+            async with session.get(
+                url, headers=self._conditional_headers(url)
+            ) as response:
+                if response.status == 304:
+                    self.unchanged.append(url)
+                    if self.state:
+                        self.state.record_fetch(url)
+                    return None
+                if response.status != 200:
+                    print(f"Failed to download {url}. Status code: {response.status}")
+                    self._record_failure(url, "http_error", response.status)
+                    return None
+                if "html" not in response.content_type:
+                    self._record_failure(url, "not_html", response.status)
+                    return None
+
+                self.validators[url] = {
+                    "etag": response.headers.get("ETag"),
+                    "last_modified": response.headers.get("Last-Modified"),
+                }
+                return await self._read_text(url, response)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            print(f"An error occurred while downloading {url}: {str(e)}")
+            self._record_failure(url, "network_error")
+        return None
+
+    async def _read_text(self, url, response):
+        """
+        Decode a response body, or None if its charset is unknown or does
+        not match the content, rather than fail the whole crawl.
+        """
+        try:
+            return await response.text()
+        except (UnicodeDecodeError, LookupError) as e:
+            print(f"Could not decode {url}: {str(e)}")
+            self._record_failure(url, "decode_error", response.status)
+        return None
+
+    def _record_failure(self, url, outcome, status=None):
+        if self.state:
+            self.state.record_failure(url, outcome, status)
+
+    def _conditional_headers(self, url):
+        if self.state:
+            validators = self.state.validators(url)
+        else:
+            validators = self.validators.get(url, {})
+        headers = {}
+        if validators.get("etag"):
+            headers["If-None-Match"] = validators["etag"]
+        if validators.get("last_modified"):
+            headers["If-Modified-Since"] = validators["last_modified"]
+        return headers
+
+    def save_page(self, url, html_content):
+        """
+        Save a web page to a local directory.
+
+        Args:
+            url (str): The URL of the web page.
+            html_content (str): The HTML content of the web page.
+        """
+        parsed_url = urlparse(url)
+        page_name = parsed_url.netloc + parsed_url.path.replace("/", "_") + ".html"
+        file_name = os.path.join(self.save_dir, page_name)
+
+        os.makedirs(os.path.dirname(file_name), exist_ok=True)
+
+        with open(file_name, "w", encoding="utf-8") as f:
+            f.write(html_content)
+        print(f"Saved {url} as {file_name}")
+        return file_name
+
+    def enqueue_links(self, url, html_content):
+        """
+        Add links found on a page to the frontier, unless already seen.
+
+        Args:
+            url (str): The URL of the web page.
+            html_content (str): The HTML content of the web page.
+
+        Returns:
+            list: The links found.
+        """
+        seed_host = urlparse(self.seed_url).netloc
+        links = []
+        soup = BeautifulSoup(html_content, "html.parser")
+        for a_tag in soup.find_all("a", href=True):
+            full_url = urldefrag(urljoin(url, a_tag.get("href"))).url
+            parsed_url = urlparse(full_url)
+            if parsed_url.scheme not in ("http", "https"):
+                continue
+            if self.same_host and parsed_url.netloc != seed_host:
+                continue
+            links.append(full_url)
+        self.links[url] = links
+        self._follow(links)
+        return links
+
+    def _follow(self, links):
+        if self.state:
+            links = self.state.enqueue(links)
+        for link in links:
+            if link not in self.seen:
+                self.seen.add(link)
+                self.to_visit.append(link)
+
+    async def _visit(self, session, url):
+        robots = await self._robots_for(session, url)
+        if not robots.can_fetch(self.user_agent, url):
+            print(f"Disallowed by robots.txt: {url}")
+            self._record_failure(url, "robots_disallowed")
+            return
+
+        print(f"Crawling: {url}")
+        html_content = await self.download_page(session, url)
+        self.visited.add(url)
+        if html_content:
+            links = self.enqueue_links(url, html_content)
+            changed = True
+            if self.state:
+                changed = self.state.record_fetch(
+                    url, html_content, links=links, **self.validators[url]
+                )
+            if changed:
+                self.changed_pages[url] = self.save_page(url, html_content)
+        elif url in self.unchanged:
+            if self.state:
+                self._follow(self.state.links(url))
+            else:
+                self._follow(self.links.get(url, []))
+
+    async def _worker(self, session, condition):
+        while True:
+            async with condition:
+                await condition.wait_for(
+                    lambda: self._can_take() or self._in_flight == 0
+                )
+                if not self._can_take():
+                    return
+                url = self.to_visit.popleft()
+                self._in_flight += 1
+                self._taken += 1
+
+            try:
+                await self._visit(session, url)
+            finally:
+                async with condition:
+                    self._in_flight -= 1
+                    condition.notify_all()
+
+    def _can_take(self):
+        return bool(self.to_visit) and (self._taken < self.max_pages)
+
+    async def crawl_async(self):
+        """
+        Perform web crawling.
+
+        Returns:
+            list: URLs of the pages saved, being new or changed.
+        """
+        self.changed_pages = {}
+        self.unchanged = []
+        self._in_flight = 0
+        self._taken = 0
+        # robots.txt and rate limits are re-read on every crawl
+        self._robots = {}
+        self._buckets = {}
+        if self.state:
+            self.to_visit = deque(self.state.due())
+        elif not self.to_visit:
+            # recrawl from the seed, relying on conditional requests
+            self.seen = {self.seed_url}
+            self.to_visit = deque([self.seed_url])
+        condition = asyncio.Condition()
+
+        connector = aiohttp.TCPConnector(
+            limit=self.max_concurrency, limit_per_host=self.per_host_limit
+        )
+        async with aiohttp.ClientSession(
+            connector=connector,
+            headers={"User-Agent": self.user_agent},
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+        ) as session:
+            await asyncio.gather(
+                *(self._worker(session, condition) for _ in range(self.max_concurrency))
+            )
+
+        write_changed_pages(self.save_dir, self.changed_pages)
+        return list(self.changed_pages)
+
+    def crawl(self):
+        """
+        Perform web crawling, from synchronous code.
+
+        Returns:
+            list: URLs of the pages saved, being new or changed.
+        """
+        return asyncio.run(self.crawl_async())
+
+
+if __name__ == "__main__":
+    seed_url = "https://abs.gov.au"  # Replace with your starting URL
+    max_pages = 100  # Maximum number of pages to crawl
+    save_dir = "web_pages"  # Directory to save crawled pages
+
+    crawler = AsyncWebCrawler(seed_url, max_pages, save_dir)
+    crawler.crawl()
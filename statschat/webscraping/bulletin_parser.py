@@ -0,0 +1,264 @@
+import json
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from lxml import etree, html
+from urllib.parse import urljoin
+from crawl_state import CHANGED_PAGES_FILE
+
+# XPath expressions are compiled once, and evaluated by libxml2
+CANONICAL_URL = etree.XPath(
+    '//link[@rel="canonical"]/@href | //meta[@property="og:url"]/@content'
+)
+# in order of preference
+TITLES = (
+    etree.XPath('//meta[@property="og:title"]/@content'),
+    etree.XPath("//h1"),
+    etree.XPath("//title"),
+)
+RELEASE_DATE = etree.XPath(
+    '//meta[@name="citation_publication_date" or @property="article:published_time"'
+    ' or @name="dcterms.date" or @name="DC.date.issued"]/@content'
+    " | //time/@datetime"
+)
+CONTACT = etree.XPath('//a[starts-with(@href, "mailto:")]')
+CONTENT_ROOT = etree.XPath("//main | //article | //body")
+SECTION_HEADERS = etree.XPath(".//h2")
+
+DATE_FORMATS = ("%Y-%m-%d", "%Y/%m/%d", "%Y%m%d", "%d %B %Y", "%d/%m/%Y")
+
+
+def clean_text(text):
+    """
+    Collapse runs of white space, including newlines.
+    """
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def slugify(text):
+    """
+    Lower case text with punctuation dropped and spaces as hyphens, as used
+    for bulletin ids and section anchors.
+    """
+    text = re.sub(r"[^\w\s–-]", "", text.lower())
+    return re.sub(r"\s+", "-", text.strip())
+
+
+def parse_date(text):
+    """
+    Normalise a release date to YYYY-MM-DD, or None if not recognised.
+    """
+    text = clean_text(text)
+    # ISO timestamps are matched on their date alone
+    for candidate in (text, text[:10]):
+        for date_format in DATE_FORMATS:
+            try:
+                return datetime.strptime(candidate, date_format).strftime("%Y-%m-%d")
+            except ValueError:
+                pass
+    return None
+
+
+def _first_text(results):
+    for result in results:
+        text = clean_text(result if isinstance(result, str) else result.text_content())
+        if text:
+            return text
+    return ""
+
+
+def _figure(element, url):
+    """
+    Figure metadata for an image or embedded chart.
+    """
+    caption = element.xpath("ancestor::figure[1]/figcaption")
+    return {
+        "figure_title": clean_text(element.get("alt") or element.get("title") or "")
+        or _first_text(caption),
+        "figure_subtitle": "",
+        "figure_url": urljoin(url, element.get("src", "")),
+        "figure_type": "image" if element.tag == "img" else "interactive",
+    }
+
+
+def _sections(root, url):
+    """
+    Splits the page content at each h2 header, walking the elements between
+    one header and the next once.
+    """
+    sections = []
+    for header in SECTION_HEADERS(root):
+        section_header = clean_text(header.text_content())
+        anchor = header.get("id")
+        parent = header.getparent()
+        if not anchor and parent is not None and parent.tag == "section":
+            anchor = parent.get("id")
+        anchor = anchor or slugify(re.sub(r"^\d+\.\s*", "", section_header))
+
+        texts, figures = [], []
+        for sibling in header.itersiblings():
+            if not isinstance(sibling.tag, str):  # comments
+                continue
+            if sibling.tag == "h2":
+                break
+            texts.append(sibling.text_content())
+            figures.extend(
+                _figure(element, url)
+                for element in sibling.iter("img", "iframe")
+                if element.get("src")
+            )
+
+        sections.append(
+            {
+                "section_url": f"{url}#{anchor}",
+                "section_header": section_header,
+                "section_text": clean_text(" ".join(texts)),
+                "figures": figures,
+            }
+        )
+    return sections
+
+
+def parse_page(html_content, url=""):
+    """
+    Parse a saved bulletin page into the JSON schema PrepareVectorStore
+    reads, parsing the HTML once with lxml.
+
+    Args:
+        html_content (str | bytes): HTML content of the web page.
+        url (str): URL of the page, used if the page does not give its own.
+
+    Returns:
+        dict: Bulletin with id, title, url, release_date, contact_name,
+            contact_link and a list of content sections, or None if the page
+            is empty or unparseable, or has no title, release date or sections.
+    """
+    try:
+        tree = html.fromstring(html_content)
+    except (etree.ParserError, ValueError):
+        # an empty or truncated download, or a str declaring its encoding
+        return None
+    url = _first_text(CANONICAL_URL(tree)) or url
+    title = next(filter(None, (_first_text(xpath(tree)) for xpath in TITLES)), "")
+    release_date = next(filter(None, (parse_date(x) for x in RELEASE_DATE(tree))), None)
+    roots = CONTENT_ROOT(tree)
+    content = _sections(roots[0], url) if roots else []
+    if not title or not release_date or not content:
+        return None
+
+    contacts = CONTACT(tree)
+    return {
+        "id": f"{release_date}_{slugify(title)}",
+        "title": title,
+        "url": url,
+        "release_date": release_date,
+        "contact_name": clean_text(contacts[0].text_content()) if contacts else "",
+        "contact_link": contacts[0].get("href") if contacts else "",
+        "content": content,
+    }
+
+
+def parse_file(page_path, url="", output_directory=None):
+    """
+    Parse a saved page, writing the bulletin JSON to output_directory.
+
+    Returns:
+        str: The bulletin JSON file written, or None if not a bulletin.
+    """
+    with open(page_path, "rb") as file:
+        bulletin = parse_page(file.read(), url)
+    if bulletin is None:
+        return None
+
+    output_path = os.path.join(output_directory, f"{bulletin['id'][:200]}.json")
+    with open(output_path, "w", encoding="utf-8") as output_file:
+        json.dump(bulletin, output_file, ensure_ascii=False, indent=4)
+    return output_path
+
+
+def _parse_file(args):
+    return parse_file(*args)
+
+
+class BulletinParser:
+    """
+    Parses a directory of crawled pages into bulletin JSONs, in parallel
+    across a process pool.
+    """
+
+    def __init__(self, input_directory, output_directory, processes=0):
+        """
+        Initialize the BulletinParser.
+
+        Args:
+            input_directory (str): The directory of crawled HTML pages.
+            output_directory (str): The directory to write bulletin JSONs to.
+            processes (int): Worker processes, 0 for one per CPU.
+        """
+        self.input_directory = input_directory
+        self.output_directory = output_directory
+        self.processes = processes or os.cpu_count()
+
+    def pages(self, changed_only=False):
+        """
+        Pages to parse, with their URLs where known.
+
+        Args:
+            changed_only (bool): Only the pages the last crawl listed in
+                changed_pages.json as new or changed.
+
+        Returns:
+            list: (page path, url) pairs.
+        """
+        changed_pages = os.path.join(self.input_directory, CHANGED_PAGES_FILE)
+        if changed_only and os.path.exists(changed_pages):
+            with open(changed_pages) as f:
+                return [(x["file"], x["url"]) for x in json.load(f)]
+
+        return [
+            (os.path.join(self.input_directory, file), "")
+            for file in sorted(os.listdir(self.input_directory))
+            if file.endswith(".html")
+        ]
+
+    def parse_directory(self, changed_only=False):
+        """
+        Parse crawled pages into bulletin JSONs.
+
+        Args:
+            changed_only (bool): Only parse the pages the last crawl listed
+                as new or changed.
+
+        Returns:
+            list: The bulletin JSON files written.
+        """
+        os.makedirs(self.output_directory, exist_ok=True)
+        tasks = [
+            (page_path, url, self.output_directory)
+            for page_path, url in self.pages(changed_only)
+        ]
+
+        if self.processes > 1 and len(tasks) > 1:
+            with ProcessPoolExecutor(max_workers=self.processes) as executor:
+                outputs = list(
+                    executor.map(
+                        _parse_file,
+                        tasks,
+                        chunksize=max(1, len(tasks) // (4 * self.processes)),
+                    )
+                )
+        else:
+            outputs = [_parse_file(task) for task in tasks]
+
+        written = [x for x in outputs if x]
+        print(f"Parsed {len(written)} bulletins from {len(tasks)} pages")
+        return written
+
+
+if __name__ == "__main__":
+    input_directory = "web_pages"
+    output_directory = "preprocessed_data"
+
+    parser = BulletinParser(input_directory, output_directory)
+    parser.parse_directory()
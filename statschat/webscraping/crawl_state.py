@@ -0,0 +1,217 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+# Written to the save directory after each crawl, listing the pages saved
+CHANGED_PAGES_FILE = "changed_pages.json"
+
+
+def write_changed_pages(save_dir, changed_pages):
+    """
+    Write the pages saved by a crawl, being new or changed, for the parser
+    and an incremental vector store update to pick up.
+
+    Args:
+        save_dir (str): The directory crawled pages are saved in.
+        changed_pages (dict): Saved file name, keyed on URL.
+    """
+    os.makedirs(save_dir, exist_ok=True)
+    with open(os.path.join(save_dir, CHANGED_PAGES_FILE), "w") as f:
+        json.dump(
+            [{"url": url, "file": file} for url, file in changed_pages.items()],
+            f,
+            indent=4,
+        )
+
+
+class CrawlState:
+    """
+    Persistent crawl state in a local SQLite file: the frontier of pages due
+    to be fetched, and for each fetched page its content hash, validators for
+    conditional requests, outgoing links, when it was last fetched and the
+    outcome of that fetch.
+    An interrupted crawl resumes from the pages still due, and a scheduled
+    recrawl fetches only the pages whose recrawl interval has passed.
+    """
+
+    def __init__(self, path, recrawl_interval=86400):
+        """
+        Initialize the CrawlState, creating the state file if needed.
+
+        Args:
+            path (str): The SQLite state file.
+            recrawl_interval (float): Seconds after a fetch before a page is
+                due to be fetched again.
+        """
+        self.path = path
+        self.recrawl_interval = recrawl_interval
+        self.con = sqlite3.connect(path)
+        self.con.execute(
+            """CREATE TABLE IF NOT EXISTS pages (
+                url TEXT PRIMARY KEY,
+                content_hash TEXT,
+                etag TEXT,
+                last_modified TEXT,
+                links TEXT,
+                last_fetched REAL,
+                status INTEGER,
+                outcome TEXT
+            )"""
+        )
+        # state files written before fetch outcomes were recorded
+        columns = [row[1] for row in self.con.execute("PRAGMA table_info(pages)")]
+        for column, column_type in (("status", "INTEGER"), ("outcome", "TEXT")):
+            if column not in columns:
+                self.con.execute(f"ALTER TABLE pages ADD COLUMN {column} {column_type}")
+        self.con.execute("CREATE INDEX IF NOT EXISTS fetched ON pages (last_fetched)")
+        self.con.commit()
+
+    @staticmethod
+    def content_hash(html_content):
+        """
+        Fingerprint of a page's content.
+        """
+        return hashlib.sha256(html_content.encode("utf-8")).hexdigest()
+
+    def enqueue(self, urls):
+        """
+        Add URLs to the frontier, unless already known.
+
+        Args:
+            urls (list): URLs found while crawling.
+
+        Returns:
+            list: The URLs not seen before, in the order given.
+        """
+        new_urls = []
+        for url in dict.fromkeys(urls):
+            cursor = self.con.execute(
+                "INSERT OR IGNORE INTO pages (url) VALUES (?)", (url,)
+            )
+            if cursor.rowcount:
+                new_urls.append(url)
+        self.con.commit()
+        return new_urls
+
+    def due(self, now=None):
+        """
+        URLs due to be fetched: those never fetched, in the order they were
+        found, then those whose recrawl interval has passed. Failed fetches
+        are recorded too, so are due again only after the recrawl interval.
+        """
+        now = time.time() if now is None else now
+        rows = self.con.execute(
+            "SELECT url FROM pages WHERE last_fetched IS NULL "
+            "OR last_fetched <= ? ORDER BY last_fetched IS NOT NULL, rowid",
+            (now - self.recrawl_interval,),
+        ).fetchall()
+        return [row[0] for row in rows]
+
+    def validators(self, url):
+        """
+        ETag and Last-Modified headers from the last fetch of a page.
+        """
+        row = self.con.execute(
+            "SELECT etag, last_modified FROM pages WHERE url = ?", (url,)
+        ).fetchone()
+        if row is None:
+            return {}
+        return {"etag": row[0], "last_modified": row[1]}
+
+    def links(self, url):
+        """
+        Links found on a page when it was last downloaded.
+        """
+        row = self.con.execute(
+            "SELECT links FROM pages WHERE url = ?", (url,)
+        ).fetchone()
+        return json.loads(row[0]) if row and row[0] else []
+
+    def outcome(self, url):
+        """
+        HTTP status and outcome of the last fetch of a page.
+        """
+        row = self.con.execute(
+            "SELECT status, outcome FROM pages WHERE url = ?", (url,)
+        ).fetchone()
+        if row is None:
+            return {}
+        return {"status": row[0], "outcome": row[1]}
+
+    def record_fetch(
+        self, url, html_content=None, etag=None, last_modified=None, links=None
+    ):
+        """
+        Record a fetch of a page, which is then due again after the
+        recrawl interval.
+
+        Args:
+            url (str): The URL fetched.
+            html_content (str): The content downloaded, or None if the page
+                was unchanged (HTTP 304). Failed downloads are recorded with
+                record_failure.
+            etag (str): The ETag header returned.
+            last_modified (str): The Last-Modified header returned.
+            links (list): Links found on the page.
+
+        Returns:
+            bool: Whether the page content is new or has changed.
+        """
+        now = time.time()
+        self.con.execute("INSERT OR IGNORE INTO pages (url) VALUES (?)", (url,))
+        if html_content is None:
+            self.con.execute(
+                "UPDATE pages SET last_fetched = ?, status = 304, "
+                "outcome = 'unchanged' WHERE url = ?",
+                (now, url),
+            )
+            self.con.commit()
+            return False
+
+        content_hash = self.content_hash(html_content)
+        row = self.con.execute(
+            "SELECT content_hash FROM pages WHERE url = ?", (url,)
+        ).fetchone()
+        self.con.execute(
+            """UPDATE pages SET content_hash = ?, etag = ?, last_modified = ?,
+                links = ?, last_fetched = ?, status = 200, outcome = ?
+                WHERE url = ?""",
+            (
+                content_hash,
+                etag,
+                last_modified,
+                json.dumps(links or []),
+                now,
+                "changed" if row[0] != content_hash else "unchanged",
+                url,
+            ),
+        )
+        self.con.commit()
+        return row[0] != content_hash
+
+    def record_failure(self, url, outcome, status=None):
+        """
+        Record a fetch attempt that returned no page, so that the page is
+        not due again until after the recrawl interval. The content hash,
+        validators and links of any earlier fetch are kept.
+
+        Args:
+            url (str): The URL attempted.
+            outcome (str): Why no page was returned, e.g. "http_error",
+                "not_html", "network_error" or "robots_disallowed".
+            status (int): The HTTP status code, if a response was received.
+        """
+        self.con.execute("INSERT OR IGNORE INTO pages (url) VALUES (?)", (url,))
+        self.con.execute(
+            "UPDATE pages SET last_fetched = ?, status = ?, outcome = ? WHERE url = ?",
+            (time.time(), status, outcome, url),
+        )
+        self.con.commit()
+
+    def close(self):
+        """
+        Close the state file.
+        """
+        self.con.close()
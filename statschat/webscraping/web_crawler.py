@@ -1,8 +1,10 @@
 import requests
 from bs4 import BeautifulSoup
+from collections import deque
 from urllib.parse import urlparse, urljoin
 import os
 import time
+from crawl_state import CrawlState, write_changed_pages
 
 
 class WebCrawler:
@@ -10,7 +12,14 @@ class WebCrawler:
     A web crawler class for scraping web pages.
     """
 
-    def __init__(self, seed_url, max_pages=100, save_dir="web_pages"):
+    def __init__(
+        self,
+        seed_url,
+        max_pages=100,
+        save_dir="web_pages",
+        state_file=None,
+        recrawl_interval=86400,
+    ):
         """
         Initialize the WebCrawler.
 
@@ -18,12 +27,21 @@ class WebCrawler:
             seed_url (str): The starting URL for web crawling.
             max_pages (int): The maximum number of pages to crawl.
             save_dir (str): The directory to save the crawled pages.
+            state_file (str): Optional SQLite file persisting the crawl, so
+                that it can be resumed and recrawled incrementally.
+            recrawl_interval (float): Seconds before a crawled page is due to
+                be fetched again, with a state file.
         """
         self.seed_url = seed_url
         self.max_pages = max_pages
         self.save_dir = save_dir
         self.visited = set()
-        self.to_visit = [seed_url]
+        self.to_visit = deque([seed_url])
+        self.response_headers = {}
+        self.state = None
+        if state_file:
+            self.state = CrawlState(state_file, recrawl_interval)
+            self.state.enqueue([seed_url])
 
     def download_page(self, url):
         """
@@ -36,15 +54,34 @@ class WebCrawler:
             str: The HTML content of the web page, or None if download fails.
         """
         try:
-            response = requests.get(url)
+            response = requests.get(url, headers=self._conditional_headers(url))
             if response.status_code == 200:
+                self.response_headers = response.headers
                 return response.text
+            elif response.status_code == 304:
+                print(f"Unchanged: {url}")
+                if self.state:
+                    self.state.record_fetch(url)
             else:
                 print(f"Failed to download {url}. Status code: {response.status_code}")
+                if self.state:
+                    self.state.record_failure(url, "http_error", response.status_code)
         except requests.exceptions.RequestException as e:
             print(f"An error occurred while downloading {url}: {str(e)}")
+            if self.state:
+                self.state.record_failure(url, "network_error")
         return None
 
+    def _conditional_headers(self, url):
+        headers = {}
+        if self.state:
+            validators = self.state.validators(url)
+            if validators.get("etag"):
+                headers["If-None-Match"] = validators["etag"]
+            if validators.get("last_modified"):
+                headers["If-Modified-Since"] = validators["last_modified"]
+        return headers
+
     def save_page(self, url, html_content):
         """
         Save a web page to a local directory.
@@ -62,33 +99,58 @@ class WebCrawler:
         with open(file_name, "w", encoding="utf-8") as f:
             f.write(html_content)
         print(f"Saved {url} as {file_name}")
+        return file_name
 
     def crawl(self):
         """
-        Perform web crawling.
+        Perform web crawling. With a state file, only pages due are fetched,
+        and only pages whose content has changed are saved.
+
+        Returns:
+            list: URLs of the pages saved, being new or changed.
         """
         collected_pages = 0
+        changed_pages = {}
+        if self.state:
+            self.to_visit = deque(self.state.due())
 
         while self.to_visit and collected_pages < self.max_pages:
-            url = self.to_visit.pop(0)
+            url = self.to_visit.popleft()
             if url not in self.visited:
                 print(f"Crawling: {url}")
 
                 html_content = self.download_page(url)
                 if html_content:
-                    self.save_page(url, html_content)
-
                     # Extract links and add to the to-visit list
                     soup = BeautifulSoup(html_content, "html.parser")
-                    for a_tag in soup.find_all("a", href=True):
-                        href = a_tag.get("href")
-                        full_url = urljoin(url, href)
-                        self.to_visit.append(full_url)
+                    links = [
+                        urljoin(url, a_tag.get("href"))
+                        for a_tag in soup.find_all("a", href=True)
+                    ]
+
+                    if self.state:
+                        changed = self.state.record_fetch(
+                            url,
+                            html_content,
+                            etag=self.response_headers.get("ETag"),
+                            last_modified=self.response_headers.get("Last-Modified"),
+                            links=links,
+                        )
+                        self.to_visit.extend(self.state.enqueue(links))
+                    else:
+                        changed = True
+                        self.to_visit.extend(links)
+
+                    if changed:
+                        changed_pages[url] = self.save_page(url, html_content)
 
                     self.visited.add(url)
                     collected_pages += 1
                     time.sleep(1)  # Be polite and avoid overloading the server
 
+        write_changed_pages(self.save_dir, changed_pages)
+        return list(changed_pages)
+
 
 if __name__ == "__main__":
     seed_url = "https://abs.gov.au"  # Replace with your starting URL
@@ -0,0 +1,138 @@
+import functools
+import json
+import os
+import threading
+import pytest
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from async_crawler import AsyncWebCrawler
+
+PAGES = {
+    "index.html": '<a href="a.html">A</a> <a href="b.html#top">B</a> '
+    '<a href="private/c.html">C</a> <a href="https://example.com">D</a>',
+    "a.html": '<a href="index.html">Home</a> <a href="b.html">B</a>',
+    "b.html": "<p>No links</p>",
+    "private/c.html": "<p>Disallowed</p>",
+    "robots.txt": "User-agent: *\nDisallow: /private/\nCrawl-delay: 0.01\n",
+}
+
+
+@pytest.fixture
+def site(tmp_path):
+    """serves PAGES from a local HTTP server, which answers If-Modified-Since"""
+    root = tmp_path / "site"
+    for name, content in PAGES.items():
+        os.makedirs((root / name).parent, exist_ok=True)
+        (root / name).write_text(content)
+
+    handler = functools.partial(SimpleHTTPRequestHandler, directory=str(root))
+    handler.log_message = lambda *args: None
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+
+
+def test_async_crawl(site, tmp_path):
+    """crawls each allowed page once, keeping to the seed's host"""
+    crawler = AsyncWebCrawler(
+        f"{site}/index.html", save_dir=tmp_path / "pages", rate=100
+    )
+    changed = crawler.crawl()
+
+    assert sorted(changed) == [
+        f"{site}/{x}" for x in ("a.html", "b.html", "index.html")
+    ]
+    assert len(list((tmp_path / "pages").glob("*.html"))) == 3
+
+
+def test_async_recrawl_skips_unchanged(site, tmp_path):
+    """a recrawl sends conditional requests and saves no unchanged pages"""
+    crawler = AsyncWebCrawler(
+        f"{site}/index.html", save_dir=tmp_path / "pages", rate=100
+    )
+    crawler.crawl()
+    changed = crawler.crawl()
+
+    assert changed == [], "Unchanged pages were downloaded again"
+    assert len(crawler.unchanged) == 3, "Links of unchanged pages were not followed"
+
+
+def test_async_crawl_resumes_from_state(site, tmp_path):
+    """an interrupted crawl resumes, and a recrawl saves only changed pages"""
+    kwargs = {
+        "seed_url": f"{site}/index.html",
+        "save_dir": tmp_path / "pages",
+        "rate": 100,
+        "state_file": tmp_path / "crawl.sqlite",
+    }
+    interrupted = AsyncWebCrawler(max_pages=1, **kwargs).crawl()
+    resumed = AsyncWebCrawler(**kwargs).crawl()
+
+    page = tmp_path / "site" / "b.html"
+    page.write_text("<p>Changed</p>")
+    os.utime(page, (page.stat().st_atime + 10, page.stat().st_mtime + 10))
+    recrawled = AsyncWebCrawler(recrawl_interval=0, **kwargs).crawl()
+    with open(tmp_path / "pages" / "changed_pages.json") as f:
+        changed_pages = json.load(f)
+
+    assert interrupted == [f"{site}/index.html"]
+    assert sorted(resumed) == [f"{site}/a.html", f"{site}/b.html"]
+    assert recrawled == [f"{site}/b.html"], "Expected only the changed page"
+    assert [x["url"] for x in changed_pages] == recrawled
+
+
+def test_async_crawl_records_failures(site, tmp_path):
+    """dead and disallowed links are recorded, and not refetched before recrawl"""
+    (tmp_path / "site" / "b.html").unlink()
+    kwargs = {
+        "seed_url": f"{site}/index.html",
+        "save_dir": tmp_path / "pages",
+        "rate": 100,
+        "state_file": tmp_path / "crawl.sqlite",
+    }
+    crawler = AsyncWebCrawler(**kwargs)
+    crawler.crawl()
+    outcomes = {
+        url: crawler.state.outcome(f"{site}/{url}")
+        for url in ("b.html", "private/c.html")
+    }
+    due = crawler.state.due()
+
+    assert outcomes["b.html"] == {"status": 404, "outcome": "http_error"}
+    assert outcomes["private/c.html"]["outcome"] == "robots_disallowed"
+    assert due == [], "Failed pages should not be due until recrawl"
+
+
+def test_async_crawl_skips_undecodable_page(tmp_path):
+    """a page that does not decode is recorded as failed, and the crawl goes on"""
+    root = tmp_path / "site"
+    root.mkdir()
+    (root / "index.html").write_text('<a href="bad.htm">Bad</a> <a href="b.html">B</a>')
+    (root / "bad.htm").write_bytes(b"<p>\xff\xfe Bad</p>")
+    (root / "b.html").write_text("<p>B</p>")
+
+    class Handler(SimpleHTTPRequestHandler):
+        extensions_map = {
+            **SimpleHTTPRequestHandler.extensions_map,
+            ".htm": "text/html; charset=utf-8",
+        }
+
+        def log_message(self, *args):
+            pass
+
+    handler = functools.partial(Handler, directory=str(root))
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    site = f"http://127.0.0.1:{server.server_port}"
+
+    crawler = AsyncWebCrawler(
+        seed_url=f"{site}/index.html",
+        save_dir=tmp_path / "pages",
+        rate=100,
+        state_file=tmp_path / "crawl.sqlite",
+    )
+    saved = crawler.crawl()
+    server.shutdown()
+
+    assert sorted(saved) == [f"{site}/b.html", f"{site}/index.html"]
+    assert crawler.state.outcome(f"{site}/bad.htm")["outcome"] == "decode_error"
@@ -0,0 +1,43 @@
+import numpy as np
+from statschat.bm25 import BM25Index, fuse_scores, tokenize
+
+TEXTS = [
+    "CPIH rose by 3.4% in the 12 months to May 2023",
+    "National parks cover a tenth of England",
+    "Residents of national parks were older on average",
+    "Unemployment was little changed",
+]
+
+
+def test_tokenize():
+    """words and numbers are lowercased, keeping decimal points"""
+    assert tokenize("CPIH rose 3.4%, (2023)") == ["cpih", "rose", "3.4", "2023"]
+
+
+def test_bm25_search():
+    """documents matching rarer query terms rank first, non-matches are left out"""
+    index = BM25Index.build(TEXTS)
+    scores, positions = index.search("national parks residents", 10)
+
+    assert list(positions) == [2, 1]
+    assert scores[0] > scores[1] > 0
+    assert len(index.search("inflation", 10)[0]) == 0
+
+
+def test_bm25_save_load(tmp_path):
+    """a saved index loads with the same scores"""
+    index = BM25Index.build(TEXTS)
+    index.save(tmp_path)
+    loaded = BM25Index.load(tmp_path)
+
+    assert loaded.terms == index.terms
+    assert np.allclose(loaded.scores("cpih 3.4"), index.scores("cpih 3.4"))
+
+
+def test_fuse_scores():
+    """distances shrink with BM25 score, and are unchanged with no lexical match"""
+    distances = np.array([0.5, 0.6, 0.7], dtype=np.float32)
+    fused = fuse_scores(distances, np.array([0.0, 2.0, 4.0]), 0.5)
+
+    assert np.allclose(fused, [0.5, 0.45, 0.35])
+    assert np.array_equal(fuse_scores(distances, np.zeros(3), 0.5), distances)
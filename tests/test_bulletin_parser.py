@@ -0,0 +1,55 @@
+from bulletin_parser import BulletinParser, parse_page
+from statschat.preprocess import bulletin_sections
+
+PAGE = """<html><head>
+    <title>UK environmental accounts: 2023 - Office for National Statistics</title>
+    <link rel="canonical" href="https://www.ons.gov.uk/bulletins/ukenvaccounts/2023">
+    <meta property="og:title" content="UK environmental accounts: 2023">
+    <meta name="citation_publication_date" content="2023/06/05">
+    </head><body><main>
+    <p>Release date: 5 June 2023</p>
+    <section id="main-points"><h2>1. Main points</h2>
+        <p>Emissions rose by 3%.</p><ul><li>Energy use fell.</li></ul></section>
+    <section><h2>2. Greenhouse gas emissions</h2>
+        <figure><img src="/chart.png"><figcaption>Figure 1: Emissions</figcaption>
+        </figure><p>Households remain the highest contributors.</p></section>
+    <p>Contact: <a href="mailto:environment.accounts@ons.gov.uk">Sophie Barrand</a></p>
+    </main></body></html>"""
+
+
+def test_parse_page():
+    """a page is parsed to the bulletin schema, one entry per h2 section"""
+    bulletin = parse_page(PAGE)
+    sections = bulletin["content"]
+
+    assert bulletin["id"] == "2023-06-05_uk-environmental-accounts-2023"
+    assert bulletin["url"] == "https://www.ons.gov.uk/bulletins/ukenvaccounts/2023"
+    assert bulletin["release_date"] == "2023-06-05"
+    assert bulletin["contact_link"] == "mailto:environment.accounts@ons.gov.uk"
+    assert [x["section_header"] for x in sections] == [
+        "1. Main points",
+        "2. Greenhouse gas emissions",
+    ]
+    assert sections[0]["section_url"].endswith("#main-points")
+    assert sections[0]["section_text"] == "Emissions rose by 3%. Energy use fell."
+    assert sections[1]["section_url"].endswith("#greenhouse-gas-emissions")
+    assert sections[1]["figures"][0]["figure_title"] == "Figure 1: Emissions"
+    assert sections[1]["figures"][0]["figure_url"] == "https://www.ons.gov.uk/chart.png"
+    assert parse_page("<html><body><p>Not a bulletin</p></body></html>") is None
+    assert parse_page(b"") is None
+    assert parse_page(" \n") is None
+
+
+def test_parse_directory(tmp_path):
+    """parsed bulletins can be split into sections by the vector store prep"""
+    for n in range(3):
+        page = PAGE.replace("2023/06/05", f"2023/06/0{n + 1}")
+        (tmp_path / f"page_{n}.html").write_text(page)
+    (tmp_path / "not_a_bulletin.html").write_text("<html><body></body></html>")
+    (tmp_path / "empty.html").write_text("")
+
+    written = BulletinParser(tmp_path, tmp_path / "bulletins", processes=2)
+    written = written.parse_directory()
+
+    assert len(written) == 3
+    assert all(len(bulletin_sections(x)) == 2 for x in written)
@@ -0,0 +1,91 @@
+import os
+import shutil
+import numpy as np
+from statschat.cache import AnswerCache, QueryCache, normalise_question
+
+
+DOCS = [
+    {"page_content": "Today is Tuesday.", "score": 0.46},
+    {"page_content": "My birthday is on Thursday.", "score": 0.63},
+]
+
+
+def test_normalise_question():
+    """trivially different phrasings share a normalised form"""
+    assert normalise_question("What is  CPI?") == normalise_question("what is cpi")
+    assert normalise_question("&#39;RPI&#39; in 2023") == "rpi in 2023"
+
+
+def test_answer_cache_lru():
+    """least recently used answers are evicted and lookups counted"""
+    cache = AnswerCache(max_size=2)
+    keys = [cache.key(question, DOCS) for question in ["one", "two", "three"]]
+    cache.set(keys[0], "1")
+    cache.set(keys[1], "2")
+    assert cache.get(keys[0]) == "1"
+    cache.set(keys[2], "3")
+
+    assert cache.get(keys[1]) is None, "Least recently used answer not evicted"
+    assert cache.get(keys[2]) == "3"
+    assert cache.stats()["hits"] == 2
+    assert cache.stats()["misses"] == 1
+
+
+def test_answer_cache_key():
+    """keys depend on the context chunks and the vector store version"""
+    cache = AnswerCache(version="a")
+    assert cache.key("What is CPI?", DOCS) == cache.key("what is cpi", DOCS)
+    assert cache.key("what is cpi", DOCS) != cache.key("what is cpi", DOCS[:1])
+    assert cache.key("what is cpi", DOCS) != AnswerCache(version="b").key(
+        "what is cpi", DOCS
+    )
+
+
+def test_answer_cache_on_disk():
+    """answers persist across instances until the vector store changes"""
+    path = "tests/temp/answers.sqlite"
+    cache = AnswerCache(path=path, version="a")
+    key = cache.key("what is cpi", DOCS)
+    cache.set(key, "Consumer Prices Index")
+
+    reloaded = AnswerCache(path=path, version="a").get(key)
+    rebuilt = AnswerCache(path=path, version="b").get(key)
+    shutil.rmtree("tests/temp")
+
+    assert reloaded == "Consumer Prices Index"
+    assert rebuilt is None, "Answer survived a vector store change"
+
+
+def test_query_cache():
+    """vectors are shared by normalised questions, within the byte budget"""
+    cache = QueryCache(max_bytes=3 * QueryCache.ENTRY_OVERHEAD + 40, version="v1")
+    cache.set_vector("What is CPI?", [1.0, 2.0, 3.0, 4.0])
+    vector = cache.get_vector("what is &#39;cpi&#39;")
+
+    assert vector.dtype == np.float32 and vector.tolist() == [1, 2, 3, 4]
+    assert cache.get_results("what is cpi", (3,)) is None
+
+    cache.set_results("what is cpi", (3,), [0.1, 0.2], [7, 9])
+    cache.set_vector("another question", [0.0] * 4)
+    assert cache.get_vector("What is CPI?") is None, "Budget exceeded"
+    assert cache.get_results("What is CPI", (3,))[1].tolist() == [7, 9]
+    assert cache.get_results("What is CPI", (5,)) is None, "Settings ignored"
+    assert QueryCache(version="v2").get_results("what is cpi", (3,)) is None
+    assert cache.bytes <= cache.max_bytes
+
+
+def test_answer_cache_after_fork(tmp_path):
+    """a forked process writes through a SQLite connection of its own"""
+    path = str(tmp_path / "answers.db")
+    cache = AnswerCache(path=path)
+    parent_db = cache._db
+
+    pid = os.fork()
+    if pid == 0:
+        cache.after_fork()
+        cache.set("child", "answer")
+        os._exit(0 if cache._db is not parent_db else 1)
+
+    _, status = os.waitpid(pid, 0)
+    assert os.waitstatus_to_exitcode(status) == 0, "Connection shared across fork"
+    assert AnswerCache(path=path).get("child") == "answer"
@@ -0,0 +1,40 @@
+import time
+from crawl_state import CrawlState
+
+
+def test_crawl_state(tmp_path):
+    """pages are due until fetched, and changes are detected by content hash"""
+    state = CrawlState(tmp_path / "crawl.sqlite", recrawl_interval=60)
+    new_urls = state.enqueue(["a", "b", "a"])
+    repeated = state.enqueue(["b", "c"])
+
+    first = state.record_fetch("a", "<p>A</p>", etag='"1"', links=["b", "c"])
+    same = state.record_fetch("a", "<p>A</p>", etag='"1"')
+    state.record_fetch("b")  # unchanged, HTTP 304
+    due_now = state.due()
+    due_later = state.due(now=time.time() + 60)
+    state.close()
+
+    assert new_urls == ["a", "b"]
+    assert repeated == ["c"]
+    assert first and not same, "Content changes not detected by hash"
+    assert due_now == ["c"], "Fetched pages should not be due until recrawl"
+    assert due_later == ["c", "a", "b"]
+    reopened = CrawlState(tmp_path / "crawl.sqlite")
+    assert reopened.validators("a")["etag"] == '"1"', "State was not persisted"
+
+
+def test_crawl_state_records_failures(tmp_path):
+    """failed fetches are recorded, so they are not due again until recrawl"""
+    state = CrawlState(tmp_path / "crawl.sqlite", recrawl_interval=60)
+    state.enqueue(["dead", "private", "a"])
+    state.record_fetch("a", "<p>A</p>", etag='"1"')
+    state.record_failure("dead", "http_error", 404)
+    state.record_failure("private", "robots_disallowed")
+    state.record_failure("a", "network_error")
+
+    assert state.due() == [], "Failed fetches should not be due until recrawl"
+    assert state.due(now=time.time() + 60) == ["dead", "private", "a"]
+    assert state.outcome("dead") == {"status": 404, "outcome": "http_error"}
+    assert state.outcome("private") == {"status": None, "outcome": "robots_disallowed"}
+    assert state.validators("a")["etag"] == '"1"', "A failure lost the validators"
@@ -0,0 +1,47 @@
+import faiss
+import shutil
+import sqlite3
+import numpy as np
+from langchain.embeddings import FakeEmbeddings
+from langchain.vectorstores import FAISS
+from statschat.docstore import (
+    SQLiteDocstore,
+    index_is_mapped,
+    load_lazy_store,
+    write_sqlite_docstore,
+)
+
+
+def test_lazy_store_matches_pickled_store():
+    """memory mapped store with SQLite docstore returns the same chunks"""
+    db_root = "tests/temp/db_test"
+    shutil.copytree("tests/data/db_test", db_root)
+    embeddings = FakeEmbeddings(size=768)
+    db = FAISS.load_local(db_root, embeddings)
+    write_sqlite_docstore(db, db_root)
+
+    lazy = load_lazy_store(db_root, embeddings)
+    query = np.random.default_rng(0).random(768).tolist()
+    expected = db.similarity_search_with_score_by_vector(query, k=5)
+    result = lazy.similarity_search_with_score_by_vector(query, k=5)
+    by_position = lazy.docstore.search_positions([0, 1])
+    # more positions than bound variables allowed in one query on older SQLite
+    lazy.docstore._con.setlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, 999)
+    all_positions = lazy.docstore.search_positions(range(2000))
+    shutil.rmtree("tests/temp")
+
+    assert isinstance(lazy.docstore, SQLiteDocstore)
+    assert [(x.page_content, x.metadata) for x, _ in result] == [
+        (x.page_content, x.metadata) for x, _ in expected
+    ]
+    assert by_position[1] == db.docstore.search(db.index_to_docstore_id[1])
+    assert sorted(all_positions) == list(range(db.index.ntotal))
+
+
+def test_index_is_mapped():
+    """only IVF indexes are memory mapped by FAISS"""
+    ivf = faiss.IndexIVFFlat(faiss.IndexFlatL2(8), 8, 2)
+
+    assert index_is_mapped(ivf)
+    assert not index_is_mapped(faiss.IndexFlatL2(8))
+    assert not index_is_mapped(faiss.IndexHNSWFlat(8, 4))
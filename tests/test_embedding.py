@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+from langchain.embeddings.base import Embeddings
+from statschat.embedding import FastEmbeddings, ShardedEmbedder
+
+
+class CountingEmbeddings(Embeddings):
+    """deterministic embeddings recording each text embedded"""
+
+    def __init__(self, fail_after: int = None):
+        self.embedded = []
+        self.fail_after = fail_after
+
+    def embed_documents(self, texts):
+        if self.fail_after is not None and len(self.embedded) >= self.fail_after:
+            raise RuntimeError("interrupted")
+        self.embedded.extend(texts)
+        return [[len(text), float(text[-1])] for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+def test_sharded_embedder_resumes(tmp_path):
+    """an interrupted run resumes from the last completed shard"""
+    texts = [f"text {i}" for i in range(7)]
+    ids = [f"id_{i}" for i in range(7)]
+
+    interrupted = CountingEmbeddings(fail_after=6)
+    with pytest.raises(RuntimeError):
+        ShardedEmbedder(interrupted, tmp_path, shard_size=3).embed(texts, ids)
+
+    resumed = CountingEmbeddings()
+    embedder = ShardedEmbedder(resumed, tmp_path, shard_size=3)
+    vectors = embedder.embed(texts, ids)
+
+    assert resumed.embedded == texts[6:], "Completed shards were re-embedded"
+    assert np.array_equal(vectors, CountingEmbeddings().embed_documents(texts))
+
+
+def test_sharded_embedder_stale_shard(tmp_path):
+    """checkpoints for different texts are not reused"""
+    ids = ["a", "b"]
+    ShardedEmbedder(CountingEmbeddings(), tmp_path).embed(["x 1", "y 2"], ids)
+
+    embeddings = CountingEmbeddings()
+    ShardedEmbedder(embeddings, tmp_path).embed(["x 1", "y 3"], ids)
+
+    assert embeddings.embedded == ["x 1", "y 3"], "Stale shard was reused"
+
+
+def test_fast_embeddings_match_reference(tmp_path):
+    """onnx query vectors stay close to the fp32 sentence-transformers model"""
+    pytest.importorskip("optimum.onnxruntime")
+    model = "sentence-transformers/paraphrase-MiniLM-L3-v2"
+    embeddings = FastEmbeddings(model, backend="onnx", export_root=tmp_path)
+
+    assert embeddings.validate(["What is CPI?", "what is cpi"]) < 0.02
+    assert len(embeddings._tokens) > 0, "Tokenised texts were not cached"
+    assert FastEmbeddings(model, export_root=tmp_path).validate() < 0.02
@@ -0,0 +1,53 @@
+import numpy as np
+from statschat.faiss_index import (
+    INDEX_TYPES,
+    find_near_duplicates,
+    index_type_of,
+    make_index,
+    search_filtered,
+)
+
+
+def test_make_index_types():
+    """each index type trains, indexes and finds an exact copy of a vector"""
+    vectors = np.random.default_rng(0).random((1000, 32), dtype=np.float32)
+    for index_type in INDEX_TYPES:
+        index = make_index(index_type, vectors, nlist=10, pq_m=8)
+        index.add(vectors)
+        _, ids = index.search(vectors[:5], 3)
+
+        assert index_type_of(index) == index_type
+        assert index.ntotal == len(vectors)
+        if index_type != "IndexIVFPQ":  # PQ distances are approximate
+            assert list(ids[:, 0]) == [0, 1, 2, 3, 4]
+
+
+def test_find_near_duplicates():
+    """later copies of a vector are dropped in favour of the first, either search"""
+    vectors = np.random.default_rng(0).normal(size=(200, 32)).astype(np.float32)
+    vectors[150] = vectors[10] * 2  # same direction, so cosine similarity 1
+    vectors[170] = vectors[10]
+
+    for exact_limit in (1000, 10):
+        duplicates = find_near_duplicates(vectors, 0.99, exact_limit=exact_limit)
+
+        assert sorted(x[:2] for x in duplicates) == [(150, 10), (170, 10)]
+
+
+def test_search_filtered():
+    """only selected vectors are returned, whether scored exactly or by FAISS"""
+    vectors = np.random.default_rng(0).random((1000, 32), dtype=np.float32)
+    mask = np.zeros(len(vectors), dtype=bool)
+    mask[::7] = True
+    selected = np.packbits(mask, bitorder="little")
+    for index_type in INDEX_TYPES:
+        index = make_index(index_type, vectors, nlist=10, pq_m=8)
+        index.add(vectors)
+        for exact_limit in (0, 1000):
+            _, ids = search_filtered(
+                index, vectors[:5], 3, selected, np.flatnonzero(mask), exact_limit
+            )
+
+            assert mask[ids].all()
+            if index_type != "IndexIVFPQ":
+                assert ids[0, 0] == 0
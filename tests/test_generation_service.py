@@ -0,0 +1,79 @@
+import threading
+import time
+import pytest
+from statschat.generation_service import GenerationService, RemoteGenerator
+
+
+def upper(prompts):
+    """stands in for the LLM"""
+    return [prompt.upper() for prompt in prompts]
+
+
+def test_generation_service(tmp_path):
+    """prompts round trip over a Unix socket and localhost HTTP, in batches"""
+    service = GenerationService(upper, model_name="upper", max_batch_size=4)
+    for url in (f"unix://{tmp_path}/generate.sock", "http://127.0.0.1:0"):
+        server = service.make_server(url)
+        if url.startswith("http"):
+            url = f"http://127.0.0.1:{server.server_address[1]}"
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        generator = RemoteGenerator(url)
+
+        assert generator.generate(["a", "b"]) == ["A", "B"]
+        assert generator.generate(["c"]) == ["C"], "Kept-alive connection failed"
+        assert generator.health()["model"] == "upper"
+        server.shutdown()
+        server.server_close()
+
+    assert service.scheduler.metrics()["largest_batch_size"] == 2
+
+
+def serve(service):
+    """starts the service on a free localhost port, returning server and URL"""
+    server = service.make_server("http://127.0.0.1:0")
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def test_remote_generator_retries_closed_connection():
+    """a kept-alive connection the service has closed is retried once"""
+    server, url = serve(GenerationService(upper))
+    # the service closes connections idle for longer than this
+    server.RequestHandlerClass.timeout = 0.1
+    generator = RemoteGenerator(url)
+
+    assert generator.generate(["a"]) == ["A"]
+    time.sleep(0.5)
+    assert generator.generate(["b"]) == ["B"], "Closed connection not retried"
+    server.shutdown()
+    server.server_close()
+
+
+def test_remote_generator_does_not_resend_on_timeout():
+    """a slow request times out without being sent to the service again"""
+    calls = []
+
+    def slow(prompts):
+        calls.append(prompts)
+        time.sleep(0.5)
+        return upper(prompts)
+
+    server, url = serve(GenerationService(slow))
+    generator = RemoteGenerator(url, timeout=0.1)
+
+    with pytest.raises(TimeoutError):
+        generator.generate(["a"])
+    time.sleep(0.6)
+    assert calls == [["a"]], "Timed out request was sent again"
+    server.shutdown()
+    server.server_close()
+
+
+def test_generation_service_backpressure():
+    """prompts beyond max_pending are refused while others are generating"""
+    service = GenerationService(upper, max_pending=2)
+
+    assert service.reserve(2)
+    assert not service.reserve(1)
+    service.release(2)
+    assert service.reserve(1)
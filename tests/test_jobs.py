@@ -0,0 +1,91 @@
+import os
+import threading
+import pytest
+from statschat.jobs import DONE, FAILED, GENERATING, JobQueue, QueueFull
+
+
+def search(job, question, release):
+    """stands in for retrieval then generation, holding until released"""
+    job.update(GENERATING, references=[question])
+    release.wait(5)
+    if question == "fail":
+        raise ValueError("generation failed")
+    job.update(DONE, answer=question.upper())
+
+
+def test_job_long_poll():
+    """references are published before the answer, and waits wake on change"""
+    jobs = JobQueue(search, workers=1)
+    release = threading.Event()
+    job = jobs.submit("cpi", release, question="cpi")
+
+    assert job.wait(5, version=0)
+    assert job.to_dict()["references"] == ["cpi"]
+    assert "answer" not in job.to_dict()
+    assert not job.wait(0.05), "Job finished before generation was released"
+
+    release.set()
+    assert job.wait(5)
+    assert job.to_dict()["answer"] == "CPI"
+    assert jobs.get(job.id) is job
+    jobs.close()
+
+
+def test_job_queue_full_and_failure():
+    """submissions beyond max_queued are refused, and errors fail the job"""
+    jobs = JobQueue(search, workers=1, max_queued=1)
+    release = threading.Event()
+    running = jobs.submit("fail", release)
+    running.wait(5, version=0)
+    jobs.submit("queued", release)
+
+    with pytest.raises(QueueFull):
+        jobs.submit("refused", release)
+
+    release.set()
+    running.wait(5)
+    assert running.status == FAILED
+    assert running.to_dict()["error"] == "generation failed"
+    assert jobs.metrics()["rejected"] == 1
+    jobs.close()
+
+
+def test_job_queue_after_fork():
+    """a forked process, which inherits no threads, gets workers of its own"""
+    jobs = JobQueue(search, workers=1)
+    release = threading.Event()
+    release.set()
+
+    pid = os.fork()
+    if pid == 0:
+        jobs.after_fork()
+        job = jobs.submit("cpi", release)
+        os._exit(0 if job.wait(5) and job.status == DONE else 1)
+
+    _, status = os.waitpid(pid, 0)
+    assert os.waitstatus_to_exitcode(status) == 0, "Forked queue ran no jobs"
+    jobs.close()
+
+
+def test_job_queue_shared_between_processes(tmp_path):
+    """a forked process gets a job run in another through the SQLite file"""
+    jobs = JobQueue(search, workers=1, path=tmp_path / "jobs.sqlite")
+    release = threading.Event()
+    job = jobs.submit("cpi", release, question="cpi")
+    job.wait(5, version=0)
+    read, write = os.pipe()
+
+    pid = os.fork()
+    if pid == 0:
+        jobs.after_fork()
+        stored = jobs.get(job.id)
+        generating = stored.to_dict()["status"] == GENERATING
+        os.write(write, b"x")  # lets the parent finish the job
+        finished = stored.wait(5) and stored.to_dict()["answer"] == "CPI"
+        os._exit(0 if generating and finished and not jobs.get("unknown") else 1)
+
+    os.read(read, 1)
+    release.set()
+    _, status = os.waitpid(pid, 0)
+    assert os.waitstatus_to_exitcode(status) == 0, "Job not shared with fork"
+    jobs.close()
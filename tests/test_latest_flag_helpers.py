@@ -0,0 +1,51 @@
+from datetime import date
+from statschat.latest_flag_helpers import recency_rerank, time_decay
+
+DOCS = [
+    {"score": 0.50, "date": "01 January 2020", "date_ordinal": 737425},
+    {"score": 0.55, "date": "01 June 2023"},
+    {"score": 0.60, "date": "01 May 2023", "date_ordinal": 738641},
+]
+
+
+def test_recency_rerank_matches_time_decay():
+    """one vectorised pass gives the per document time_decay scores"""
+    reranked = recency_rerank(DOCS, latest=2)
+    expected = {doc["date"]: doc["score"] / time_decay(doc["date"], 2) for doc in DOCS}
+
+    for doc in reranked:
+        assert abs(doc["score"] - expected[doc["date"]]) < 1e-9
+    assert [doc["score"] for doc in reranked] == sorted(expected.values())
+
+
+def test_recency_rerank_order():
+    """recent releases overtake slightly closer old ones, unless latest is 0"""
+    reranked = recency_rerank(DOCS, latest=1, today=date(2023, 6, 2))
+
+    assert [doc["date"] for doc in reranked] == [
+        "01 June 2023",
+        "01 May 2023",
+        "01 January 2020",
+    ]
+    assert recency_rerank(DOCS, latest=0) == DOCS
+
+
+def test_recency_rerank_after_reranker():
+    """latest still reorders results the cross-encoder re-ranked, ahead of
+    the results beyond its top_n"""
+    reranked = [
+        {"score": 0.50, "date": "01 January 2020", "rerank_score": 2.0},
+        {"score": 0.55, "date": "01 June 2023", "rerank_score": 1.8},
+    ]
+    beyond_top_n = [{"score": 0.40, "date": "01 May 2023"}]
+    docs = reranked + beyond_top_n
+
+    weighted = recency_rerank(docs, latest=1, today=date(2023, 6, 2))
+
+    assert [doc["date"] for doc in weighted] == [
+        "01 June 2023",
+        "01 January 2020",
+        "01 May 2023",
+    ]
+    assert weighted[0]["score"] == 0.55, "Distances of re-ranked results changed"
+    assert recency_rerank(docs, latest=0) == docs
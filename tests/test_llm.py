@@ -38,3 +38,80 @@ def test_llm_search():
     )
 
     assert "National parks" in result[0]["page_content"]
+
+
+def test_llm_search_batch():
+    """Batched search returns the same documents as one-by-one search."""
+    # without the query cache, single searches would return the batch results
+    inquirer = Inquirer(
+        model_name_or_path="google/flan-t5-small",
+        faiss_db_root="tests/data/db_test",
+        query_cache_bytes=0,
+    )
+    queries = [
+        "How many national parks are there in England?",
+        "What is inclusive income?",
+    ]
+
+    batched = inquirer.similarity_search_batch(queries)
+
+    for query, results in zip(queries, batched):
+        single = inquirer.similarity_search(query)
+        assert [x["page_content"] for x in results] == [
+            x["page_content"] for x in single
+        ]
+
+
+def test_llm_search_cached():
+    """A query cache hit returns the same documents as a cold search."""
+    inquirer = Inquirer(
+        model_name_or_path="google/flan-t5-small", faiss_db_root="tests/data/db_test"
+    )
+    query = "How many national parks are there in England?"
+
+    cold = inquirer.similarity_search(query)
+    cached = inquirer.similarity_search(query.lower())
+
+    assert inquirer.query_cache.stats()["results"]["hits"] == 1
+    assert cached == cold
+
+
+def test_llm_search_filtered():
+    """Filtered search only returns chunks matching the filters."""
+    inquirer = Inquirer(
+        model_name_or_path="google/flan-t5-small", faiss_db_root="tests/data/db_test"
+    )
+
+    result = inquirer.similarity_search(
+        query="How many national parks are there in England?",
+        release_types=["articles"],
+        date_from="2023-06-06",
+    )
+
+    assert result
+    assert all("/articles/" in x["url"] for x in result)
+    assert all("National parks" not in x["page_content"] for x in result)
+
+
+def test_llm_stream_answer():
+    """Streamed answer chunks join up to a complete answer."""
+    inquirer = Inquirer(
+        model_name_or_path="google/flan-t5-small",
+        faiss_db_root="tests/data/db_test",
+        answer_cache_size=0,
+    )
+    docs = [
+        {
+            "page_content": "Today is Tuesday.",
+            "source": "dummy1.json",
+            "seq_num": 1,
+            "score": 0.4644126296043396,
+        },
+    ]
+
+    chunks = list(
+        inquirer.stream_answer(query="What day is it today?", top_matches=docs)
+    )
+
+    assert len(chunks) > 0
+    assert "Tuesday" in "".join(chunks)
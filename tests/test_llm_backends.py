@@ -0,0 +1,20 @@
+import pytest
+from statschat.llm_backends import load_generation_pipeline
+
+
+def test_unknown_llm_backend():
+    """an unknown backend is refused before any model is loaded"""
+    with pytest.raises(ValueError, match="Unknown llm_backend"):
+        load_generation_pipeline("google/flan-t5-small", backend="fp16")
+
+
+def test_int8_llm_backend():
+    """the quantised model still answers from its context"""
+    pytest.importorskip("torch")
+    pipeline = load_generation_pipeline("google/flan-t5-small", backend="int8")
+    answer = pipeline(
+        "Answer from the context. Context: There are 10 national parks in "
+        "England. Question: How many national parks are there in England?"
+    )[0]["generated_text"]
+
+    assert "10" in answer
@@ -0,0 +1,51 @@
+from statschat.metadata_index import MetadataIndex, release_type_of, url_keywords_of
+
+ONS = "https://www.ons.gov.uk"
+URL = f"{ONS}/economy/environmentalaccounts/bulletins/ukenvironmentalaccounts/2023"
+
+METADATAS = [
+    {"url": URL, "date": "05 June 2023"},
+    {
+        "url": f"{ONS}/economy/output/articles/ukinclusiveincome/2005to2019",
+        "date": "09 June 2023",
+    },
+    {
+        "url": f"{ONS}/peoplepopulationandcommunity/bulletins/nationalparks/census2021",
+        "date": "09 June 2023",
+    },
+]
+
+
+def test_url_metadata():
+    """release type and topic keywords are read from the URL path"""
+    assert release_type_of(URL) == "bulletins"
+    assert url_keywords_of(URL) == ["economy", "environmentalaccounts"]
+
+
+def test_metadata_select():
+    """filters combine with and, values within a filter with or"""
+    index = MetadataIndex.build(METADATAS)
+
+    def selected(**filters):
+        return index.positions(index.select(**filters)).tolist()
+
+    assert index.select() is None
+    assert selected(release_types=["bulletins"]) == [0, 2]
+    assert selected(url_keywords=["economy"], date_from="2023-06-06") == [1]
+    assert selected(release_types=["articles", "bulletins"], date_to="2023-06-05") == [
+        0
+    ]
+    assert selected(url_keywords=["unknown"]) == []
+
+
+def test_metadata_save_load(tmp_path):
+    """a saved index loads with the same selections"""
+    index = MetadataIndex.build(METADATAS)
+    index.save(tmp_path)
+    loaded = MetadataIndex.load(tmp_path)
+
+    assert (
+        loaded.select(url_keywords=["economy"])
+        == index.select(url_keywords=["economy"])
+    ).all()
+    assert (loaded.dates == index.dates).all()
@@ -0,0 +1,20 @@
+import os
+from prefork import memory_usage, partition_threads
+
+
+def test_partition_threads():
+    """the CPUs are split between workers, at least one thread each"""
+    cpus = len(os.sched_getaffinity(0))
+
+    assert partition_threads(1) == cpus
+    assert partition_threads(cpus * 2) == 1
+    assert partition_threads(4, threads=3) == 3, "Explicit thread count ignored"
+
+
+def test_memory_usage():
+    """the memory report reads this process's smaps_rollup"""
+    usage = memory_usage(os.getpid())
+
+    assert set(usage) == {"rss", "pss", "shared", "private"}
+    assert usage["rss"] > 0
+    assert abs(usage["shared"] + usage["private"] - usage["rss"]) < 1
@@ -1,6 +1,7 @@
+import os
 import shutil
 import json
-from statschat.preprocess import PrepareVectorStore
+from statschat.preprocess import PrepareVectorStore, bulletin_sections
 
 
 def test_faiss_docs_load():
@@ -13,8 +14,10 @@ def test_faiss_docs_load():
     assert (
         len(searcher.db.docstore._dict) == 101
     ), "Langchain searcher did not load expected number of documents"
-    shutil.rmtree("tests/temp/db_langchain")
-    shutil.rmtree("tests/temp/json_split")
+    assert not os.path.exists(
+        searcher.embed_checkpoint_dir
+    ), "Embedding checkpoints were not cleared once the store was saved"
+    shutil.rmtree("tests/temp")
 
 
 def test_redundancy_filter():
@@ -54,3 +57,70 @@ def test_redundancy_filter():
     assert len(set(matched_files)) == len(
         matched_files
     ), "Some identical document sections have not been dropped correctly"
+
+
+def test_incremental_update():
+    """checks changed and removed bulletins are re-embedded or dropped in place"""
+    data_to = "tests/temp/data"
+    db_root = "tests/temp/db_langchain"
+    shutil.copytree("tests/data", data_to)
+    kwargs = {
+        "directory": data_to,
+        "split_directory": "tests/temp/json_split",
+        "faiss_db_root": db_root,
+        "incremental": True,
+    }
+    PrepareVectorStore(**kwargs)
+
+    removed = f"{data_to}/2023-06-05_uk-environmental-accounts-2023.json"
+    with open(removed) as i:
+        removed_id = json.load(i)["id"]
+    os.remove(removed)
+
+    searcher = PrepareVectorStore(**kwargs)
+    with open(f"{db_root}/manifest.json") as i:
+        manifest = json.load(i)
+    sources = {doc.metadata["source"] for doc in searcher.db.docstore._dict.values()}
+    n_indexed = searcher.db.index.ntotal
+    n_manifest = sum(len(x["chunk_ids"]) for x in manifest.values())
+    shutil.rmtree("tests/temp")
+
+    assert removed_id not in manifest, "Removed bulletin still in manifest"
+    assert removed_id not in sources, "Chunks of removed bulletin still indexed"
+    assert n_indexed == n_manifest, "Index and manifest out of step"
+
+
+def test_incremental_without_manifest():
+    """a store with no manifest is rebuilt, not appended to"""
+    kwargs = {
+        "directory": "tests/data",
+        "split_directory": "tests/temp/json_split",
+        "faiss_db_root": "tests/temp/db_langchain",
+        "incremental": True,
+    }
+    n_built = PrepareVectorStore(**kwargs).db.index.ntotal
+    os.remove("tests/temp/db_langchain/manifest.json")
+
+    searcher = PrepareVectorStore(**kwargs)
+    n_rebuilt = searcher.db.index.ntotal
+    n_docs = len(searcher.db.docstore._dict)
+    shutil.rmtree("tests/temp")
+
+    assert n_rebuilt == n_built, "Chunks were indexed twice"
+    assert n_docs == n_built, "Docstore and index out of step"
+
+
+def test_bulletin_sections():
+    """one document per article section, section JSONs written only on request"""
+    filename = "tests/data/2023-06-05_uk-environmental-accounts-2023.json"
+    with open(filename) as i:
+        n_sections = len(json.load(i)["content"])
+
+    sections = bulletin_sections(filename)
+    os.makedirs("tests/temp/json_split")
+    bulletin_sections(filename, split_directory="tests/temp/json_split")
+    n_files = len(os.listdir("tests/temp/json_split"))
+    shutil.rmtree("tests/temp")
+
+    assert len(sections) == n_sections, "Expected one document per section"
+    assert n_files == n_sections, "Expected one JSON file per section"
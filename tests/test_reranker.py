@@ -0,0 +1,20 @@
+from statschat.reranker import Reranker
+
+DOCS = [
+    {"page_content": "My birthday is on Thursday.", "score": 0.46},
+    {"page_content": "Today is Tuesday.", "score": 0.63},
+    {"page_content": "National parks cover a tenth of England.", "score": 0.7},
+]
+
+
+def test_reranker_order_and_cache():
+    """the relevant chunk moves to the top, and repeat pairs are not rescored"""
+    reranker = Reranker("cross-encoder/ms-marco-TinyBERT-L-2-v2", top_n=2)
+
+    reranked = reranker.rerank("What day is it today?", DOCS)
+    reranker.rerank("what day is it today", DOCS)
+
+    assert reranked[0]["page_content"] == "Today is Tuesday."
+    assert reranked[-1] == DOCS[-1], "Results beyond top_n were re-ordered"
+    assert reranker.stats()["misses"] == 2
+    assert reranker.stats()["hits"] == 2
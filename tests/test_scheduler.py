@@ -0,0 +1,37 @@
+from concurrent.futures import ThreadPoolExecutor
+from statschat.scheduler import GenerationScheduler
+
+
+def test_scheduler_micro_batches():
+    """concurrent prompts are grouped into batches and answered in order"""
+    batches = []
+
+    def generate(prompts):
+        batches.append(len(prompts))
+        return [prompt.upper() for prompt in prompts]
+
+    scheduler = GenerationScheduler(generate, max_batch_size=4, max_wait_ms=200)
+    prompts = [f"prompt {i}" for i in range(8)]
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        answers = list(pool.map(scheduler.generate, prompts))
+    metrics = scheduler.metrics()
+    scheduler.close()
+
+    assert answers == [prompt.upper() for prompt in prompts]
+    assert max(batches) <= 4, "Batch exceeded max_batch_size"
+    assert len(batches) < len(prompts), "Concurrent prompts were not batched"
+    assert metrics["requests"] == 8
+    assert metrics["queue_depth"] == 0
+
+
+def test_scheduler_propagates_errors():
+    """a failed batch raises in every waiting caller"""
+
+    def generate(prompts):
+        raise RuntimeError("out of memory")
+
+    scheduler = GenerationScheduler(generate, max_batch_size=2, max_wait_ms=1)
+    future = scheduler.submit("prompt")
+    scheduler.close()
+
+    assert isinstance(future.exception(), RuntimeError)